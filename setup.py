@@ -99,10 +99,14 @@ setup(
         "typing;python_version<'3.5'"
     ],
     # Set up a tokenize command (tokenize.exe on Windows),
-    # which calls main() in src/tokenizer/main.py
+    # which calls main() in src/tokenizer/main.py, a tokenize-corpus
+    # command, which calls main() in src/tokenizer/corpus.py, and a
+    # tokenize-count command, which calls main() in src/tokenizer/counts.py
     entry_points={
         'console_scripts': [
             'tokenize=tokenizer.main:main',
+            'tokenize-corpus=tokenizer.corpus:main',
+            'tokenize-count=tokenizer.counts:main',
         ],
     },
 )
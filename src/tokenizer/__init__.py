@@ -35,11 +35,16 @@ from .definitions import (
     KLUDGY_ORDINALS_PASS_THROUGH, KLUDGY_ORDINALS_MODIFY, KLUDGY_ORDINALS_TRANSLATE
 )
 from .tokenizer import (
-    TOK, Tok, tokenize, tokenize_without_annotation, split_into_sentences,
-    parse_tokens, correct_spaces, detokenize, mark_paragraphs, paragraphs,
-    normalized_text, normalized_text_from_tokens, text_from_tokens
+    TOK, Tok, tokenize, tokenize_many, tokenize_without_annotation, tokenize_file,
+    split_into_sentences, sentences, Sentence,
+    parse_tokens, correct_spaces, detokenize, detokenize_batch, align_tokens,
+    scan_pii, redact_pii, PII_KINDS,
+    mark_paragraphs, paragraphs,
+    normalized_text, normalized_text_from_tokens, text_from_tokens,
+    LRUCache, CacheInfo, DIGITS_CACHE, PARAGRAPH_CACHE,
+    NormalizationStats, NormalizationInfo, NORMALIZATION_STATS,
 )
-from .abbrev import Abbreviations, ConfigError
+from .abbrev import Abbreviations, AbbreviationSet, ConfigError
 
 __author__ = u"Miðeind ehf"
 __version__ = u"2.5.0"  # Also update setup.py
@@ -30,17 +30,26 @@
 
     This module reads the definition of abbreviations from the file
     Abbrev.conf, assumed to be located in the same directory (or installation
-    resource library) as this Python source file.
+    resource library) as this Python source file. Additional abbreviations
+    can be read from overlay files in the same format, creating separate
+    AbbreviationSet instances that can be passed to tokenize().
 
 """
 
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-from typing import Set, List, Dict, Any
+from typing import AbstractSet, Dict, Tuple, Optional, Any
 
-from threading import Lock
-from collections import defaultdict, OrderedDict
+import io
+import os
+import json
+import mmap
+import struct
+from zlib import crc32
+from threading import Lock, RLock, Thread, Event
+from itertools import count
+from collections import OrderedDict
 
 
 class ConfigError(Exception):
@@ -51,9 +60,8 @@ class ConfigError(Exception):
 class OrderedSet:
 
     """ Shim class to provide an ordered set API on top
-        of an OrderedDict. This is necessary to make abbreviation
-        lookups predictable and repeatable, which they would not be
-        if a standard Python set() was used. """
+        of an OrderedDict. The abbreviation tables no longer use it,
+        but it is kept for code that imports it from this module. """
 
     def __init__(self):
         self._dict = OrderedDict()
@@ -70,41 +78,156 @@ class OrderedSet:
         return self._dict.__iter__()
 
 
-class Abbreviations:
+def _mtime(path):
+    """ Return the modification time of a file, or None if not available """
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class _LayeredTable:
+
+    """ A read-only dict (or set) consisting of a table of an overlay
+        set, which is looked up first, laid over the corresponding table
+        of the set below it. Keys in hidden are not looked up below. """
+
+    def __init__(self, own, below, hidden=frozenset()):
+        self._own = own
+        self._below = below
+        self._hidden = hidden
+        self._len = None  # type: Optional[int]
+
+    def __contains__(self, key):
+        if key in self._own:
+            return True
+        return key not in self._hidden and key in self._below
 
-    """ Wrapper around dictionary of abbreviations,
-        initialized from the config file """
+    def get(self, key, default=None):
+        m = self._own.get(key)
+        if m is not None:
+            return m
+        if key in self._hidden:
+            return default
+        return self._below.get(key, default)
 
+    def __getitem__(self, key):
+        m = self.get(key)
+        if m is None:
+            raise KeyError(key)
+        return m
+
+    def __iter__(self):
+        own = self._own
+        hidden = self._hidden
+        for key in own:
+            yield key
+        for key in self._below:
+            if key not in own and key not in hidden:
+                yield key
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(1 for _ in self)
+        return self._len
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+
+class AbbreviationSet:
+
+    """ A set of abbreviation tables, read from Abbrev.conf and optionally
+        from one or more overlay files in the same format, which add to it.
+        An overlay file can also contain a [not_abbreviations] section.
+
+        Instances are obtained from AbbreviationSet.load(), which compiles
+        each combination of files once and caches the result. An overlay
+        set only stores the entries that its file adds to the set it is
+        laid over, and looks up other keys in the tables of that set,
+        so the tables of Abbrev.conf are shared between all sets in the
+        process instead of being copied for each of them.
+
+        While the files are being read, the tables are mutable; once they
+        have been read, they are replaced with immutable equivalents
+        (plain dicts of tuples, and frozensets), which can then be shared
+        by all threads and all tokens that refer to them. """
+
+    # The tables of an empty set. Instances have their own tables,
+    # which become immutable once the set has been loaded.
+
+    # Overlay files that have been read on top of Abbrev.conf
+    files = ()  # type: Tuple[str, ...]
+    # The files that the set was read from, including Abbrev.conf,
+    # with their modification times at the time of reading
+    sources = ()  # type: Tuple[Tuple[str, Optional[float]], ...]
     # Dictionary of abbreviations and their meanings
-    DICT = defaultdict(OrderedSet)  # type: Dict[str, Any]
+    DICT = {}  # type: Dict[str, Any]
     # Wrong versions of abbreviations
-    WRONGDICT = defaultdict(OrderedSet)  # type: Dict[str, Any]
+    WRONGDICT = {}  # type: Dict[str, Any]
     # All abbreviation meanings
-    MEANINGS = set()  # type: Set[str]
+    MEANINGS = frozenset()  # type: AbstractSet[str]
     # Single-word abbreviations, i.e. those with only one dot at the end
-    SINGLES = set()  # type: Set[str]
+    SINGLES = frozenset()  # type: AbstractSet[str]
     # Set of abbreviations without periods, e.g. "td", "osfrv"
-    WRONGSINGLES = set()  # type: Set[str]
+    WRONGSINGLES = frozenset()  # type: AbstractSet[str]
     # Potential sentence finishers, i.e. those with a dot at the end,
     # marked with an asterisk in the config file
-    FINISHERS = set()  # type: Set[str]
+    FINISHERS = frozenset()  # type: AbstractSet[str]
     # Abbreviations that should not be seen as such at the end of sentences,
     # marked with an exclamation mark in the config file
-    NOT_FINISHERS = set()  # type: Set[str]
+    NOT_FINISHERS = frozenset()  # type: AbstractSet[str]
     # Abbreviations that should not be seen as such at the end of sentences, but
     # are allowed in front of person names; marked with a hat ^ in the config file
-    NAME_FINISHERS = set()  # type: Set[str]
+    NAME_FINISHERS = frozenset()  # type: AbstractSet[str]
     # Wrong versions of abbreviations with possible corrections
-    # wrong version : [correction1, correction2, ...]
-    WRONGDOTS = defaultdict(list)  # type: Dict[str, List[str]]
+    # wrong version : (correction1, correction2, ...)
+    WRONGDOTS = {}  # type: Dict[str, Any]
     # Word forms that should never be interpreted as abbreviations
-    NOT_ABBREVIATIONS = set()  # type: Set[str]
-
-    # Ensure that only one thread initializes the abbreviations
-    _lock = Lock()
+    NOT_ABBREVIATIONS = frozenset()  # type: AbstractSet[str]
+
+    # Cache of loaded sets, keyed by the tuple of overlay file paths
+    _cache = {}  # type: Dict[Tuple[str, ...], AbbreviationSet]
+    # The lock is reentrant since an overlay set loads the set below it
+    _lock = RLock()
+    # Source of unique serial numbers for loaded sets
+    _serials = count(1)
+    # Abbreviations added by Abbreviations.add(), and the set they were
+    # added to, if the set was created by that function
+    _additions = ()  # type: Tuple[Tuple[str, str, str, Optional[str]], ...]
+    _added_to = None  # type: Optional[AbbreviationSet]
+
+    def __init__(self, base=None):
+        # type: (Optional[AbbreviationSet]) -> None
+        # The set that this one is laid over, until it has been loaded
+        self._base = base
+        b = base or self
+        self.files = b.files
+        self.sources = b.sources
+        # Serial number, unique within the process, assigned when loaded
+        self.serial = 0
+        # Start out with empty tables, which only receive
+        # the entries that are read into this set
+        self.DICT = {}  # type: Any
+        self.WRONGDICT = {}  # type: Any
+        self.MEANINGS = set()  # type: Any
+        self.SINGLES = set()  # type: Any
+        self.WRONGSINGLES = set()  # type: Any
+        self.FINISHERS = set()  # type: Any
+        self.NOT_FINISHERS = set()  # type: Any
+        self.NAME_FINISHERS = set()  # type: Any
+        self.WRONGDOTS = {}  # type: Any
+        self.NOT_ABBREVIATIONS = set()  # type: Any
+
+    def __repr__(self):
+        return "<AbbreviationSet #{0}: {1}>".format(
+            self.serial, " + ".join(("Abbrev.conf",) + self.files)
+        )
 
-    @staticmethod
-    def add(abbrev, meaning, gender, fl=None):
+    def add(self, abbrev, meaning, gender, fl=None):
         """ Add an abbreviation to the dictionary.
             Called from the config file handler. """
         # Check for sentence finishers
@@ -147,27 +270,26 @@ class Abbreviations:
             raise ConfigError(
                 "!, * and ^ modifiers are mutually exclusive on abbreviations"
             )
+        fl = "skst" if fl is None else fl
         # Append the abbreviation and its meaning in tuple form
         # Multiple meanings are supported for each abbreviation
-        Abbreviations.DICT[abbrev].add(
-            (meaning, 0, gender, "skst" if fl is None else fl, abbrev, "-",)
-        )
-        Abbreviations.MEANINGS.add(meaning)
+        self._append("DICT", abbrev, (meaning, 0, gender, fl, abbrev, "-",))
+        self.MEANINGS.add(meaning)
         # Adding wrong versions of abbreviations
         if abbrev[-1] == "." and "." not in abbrev[0:-1]:
             # Only one dot, at the end
             # Lookup is without the dot
             wabbrev = abbrev[0:-1]
-            Abbreviations.SINGLES.add(wabbrev)
+            self.SINGLES.add(wabbrev)
             if finisher:
-                Abbreviations.FINISHERS.add(wabbrev)
-            Abbreviations.WRONGDOTS[wabbrev].append(abbrev)
+                self.FINISHERS.add(wabbrev)
+            self._append("WRONGDOTS", wabbrev, abbrev, unique=False)
             if len(wabbrev) > 1:
                 # We don't add single letters (such as Í and Á)
                 # as abbreviations, even though they are listed as such
                 # in the form 'Í.' and 'Á.' for use within person names
-                Abbreviations.WRONGDICT[wabbrev].add(
-                    (meaning, 0, gender, "skst" if fl is None else fl, wabbrev, "-",)
+                self._append(
+                    "WRONGDICT", wabbrev, (meaning, 0, gender, fl, wabbrev, "-",)
                 )
 
         elif "." in abbrev:
@@ -178,9 +300,9 @@ class Abbreviations:
             for i in indices:
                 # Removing one dot at a time
                 wabbrev = abbrev[:i] + abbrev[i + 1 :]
-                Abbreviations.WRONGDOTS[wabbrev].append(abbrev)
-                Abbreviations.WRONGDICT[wabbrev].add(
-                    (meaning, 0, gender, "skst" if fl is None else fl, wabbrev, "-",)
+                self._append("WRONGDOTS", wabbrev, abbrev, unique=False)
+                self._append(
+                    "WRONGDICT", wabbrev, (meaning, 0, gender, fl, wabbrev, "-",)
                 )
             if len(indices) > 2:
                 # 3 or 4 dots currently in vocabulary
@@ -196,49 +318,52 @@ class Abbreviations:
                 # 2 and 3 removed
                 wabbrevs.append(abbrev[:i2] + abbrev[i2 + 1 : i3] + abbrev[i3 + 1 :])
                 for wabbrev in wabbrevs:
-                    Abbreviations.WRONGDOTS[wabbrev].append(abbrev)
-                    Abbreviations.WRONGDICT[wabbrev].add(
-                        (
-                            meaning,
-                            0,
-                            gender,
-                            "skst" if fl is None else fl,
-                            wabbrev,
-                            "-",
-                        )
+                    self._append("WRONGDOTS", wabbrev, abbrev, unique=False)
+                    self._append(
+                        "WRONGDICT",
+                        wabbrev,
+                        (meaning, 0, gender, fl, wabbrev, "-",),
                     )
             # Removing all dots
             wabbrev = abbrev.replace(".", "")
-            Abbreviations.WRONGSINGLES.add(wabbrev)
-            Abbreviations.WRONGDOTS[wabbrev].append(abbrev)
-            Abbreviations.WRONGDICT[wabbrev].add(
-                (meaning, 0, gender, "skst" if fl is None else fl, wabbrev, "-",)
-            )
+            self.WRONGSINGLES.add(wabbrev)
+            self._append("WRONGDOTS", wabbrev, abbrev, unique=False)
+            self._append("WRONGDICT", wabbrev, (meaning, 0, gender, fl, wabbrev, "-",))
         if finisher:
-            Abbreviations.FINISHERS.add(abbrev)
+            self.FINISHERS.add(abbrev)
         if not_finisher:
-            Abbreviations.NOT_FINISHERS.add(abbrev)
+            self.NOT_FINISHERS.add(abbrev)
         if name_finisher:
-            Abbreviations.NAME_FINISHERS.add(abbrev)
-
-    @staticmethod
-    def has_meaning(abbrev):
-        return abbrev in Abbreviations.DICT or abbrev in Abbreviations.WRONGDICT
-
-    @staticmethod
-    def has_abbreviation(meaning):
-        return meaning in Abbreviations.MEANINGS
-
-    @staticmethod
-    def get_meaning(abbrev):
-        """ Lookup meaning(s) of abbreviation, if available. """
-        m = Abbreviations.DICT.get(abbrev)
+            self.NAME_FINISHERS.add(abbrev)
+
+    def _append(self, name, key, item, unique=True):
+        """ Append an item to the tuple stored under key in the table with
+            the given name, optionally only if it is not already there.
+            A key that is not yet in the table starts out with the tuple
+            stored under it in the set below, if any. """
+        table = getattr(self, name)
+        t = table.get(key)
+        if t is None:
+            base = self._base
+            t = () if base is None else getattr(base, name).get(key, ())
+        if not unique or item not in t:
+            table[key] = t + (item,)
+
+    def has_meaning(self, abbrev):
+        return abbrev in self.DICT or abbrev in self.WRONGDICT
+
+    def has_abbreviation(self, meaning):
+        return meaning in self.MEANINGS
+
+    def get_meaning(self, abbrev):
+        """ Lookup meaning(s) of abbreviation, if available. The result
+            is a tuple that is shared between calls and must not be modified. """
+        m = self.DICT.get(abbrev)
         if not m:
-            m = Abbreviations.WRONGDICT.get(abbrev)
-        return list(m) if m else None
+            m = self.WRONGDICT.get(abbrev)
+        return m or None
 
-    @staticmethod
-    def _handle_abbreviations(s):
+    def _handle_abbreviations(self, s):
         """ Handle abbreviations in the settings section """
         # Format: abbrev[*] = "meaning" gender (kk|kvk|hk)
         # An asterisk after an abbreviation ending with a period
@@ -266,52 +391,534 @@ class Abbreviations:
                 gender = p[0].strip()
             if len(p) >= 2:
                 fl = p[1].strip()
-        Abbreviations.add(abbrev, m[1], gender, fl)
+        self.add(abbrev, m[1], gender, fl)
 
-    @staticmethod
-    def _handle_not_abbreviations(s):
+    def _handle_not_abbreviations(self, s):
         """ Handle not_abbreviations in the settings section """
         if len(s) < 3 or s[0] != '"' or s[-1] != '"':
             raise ConfigError("not_abbreviations should be enclosed in double quotes")
-        Abbreviations.NOT_ABBREVIATIONS.add(s[1:-1])
+        self.NOT_ABBREVIATIONS.add(s[1:-1])
+
+    def read(self, config):
+        """ Read abbreviations from a config file, given
+            as an iterable of binary (UTF-8 encoded) lines """
+        section = None
+        for b in config:
+            # We get lines as binary strings
+            s = b.decode("utf-8")
+            # Ignore comments
+            ix = s.find("#")
+            if ix >= 0:
+                s = s[0:ix]
+            s = s.strip()
+            if not s:
+                # Blank line: ignore
+                continue
+            if s[0] == "[":
+                # Section header (we are expecting [abbreviations]/[not_abbreviations])
+                if s not in {"[abbreviations]", "[not_abbreviations]"}:
+                    raise ConfigError("Wrong section header")
+                section = s
+                continue
+            if section == "[abbreviations]":
+                self._handle_abbreviations(s)
+            elif section == "[not_abbreviations]":
+                self._handle_not_abbreviations(s)
+            else:
+                raise ConfigError("Content outside section")
+
+    def _freeze(self):
+        """ Finish loading the set: remove not_abbreviations from WRONGDICT,
+            replace the mutable tables with immutable ones and, in an overlay
+            set, lay them over the tables of the set below """
+        base = self._base
+        for abbr in self.NOT_ABBREVIATIONS:
+            self.WRONGDICT.pop(abbr, None)
+        if base is not None:
+            for abbr in list(self.WRONGDICT):
+                if abbr in base.NOT_ABBREVIATIONS:
+                    del self.WRONGDICT[abbr]
+        self.MEANINGS = frozenset(self.MEANINGS)
+        self.SINGLES = frozenset(self.SINGLES)
+        self.WRONGSINGLES = frozenset(self.WRONGSINGLES)
+        self.FINISHERS = frozenset(self.FINISHERS)
+        self.NOT_FINISHERS = frozenset(self.NOT_FINISHERS)
+        self.NAME_FINISHERS = frozenset(self.NAME_FINISHERS)
+        self.NOT_ABBREVIATIONS = frozenset(self.NOT_ABBREVIATIONS)
+        if base is not None:
+            # The not_abbreviations of this set hide the wrong versions
+            # of abbreviations in the set below
+            hidden = self.NOT_ABBREVIATIONS
+            for name, _ in _MAPPED_TABLES:
+                setattr(
+                    self,
+                    name,
+                    _LayeredTable(
+                        getattr(self, name),
+                        getattr(base, name),
+                        hidden if name == "WRONGDICT" else frozenset(),
+                    ),
+                )
+            self._base = None
+        self.serial = next(AbbreviationSet._serials)
+
+    def changed(self):
+        """ Return True if any of the files that the set was read from
+            has been modified since it was read """
+        return any(_mtime(path) != mtime for path, mtime in self.sources)
+
+    @staticmethod
+    def load(*overlays):
+        """ Return an AbbreviationSet containing the abbreviations from
+            Abbrev.conf, with the given overlay files read on top of it,
+            in order. Each combination of files is read only once; the
+            resulting set is cached and returned from subsequent calls. """
+        key = tuple(os.path.abspath(path) for path in overlays)
+        aset = AbbreviationSet._cache.get(key)
+        if aset is not None:
+            # Fast path, without taking the lock
+            return aset
+        with AbbreviationSet._lock:
+            aset = AbbreviationSet._cache.get(key)
+            if aset is None:
+                # Lay the last overlay file over the set for the preceding ones
+                base = AbbreviationSet.load(*key[:-1]) if key else None
+                aset = AbbreviationSet._compile(base, key[-1] if key else None)
+                AbbreviationSet._cache[key] = aset
+        return aset
+
+    @staticmethod
+    def _compile(base, path):
+        """ Read the overlay file with the given absolute path on top of
+            the base set into a new AbbreviationSet, or read Abbrev.conf
+            if no base set is given """
+        aset = AbbreviationSet(base)
+        if base is None:
+            from pkg_resources import resource_stream, resource_filename  # type: ignore
+
+            # Note the modification time before reading the file, so that
+            # a modification while reading it is caught by changed()
+            path = resource_filename(__name__, "Abbrev.conf")
+            aset.sources = ((path, _mtime(path)),)
+            with resource_stream(__name__, "Abbrev.conf") as config:
+                aset.read(config)
+        else:
+            aset.files += (path,)
+            aset.sources += ((path, _mtime(path)),)
+            with io.open(path, "rb") as config:
+                aset.read(config)
+        aset._freeze()
+        return aset
+
+    @staticmethod
+    def _install(aset):
+        """ Make the given set the one that load() returns when called
+            without overlay files. All other sets are removed from the
+            cache, so that overlay sets are read again, on top of the new
+            set, when next loaded. Sets that have already been loaded
+            are not affected. """
+        with AbbreviationSet._lock:
+            # Replace the cache in a single assignment, since load()
+            # reads it without holding the lock
+            AbbreviationSet._cache = {(): aset}
+
+    def save(self, path):
+        """ Write the tables of the set to a file that can be
+            memory-mapped by AbbreviationSet.map() """
+        header = {
+            "files": list(self.files),
+            "sources": [list(source) for source in self.sources],
+            "tables": {},
+        }
+        body = bytearray()
+        for name, kind in _MAPPED_TABLES:
+            header["tables"][name] = _write_table(body, getattr(self, name), kind)
+        h = json.dumps(header, sort_keys=True).encode("utf-8")
+        # Pad the header so that the body starts on a 4-byte boundary
+        h += b" " * (-len(h) % _U32.size)
+        # Write to a temporary file and rename it, so that processes that
+        # map the file never see it partially written
+        tmp = "{0}.{1}.tmp".format(path, os.getpid())
+        with io.open(tmp, "wb") as f:
+            f.write(_BLOB_MAGIC + _U32.pack(len(h)) + h)
+            f.write(body)
+        # os.replace() is not available in Python 2.7
+        getattr(os, "replace", os.rename)(tmp, path)
+
+    @staticmethod
+    def map(path):
+        """ Return an AbbreviationSet whose tables are looked up, on demand,
+            in a memory-mapped file written by save(). Mapping the file
+            takes practically no time, and all processes that map the same
+            file share its pages through the operating system's page cache,
+            instead of each having its own copy of the tables. Lookups
+            are somewhat slower than in an ordinary set, and meaning tuples
+            are decoded from the file on each successful lookup. """
+        with io.open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buf[0 : len(_BLOB_MAGIC)] != _BLOB_MAGIC:
+            raise ConfigError("Not a compiled abbreviation file: " + path)
+        pos = len(_BLOB_MAGIC)
+        hlen = _U32.unpack_from(buf, pos)[0]
+        pos += _U32.size
+        header = json.loads(buf[pos : pos + hlen].decode("utf-8"))
+        base = pos + hlen
+        aset = AbbreviationSet()
+        aset.files = tuple(header["files"])
+        aset.sources = tuple(tuple(source) for source in header["sources"])
+        for name, kind in _MAPPED_TABLES:
+            offset = header["tables"][name]
+            setattr(aset, name, _MappedTable(buf, base, offset, kind))
+        aset.serial = next(AbbreviationSet._serials)
+        return aset
+
+
+# Magic number at the start of files written by AbbreviationSet.save()
+_BLOB_MAGIC = b"TokAbbr1"
+# The tables that are written, and the kind of their values
+_MAPPED_TABLES = (
+    ("DICT", "meanings"),
+    ("WRONGDICT", "meanings"),
+    ("MEANINGS", None),
+    ("SINGLES", None),
+    ("WRONGSINGLES", None),
+    ("FINISHERS", None),
+    ("NOT_FINISHERS", None),
+    ("NAME_FINISHERS", None),
+    ("WRONGDOTS", "strings"),
+    ("NOT_ABBREVIATIONS", None),
+)
+# Separators within encoded values
+_RS = "\x1e"
+_US = "\x1f"
+
+# The file is written in the native byte order, since it is
+# intended to be mapped by processes on the same machine
+_U32 = struct.Struct("=I")
+# Key length and value length of a table entry
+_ENTRY = struct.Struct("=HI")
+
+
+def _encode(value, kind):
+    """ Encode a table value of the given kind as bytes """
+    if kind == "meanings":
+        value = (_US.join("{0}".format(field) for field in m) for m in value)
+    return _RS.join(value).encode("utf-8")
+
+
+def _decode(b, kind):
+    """ Decode a table value of the given kind from bytes """
+    if kind is None:
+        return None
+    items = b.decode("utf-8").split(_RS)
+    if kind == "meanings":
+        return tuple(
+            (m[0], int(m[1]), m[2], m[3], m[4], m[5])
+            for m in (item.split(_US) for item in items)
+        )
+    return tuple(items)
+
+
+def _hash(k):
+    """ Return a hash of a key, given as bytes, that is the same
+        in all processes (unlike the built-in hash()) """
+    return crc32(k) & 0xFFFFFFFF
+
+
+def _write_table(body, table, kind):
+    """ Append a table to the body of a compiled abbreviation file, as
+        an open-addressing hash table with linear probing, and return
+        its offset. The table starts with the number of slots (a power
+        of two) and the number of entries, followed by the slots, each
+        containing the hash of a key and the offset of its entry, or
+        zeros if empty. Each entry consists of the lengths of the key
+        and the value, followed by the UTF-8 encoded key and the encoded
+        value. Offsets are relative to the start of the body. """
+    # Align the table on a 4-byte boundary
+    body += b"\0" * (-len(body) % _U32.size)
+    offset = len(body)
+    keys = list(table)
+    # Keep the load factor at or below 1/4, so that the slot
+    # for a missing key is usually found on the first probe
+    nslots = 8
+    while nslots < 4 * len(keys):
+        nslots *= 2
+    mask = nslots - 1
+    body += _U32.pack(nslots) + _U32.pack(len(keys))
+    slots = len(body)
+    body += b"\0" * (2 * _U32.size * nslots)
+    for key in keys:
+        k = key.encode("utf-8")
+        v = _encode(table[key], kind) if kind else b""
+        h = _hash(k)
+        i = h & mask
+        while _U32.unpack_from(body, slots + _U32.size * (2 * i + 1))[0]:
+            i = (i + 1) & mask
+        _U32.pack_into(body, slots + _U32.size * 2 * i, h)
+        _U32.pack_into(body, slots + _U32.size * (2 * i + 1), len(body))
+        body += _ENTRY.pack(len(k), len(v)) + k + v
+    return offset
+
+
+class _Slots:
+
+    """ Array of unsigned 32-bit integers in a buffer, for Python versions
+        where memoryview.cast() is not available """
+
+    def __init__(self, buf, pos):
+        self._buf = buf
+        self._pos = pos
+
+    def __getitem__(self, i):
+        return _U32.unpack_from(self._buf, self._pos + _U32.size * i)[0]
+
+
+class _MappedTable:
+
+    """ A read-only dict (or set, if the values are of kind None)
+        that looks up its entries in a memory-mapped file, as written
+        by _write_table() """
+
+    def __init__(self, buf, base, offset, kind):
+        self._buf = buf
+        self._base = base
+        self._kind = kind
+        pos = base + offset
+        nslots = _U32.unpack_from(buf, pos)[0]
+        self._len = _U32.unpack_from(buf, pos + _U32.size)[0]
+        self._mask = nslots - 1
+        pos += 2 * _U32.size
+        try:
+            # Hash and offset pairs, directly indexable
+            end = pos + 2 * _U32.size * nslots
+            self._slots = memoryview(buf)[pos:end].cast(str("I"))
+        except (AttributeError, TypeError):
+            self._slots = _Slots(buf, pos)
+
+    def _find(self, key):
+        """ Return the position and length of the value for the given key
+            in the buffer, or (-1, 0) if the key is not found """
+        k = key.encode("utf-8")
+        h = _hash(k)
+        slots = self._slots
+        mask = self._mask
+        i = h & mask
+        while True:
+            pos = slots[2 * i + 1]
+            if not pos:
+                return -1, 0
+            if slots[2 * i] == h:
+                pos += self._base
+                klen, vlen = _ENTRY.unpack_from(self._buf, pos)
+                pos += _ENTRY.size
+                if self._buf[pos : pos + klen] == k:
+                    return pos + klen, vlen
+            i = (i + 1) & mask
+
+    def __contains__(self, key):
+        return self._find(key)[0] >= 0
+
+    def __getitem__(self, key):
+        pos, vlen = self._find(key)
+        if pos < 0:
+            raise KeyError(key)
+        return _decode(self._buf[pos : pos + vlen], self._kind)
+
+    def get(self, key, default=None):
+        pos, vlen = self._find(key)
+        if pos < 0:
+            return default
+        return _decode(self._buf[pos : pos + vlen], self._kind)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        buf = self._buf
+        slots = self._slots
+        for i in range(self._mask + 1):
+            pos = slots[2 * i + 1]
+            if pos:
+                pos += self._base
+                klen = _ENTRY.unpack_from(buf, pos)[0]
+                pos += _ENTRY.size
+                yield buf[pos : pos + klen].decode("utf-8")
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+
+class Abbreviations:
+
+    """ Wrapper around the default AbbreviationSet, which is read from
+        Abbrev.conf. Once initialize() has been called, the class
+        attributes below refer to the (immutable) tables of that set. """
+
+    # See AbbreviationSet for a description of the tables
+    DICT = AbbreviationSet.DICT
+    WRONGDICT = AbbreviationSet.WRONGDICT
+    MEANINGS = AbbreviationSet.MEANINGS
+    SINGLES = AbbreviationSet.SINGLES
+    WRONGSINGLES = AbbreviationSet.WRONGSINGLES
+    FINISHERS = AbbreviationSet.FINISHERS
+    NOT_FINISHERS = AbbreviationSet.NOT_FINISHERS
+    NAME_FINISHERS = AbbreviationSet.NAME_FINISHERS
+    WRONGDOTS = AbbreviationSet.WRONGDOTS
+    NOT_ABBREVIATIONS = AbbreviationSet.NOT_ABBREVIATIONS
+
+    # The default AbbreviationSet, once it has been loaded
+    _current = None  # type: Optional[AbbreviationSet]
+
+    # Ensure that only one thread initializes (or reloads) the abbreviations
+    _lock = Lock()
+    # Set to True, while holding the lock, after the tables above have been
+    # completely filled. Threads that see True can use the tables without
+    # taking the lock.
+    _initialized = False
+
+    @staticmethod
+    def has_meaning(abbrev):
+        return abbrev in Abbreviations.DICT or abbrev in Abbreviations.WRONGDICT
+
+    @staticmethod
+    def has_abbreviation(meaning):
+        return meaning in Abbreviations.MEANINGS
+
+    @staticmethod
+    def get_meaning(abbrev):
+        """ Lookup meaning(s) of abbreviation, if available. The result
+            is a tuple that is shared between calls and must not be modified. """
+        m = Abbreviations.DICT.get(abbrev)
+        if not m:
+            m = Abbreviations.WRONGDICT.get(abbrev)
+        return m or None
+
+    @staticmethod
+    def add(abbrev, meaning, gender, fl=None):
+        """ Add an abbreviation, given as in Abbrev.conf, to the default set.
+            This creates a new default set, containing the abbreviations
+            added so far, laid over the set that they were added to.
+            The additions are lost if the abbreviations are reloaded. """
+        Abbreviations.initialize()
+        with Abbreviations._lock:
+            current = Abbreviations._current
+            assert current is not None
+            base = current._added_to or current
+            aset = AbbreviationSet(base)
+            aset._additions = current._additions + ((abbrev, meaning, gender, fl),)
+            for args in aset._additions:
+                aset.add(*args)
+            aset._freeze()
+            aset._added_to = base
+            AbbreviationSet._install(aset)
+            Abbreviations._publish(aset)
+
+    @staticmethod
+    def current():
+        """ Return the default AbbreviationSet, reading it if necessary.
+            Tokenization functions call this once per call and use the
+            returned set throughout, so a reload() while a text is being
+            tokenized does not affect the rest of that text. """
+        Abbreviations.initialize()
+        return Abbreviations._current
+
+    @staticmethod
+    def _publish(aset):
+        """ Make the given AbbreviationSet the default one. The class
+            attributes are assigned one at a time; _current is assigned
+            last, in a single step, and is what tokenization uses. """
+        A = Abbreviations
+        A.DICT = aset.DICT
+        A.WRONGDICT = aset.WRONGDICT
+        A.MEANINGS = aset.MEANINGS
+        A.SINGLES = aset.SINGLES
+        A.WRONGSINGLES = aset.WRONGSINGLES
+        A.FINISHERS = aset.FINISHERS
+        A.NOT_FINISHERS = aset.NOT_FINISHERS
+        A.NAME_FINISHERS = aset.NAME_FINISHERS
+        A.WRONGDOTS = aset.WRONGDOTS
+        A.NOT_ABBREVIATIONS = aset.NOT_ABBREVIATIONS
+        A._current = aset
 
     @staticmethod
     def initialize():
-        """ Read the abbreviations config file """
+        """ Read the abbreviations config file, if not already done """
+        if Abbreviations._initialized:
+            # Fast path, taken on every call after the first one:
+            # the tables have been published and are not modified
+            # further, so there is no need to take the lock
+            return
         with Abbreviations._lock:
-            if len(Abbreviations.DICT):
-                # Already initialized
+            if Abbreviations._initialized:
+                # Another thread initialized the tables while
+                # we were waiting for the lock
                 return
-            from pkg_resources import resource_stream  # type: ignore
+            Abbreviations._publish(AbbreviationSet.load())
+            # Publish the tables: from now on, initialize() returns
+            # immediately without taking the lock
+            Abbreviations._initialized = True
 
-            section = None
-            with resource_stream(__name__, "Abbrev.conf") as config:
-                for b in config:
-                    # We get lines as binary strings
-                    s = b.decode("utf-8")
-                    # Ignore comments
-                    ix = s.find("#")
-                    if ix >= 0:
-                        s = s[0:ix]
-                    s = s.strip()
-                    if not s:
-                        # Blank line: ignore
-                        continue
-                    if s[0] == "[":
-                        # Section header (we are expecting [abbreviations]/[not_abbreviations])
-                        if s not in {"[abbreviations]", "[not_abbreviations]"}:
-                            raise ConfigError("Wrong section header")
-                        section = s
-                        continue
-                    if section == "[abbreviations]":
-                        Abbreviations._handle_abbreviations(s)
-                    elif section == "[not_abbreviations]":
-                        Abbreviations._handle_not_abbreviations(s)
-                    else:
-                        raise ConfigError("Content outside section")
-
-            # Remove not_abbreviations from WRONGDICT
-            for abbr in Abbreviations.NOT_ABBREVIATIONS:
-                if abbr in Abbreviations.WRONGDICT:
-                    del Abbreviations.WRONGDICT[abbr]
-            Abbreviations.NOT_ABBREVIATIONS = set()
+    @staticmethod
+    def reload(background=False):
+        """ Read Abbrev.conf again into a new default AbbreviationSet, and
+            switch to it once it has been read. Tokenization calls that are
+            already in progress continue to use the previous set. Overlay
+            sets are read again, on top of the new set, when next loaded
+            via AbbreviationSet.load(). If the file contains errors, a
+            ConfigError is raised and the previous set remains in use.
+            If background is True, the file is read in a separate daemon
+            thread, which is returned; otherwise None is returned. """
+        if background:
+            thread = Thread(target=Abbreviations.reload, name="AbbreviationsReload")
+            thread.daemon = True
+            thread.start()
+            return thread
+        # Read the file without holding any lock, so that other
+        # threads can continue to tokenize while we are reading
+        Abbreviations._switch(AbbreviationSet._compile(None, None))
+        return None
+
+    @staticmethod
+    def map(path):
+        """ Make the abbreviation tables in a file written by
+            AbbreviationSet.save() the default set, instead of reading
+            Abbrev.conf. This is intended for prefork servers and
+            multiprocessing pools, where each worker process calls map()
+            after it has been started: the workers then share a single
+            copy of the tables, and start up without reading Abbrev.conf. """
+        Abbreviations._switch(AbbreviationSet.map(path))
+
+    @staticmethod
+    def _switch(aset):
+        """ Make the given set the default one, and the base of overlay sets """
+        with Abbreviations._lock:
+            AbbreviationSet._install(aset)
+            Abbreviations._publish(aset)
+            Abbreviations._initialized = True
+
+    @staticmethod
+    def watch(interval=60.0):
+        """ Start a daemon thread that checks, every interval seconds,
+            whether Abbrev.conf or any overlay file that has been loaded has
+            been modified, and calls reload() if so. Returns a
+            threading.Event; setting it stops the thread. """
+        stop = Event()
+
+        def watcher():
+            while not stop.wait(interval):
+                sets = list(AbbreviationSet._cache.values())
+                if any(aset.changed() for aset in sets):
+                    try:
+                        Abbreviations.reload()
+                    except (ConfigError, IOError, OSError):
+                        # The file may be in the middle of being written:
+                        # keep the previous set and try again next time
+                        pass
+
+        thread = Thread(target=watcher, name="AbbreviationsWatcher")
+        thread.daemon = True
+        thread.start()
+        return stop
@@ -31,28 +31,73 @@
 
 from typing import (
     Optional,
-    Set,
-    List,
-    Dict,
+    AbstractSet,
+    Mapping,
+    Iterator,
     Tuple,
-    Sequence,
 )
 
+from threading import Thread, Event
+
 Meaning = Tuple[str, int, str, str, str, str]
-MeaningList = Sequence[Meaning]
+MeaningList = Tuple[Meaning, ...]
 
 class ConfigError(Exception):
     ...
 
+class OrderedSet:
+    def __init__(self) -> None: ...
+    def add(self, item: str) -> None: ...
+    def __contains__(self, item: object) -> bool: ...
+    def __iter__(self) -> Iterator[str]: ...
+
+class AbbreviationSet:
+
+    files: Tuple[str, ...] = ...
+    sources: Tuple[Tuple[str, Optional[float]], ...] = ...
+    serial: int = ...
+    DICT: Mapping[str, MeaningList] = ...
+    WRONGDICT: Mapping[str, MeaningList] = ...
+    SINGLES: AbstractSet[str] = ...
+    FINISHERS: AbstractSet[str] = ...
+    NOT_FINISHERS: AbstractSet[str] = ...
+    NAME_FINISHERS: AbstractSet[str] = ...
+    WRONGDOTS: Mapping[str, Tuple[str, ...]] = ...
+    def __init__(self, base: Optional[AbbreviationSet] = ...) -> None: ...
+    def add(
+        self, abbrev: str, meaning: str, gender: str, fl: Optional[str] = ...
+    ) -> None: ...
+    def has_meaning(self, abbrev: str) -> bool: ...
+    def has_abbreviation(self, meaning: str) -> bool: ...
+    def get_meaning(self, abbrev: str) -> Optional[MeaningList]: ...
+    def changed(self) -> bool: ...
+    def save(self, path: str) -> None: ...
+    @staticmethod
+    def load(*overlays: str) -> AbbreviationSet: ...
+    @staticmethod
+    def map(path: str) -> AbbreviationSet: ...
+
 class Abbreviations:
 
-    DICT: Dict[str, MeaningList] = ...
-    WRONGDICT: Dict[str, MeaningList] = ...
-    NAME_FINISHERS: Set[str] = ...
-    WRONGDOTS: Dict[str, List[str]] = ...
+    DICT: Mapping[str, MeaningList] = ...
+    WRONGDICT: Mapping[str, MeaningList] = ...
+    NAME_FINISHERS: AbstractSet[str] = ...
+    WRONGDOTS: Mapping[str, Tuple[str, ...]] = ...
     @staticmethod
     def initialize() -> None: ...
     @staticmethod
+    def add(
+        abbrev: str, meaning: str, gender: str, fl: Optional[str] = ...
+    ) -> None: ...
+    @staticmethod
+    def current() -> AbbreviationSet: ...
+    @staticmethod
+    def reload(background: bool = ...) -> Optional[Thread]: ...
+    @staticmethod
+    def watch(interval: float = ...) -> Event: ...
+    @staticmethod
+    def map(path: str) -> None: ...
+    @staticmethod
     def has_abbreviation(meaning: str) -> bool: ...
     @staticmethod
     def get_meaning(abbrev: str) -> Optional[MeaningList]: ...
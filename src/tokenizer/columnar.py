@@ -0,0 +1,323 @@
+# -*- encoding: utf-8 -*-
+"""
+
+    Tokenizer for Icelandic text
+
+    Copyright (C) 2021 Miðeind ehf.
+    Original author: Vilhjálmur Þorsteinsson
+
+    This software is licensed under the MIT License:
+
+        Permission is hereby granted, free of charge, to any person
+        obtaining a copy of this software and associated documentation
+        files (the "Software"), to deal in the Software without restriction,
+        including without limitation the rights to use, copy, modify, merge,
+        publish, distribute, sublicense, and/or sell copies of the Software,
+        and to permit persons to whom the Software is furnished to do so,
+        subject to the following conditions:
+
+        The above copyright notice and this permission notice shall be
+        included in all copies or substantial portions of the Software.
+
+        THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+        EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+        MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+        IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+        CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+        TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+        SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+    This module exports a stream of tokens to a columnar on-disk layout,
+    for loading into dataframes without parsing text or JSON. There is one
+    row per token, with the following columns:
+
+        kind        the token kind (TOK.xxx), as a 16-bit integer
+        text        the token text, or null
+        normalized  the normalized token text, or null
+        sentence    the index of the sentence that contains the token
+        paragraph   the index of the paragraph that contains the token
+        value       the token value as in the JSON output of the
+                    tokenize command, as a JSON string, or null
+
+    The string columns are dictionary encoded. If the pyarrow package is
+    installed, the columns are written to a Parquet file. Otherwise, they
+    are written to a directory of NumPy .npy files, one per column, where
+    the string columns hold int32 codes into a dictionary of strings that
+    is stored in a JSON file alongside, and -1 denotes null. Neither
+    NumPy nor pyarrow is needed to write this layout.
+
+    The tokens are written in batches of a bounded number of rows. The
+    dictionaries of the .npy layout are kept in memory until the end,
+    so memory use grows with the number of distinct strings (the
+    vocabulary) but not with the number of tokens.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import os
+import sys
+import ast
+import json
+import array
+import struct
+
+from .definitions import make_str
+from .tokenizer import TOK, normalized_text
+from .main import val, json_dumps
+
+
+# Default number of rows (tokens) written at a time
+COLUMNAR_BATCH_SIZE = 65536
+
+# The columns, in order
+COLUMNS = ("kind", "text", "normalized", "sentence", "paragraph", "value")
+
+# Columns holding strings, which are dictionary encoded
+STRING_COLUMNS = frozenset(("text", "normalized", "value"))
+
+# Array type code of 64-bit integers (the 'q' type code is not
+# available on Python 2.7, where 'l' is 64-bit on most platforms)
+INT64_TYPECODE = "q" if "q" in getattr(array, "typecodes", "") else "l"
+
+# Conversion of arrays to and from bytes (array.tofile() and
+# array.fromfile() only take built-in file objects on Python 2.7,
+# where these methods are called tostring() and fromstring())
+_array_to_bytes = getattr(array.array, "tobytes", None) or array.array.tostring
+_array_from_bytes = getattr(array.array, "frombytes", None) or array.array.fromstring
+
+# The NumPy dtypes and the corresponding array module type codes
+# of the columns in the .npy layout
+_BYTE_ORDER = "<" if sys.byteorder == "little" else ">"
+NPY_TYPES = {
+    "kind": (_BYTE_ORDER + "i2", "h"),
+    "text": (_BYTE_ORDER + "i4", "i"),
+    "normalized": (_BYTE_ORDER + "i4", "i"),
+    "sentence": (_BYTE_ORDER + "i8", INT64_TYPECODE),
+    "paragraph": (_BYTE_ORDER + "i8", INT64_TYPECODE),
+    "value": (_BYTE_ORDER + "i4", "i"),
+}
+
+# Size of the .npy file header, which is written when the number of rows
+# is known, i.e. after the data
+NPY_HEADER_SIZE = 128
+
+
+def token_rows(tokens):
+    """ Generate a tuple of column values for each token """
+    sentence = -1
+    paragraph = 0
+    started = False
+    s_begin = TOK.S_BEGIN
+    p_begin = TOK.P_BEGIN
+    for t in tokens:
+        kind = t.kind
+        if kind == s_begin:
+            sentence += 1
+        elif kind == p_begin:
+            # The first paragraph is number 0, whether or not it
+            # is explicitly marked
+            if started:
+                paragraph += 1
+        started = True
+        v = val(t)
+        yield (
+            kind,
+            t.txt,
+            normalized_text(t) if t.txt is not None else None,
+            max(sentence, 0),
+            paragraph,
+            None if v is None else json_dumps(v),
+        )
+
+
+class NpyColumnWriter:
+
+    """ Writes the columns to .npy files in a directory, encoding the
+        strings with a dictionary for each string column. The dictionaries
+        are written when the writer is closed, and are held in memory
+        until then: their size is bounded by the vocabulary of the text,
+        i.e. the number of distinct strings in each column. """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.rows = 0
+        self.files = dict()
+        for name in COLUMNS:
+            f = io.open(os.path.join(path, name + ".npy"), "wb")
+            # Reserve space for the header
+            f.write(b"\0" * NPY_HEADER_SIZE)
+            self.files[name] = f
+        self.dictionaries = {name: dict() for name in STRING_COLUMNS}
+
+    def write(self, columns):
+        """ Write a batch of rows, given as a list of values per column """
+        for name, values in zip(COLUMNS, columns):
+            if name in STRING_COLUMNS:
+                codes = self.dictionaries[name]
+                values = [
+                    -1 if s is None else codes.setdefault(s, len(codes)) for s in values
+                ]
+            self.files[name].write(
+                _array_to_bytes(array.array(NPY_TYPES[name][1], values))
+            )
+        self.rows += len(columns[0])
+
+    def close(self):
+        """ Write the .npy headers, now that the number of rows is known,
+            and the dictionaries """
+        for name, f in self.files.items():
+            header = "{{'descr': '{0}', 'fortran_order': False, 'shape': ({1},), }}".format(
+                NPY_TYPES[name][0], self.rows
+            )
+            # Magic string, version 1.0, header length, header padded
+            # with spaces and terminated with a newline
+            header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + "\n"
+            f.seek(0)
+            f.write(b"\x93NUMPY\x01\x00")
+            f.write(struct.pack("<H", len(header)))
+            f.write(header.encode("latin-1"))
+            f.close()
+        for name, codes in self.dictionaries.items():
+            strings = [None] * len(codes)
+            for s, code in codes.items():
+                strings[code] = s
+            with io.open(
+                os.path.join(self.path, name + ".dictionary.json"), "w", encoding="utf-8"
+            ) as f:
+                f.write(make_str(json_dumps(strings)))
+
+
+class ParquetColumnWriter:
+
+    """ Writes the columns to a Parquet file, with pyarrow """
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        strings = pa.dictionary(pa.int32(), pa.string())
+        self.schema = pa.schema(
+            [
+                ("kind", pa.int16()),
+                ("text", strings),
+                ("normalized", strings),
+                ("sentence", pa.int64()),
+                ("paragraph", pa.int64()),
+                ("value", strings),
+            ]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema, use_dictionary=True)
+
+    def write(self, columns):
+        """ Write a batch of rows as a row group """
+        pa = self.pa
+        arrays = [
+            pa.array(values, type=field.type.value_type).dictionary_encode()
+            if name in STRING_COLUMNS
+            else pa.array(values, type=field.type)
+            for name, values, field in zip(COLUMNS, columns, self.schema)
+        ]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def default_format():
+    """ Return the default columnar format: 'parquet' if pyarrow
+        is installed, otherwise 'npy' """
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return "npy"
+    return "parquet"
+
+
+def export_columns(tokens, path, batch_size=COLUMNAR_BATCH_SIZE, format=None):
+    """ Write a stream of tokens, such as the output of tokenize(), to a
+        columnar layout at the given path, batch_size rows at a time.
+        The format is either 'parquet', which requires pyarrow, or 'npy',
+        which writes a directory of .npy files. By default, Parquet is
+        written if pyarrow is installed. Returns the number of rows. """
+    if format is None:
+        format = default_format()
+    if format == "parquet":
+        writer = ParquetColumnWriter(path)
+    elif format == "npy":
+        writer = NpyColumnWriter(path)
+    else:
+        raise ValueError("Unknown columnar format '{0}'".format(format))
+    rows = 0
+    batch = [[] for _ in COLUMNS]
+    appends = [column.append for column in batch]
+    try:
+        for row in token_rows(tokens):
+            for append, value in zip(appends, row):
+                append(value)
+            if len(batch[0]) >= batch_size:
+                writer.write(batch)
+                rows += len(batch[0])
+                for column in batch:
+                    del column[:]
+        if batch[0]:
+            writer.write(batch)
+            rows += len(batch[0])
+    finally:
+        writer.close()
+    return rows
+
+
+def read_npy(path):
+    """ Read a one-dimensional .npy file, as written by NpyColumnWriter,
+        into a NumPy array if NumPy is installed, or else into an array
+        from the array module """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None:
+        return numpy.load(path)
+    with io.open(path, "rb") as f:
+        f.seek(8)
+        (header_len,) = struct.unpack("<H", f.read(2))
+        header = f.read(header_len).decode("latin-1")
+        header = ast.literal_eval(header)
+        descr = header["descr"]
+        typecode = next(tc for dt, tc in NPY_TYPES.values() if dt[1:] == descr[1:])
+        a = array.array(typecode)
+        data = f.read(header["shape"][0] * a.itemsize)
+        if len(data) < header["shape"][0] * a.itemsize:
+            raise EOFError("{0} is truncated".format(path))
+        _array_from_bytes(a, data)
+    if descr[0] != _BYTE_ORDER:
+        a.byteswap()
+    return a
+
+
+def read_columns(path):
+    """ Read the columns from a columnar layout that export_columns() wrote,
+        returning a dict of column name to a sequence of values, with the
+        dictionary encoded strings decoded. The columns are NumPy arrays or
+        lists if NumPy is installed, and arrays or lists otherwise. """
+    if not os.path.isdir(path):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path).to_pydict()
+    columns = dict()
+    for name in COLUMNS:
+        a = read_npy(os.path.join(path, name + ".npy"))
+        if name in STRING_COLUMNS:
+            with io.open(
+                os.path.join(path, name + ".dictionary.json"), "r", encoding="utf-8"
+            ) as f:
+                strings = json.load(f)
+            a = [None if code < 0 else strings[code] for code in a.tolist()]
+        columns[name] = a
+    return columns
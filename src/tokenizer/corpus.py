@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+
+    Tokenizer for Icelandic text
+
+    Copyright (C) 2021 Miðeind ehf.
+    Original author: Vilhjálmur Þorsteinsson
+
+    This software is licensed under the MIT License:
+
+        Permission is hereby granted, free of charge, to any person
+        obtaining a copy of this software and associated documentation
+        files (the "Software"), to deal in the Software without restriction,
+        including without limitation the rights to use, copy, modify, merge,
+        publish, distribute, sublicense, and/or sell copies of the Software,
+        and to permit persons to whom the Software is furnished to do so,
+        subject to the following conditions:
+
+        The above copyright notice and this permission notice shall be
+        included in all copies or substantial portions of the Software.
+
+        THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+        EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+        MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+        IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+        CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+        TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+        SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+    This module tokenizes a corpus, i.e. a directory tree or a set of
+    (optionally compressed) text files, in parallel worker processes.
+    Each input file is a shard, which is tokenized into a corresponding
+    output file in the same formats as the tokenize command produces.
+    Completed shards are recorded in a manifest in the output directory,
+    so that a run that is killed can be resumed where it left off.
+    The main() function of this module is registered as the
+    'tokenize-corpus' console_script entry point in setup.py.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import io
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import multiprocessing
+from collections import namedtuple
+
+from .tokenizer import tokenize, open_compressed
+from .definitions import COMPRESSION_EXTENSIONS
+from .columnar import export_columns, default_format
+from .main import (
+    options_parser,
+    open_infile,
+    gen_lines,
+    tokenize_options,
+    write_tokens,
+)
+
+
+# Name of the manifest of completed shards in the output directory
+MANIFEST_NAME = "manifest.jsonl"
+
+# Output file name extensions, by output format
+FORMAT_EXTENSIONS = {
+    "text": ".tok",
+    "csv": ".csv",
+    "json": ".jsonl",
+    # Columnar formats (see columnar.py), which are not compressed
+    "parquet": ".parquet",
+    "npy": ".columns",
+}
+
+# File name extensions, by compression format
+COMPRESSION_SUFFIXES = {c: ext for ext, c in COMPRESSION_EXTENSIONS.items()}
+
+# Atomic replacement of a file (os.rename() does the same on POSIX,
+# but os.replace() is not available on Python 2.7)
+replace_file = getattr(os, "replace", os.rename)
+
+# Statistics for a corpus run, as returned by tokenize_corpus()
+CorpusInfo = namedtuple(
+    "CorpusInfo", ["shards", "skipped", "bytes", "tokens", "seconds"]
+)
+
+
+def find_inputs(paths, exclude=None):
+    """ Return a sorted list of the input files denoted by the given paths,
+        each of which is a file, a directory (searched recursively) or a
+        glob pattern, along with the directory that the output files
+        mirror. Hidden files and directories are skipped, as is the
+        directory exclude, such as an output directory within an input
+        directory, and everything in it. """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                files.update(
+                    os.path.join(dirpath, f) for f in filenames if not f.startswith(".")
+                )
+        else:
+            files.update(f for f in glob.glob(path) if os.path.isfile(f))
+    files = sorted(os.path.abspath(f) for f in files)
+    if exclude is not None:
+        exclude = os.path.join(os.path.abspath(exclude), "")
+        files = [f for f in files if not f.startswith(exclude)]
+    if not files:
+        return [], None
+    # The common directory of all the input files
+    base = os.path.commonprefix([os.path.dirname(f) + os.sep for f in files])
+    base = base[: base.rfind(os.sep) + 1]
+    return files, base
+
+
+def output_name(relpath, output_format, compress):
+    """ Return the name of the output file for an input file, given as
+        a path relative to the corpus directory """
+    root, ext = os.path.splitext(relpath)
+    if ext.lower() in COMPRESSION_EXTENSIONS:
+        # 'news/2020.txt.gz' -> 'news/2020.txt.tok'
+        relpath = root
+    relpath += FORMAT_EXTENSIONS[output_format]
+    if compress and output_format not in ("parquet", "npy"):
+        relpath += COMPRESSION_SUFFIXES[compress]
+    return relpath
+
+
+def read_manifest(path):
+    """ Return a dict of the completed shards recorded in a manifest,
+        keyed by input path. A line that was cut short when a run
+        was killed is ignored. """
+    done = dict()
+    if not os.path.exists(path):
+        return done
+    with io.open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            done[entry["input"]] = entry
+    return done
+
+
+def tokenize_shard(task):
+    """ Tokenize a single input file into an output file. This function
+        runs in a worker process. The output is written to a temporary
+        file, which replaces the output file once it is complete. """
+    infile_path, outfile_path, settings = task
+    t0 = time.time()
+    outdir = os.path.dirname(outfile_path)
+    try:
+        os.makedirs(outdir)
+    except OSError:
+        # The directory already exists
+        pass
+    partial = outfile_path + ".part"
+    infile = open_infile(infile_path)
+    if settings["format"] in ("parquet", "npy"):
+        try:
+            tokens = export_columns(
+                tokenize(gen_lines(infile), **settings["options"]),
+                partial,
+                format=settings["format"],
+            )
+        finally:
+            infile.close()
+        if os.path.isdir(outfile_path):
+            # A directory of .npy files cannot replace another one
+            shutil.rmtree(outfile_path)
+        replace_file(partial, outfile_path)
+        return infile_path, tokens, time.time() - t0
+    try:
+        outfile = io.TextIOWrapper(
+            open_compressed(partial, "wb", settings["compress"]), encoding="utf-8"
+        )
+        try:
+            tokens = write_tokens(
+                tokenize(gen_lines(infile), **settings["options"]),
+                outfile,
+                csv=settings["format"] == "csv",
+                json=settings["format"] == "json",
+                normalize=settings["normalize"],
+            )
+        finally:
+            outfile.close()
+    finally:
+        infile.close()
+    replace_file(partial, outfile_path)
+    return infile_path, tokens, time.time() - t0
+
+
+def tokenize_corpus(
+    paths,
+    outdir,
+    workers=None,
+    output_format="text",
+    compress=None,
+    normalize=False,
+    progress=None,
+    **options
+):
+    """ Tokenize the input files denoted by paths (see find_inputs())
+        into output files in outdir, in the given output format ('text',
+        'csv' or 'json', as in the tokenize command), optionally compressed
+        ('gzip', 'bz2', 'xz' or 'zstd'), or in a columnar format ('parquet'
+        or 'npy', see columnar.py). The files are distributed across
+        the given number of worker processes, by default one per CPU,
+        largest first. Shards that a previous run with the same settings
+        has completed, and whose input files have not changed since, are
+        skipped. If given, progress(entry) is called with the manifest
+        entry of each completed shard. Returns a CorpusInfo tuple. Raises
+        ValueError if two input files would have the same output file,
+        such as 'a.txt' and 'a.txt.gz'. """
+    t0 = time.time()
+    files, base = find_inputs(paths, exclude=outdir)
+    settings = dict(
+        options=options,
+        format=output_format,
+        compress=compress,
+        normalize=normalize,
+    )
+    manifest_path = os.path.join(outdir, MANIFEST_NAME)
+    done = read_manifest(manifest_path)
+    tasks = []
+    entries = dict()
+    # The input file of each output file
+    outputs = dict()
+    skipped = 0
+    for path in files:
+        relpath = os.path.relpath(path, base)
+        output = output_name(relpath, output_format, compress)
+        if output in outputs:
+            raise ValueError(
+                "Input files {0} and {1} would both be tokenized into {2}".format(
+                    outputs[output], relpath, output
+                )
+            )
+        outputs[output] = relpath
+        st = os.stat(path)
+        entry = dict(
+            input=relpath,
+            output=output,
+            size=st.st_size,
+            mtime=st.st_mtime,
+            settings=settings,
+        )
+        prev = done.get(relpath)
+        if (
+            prev is not None
+            and all(prev.get(k) == entry[k] for k in ("output", "size", "mtime", "settings"))
+            and os.path.exists(os.path.join(outdir, entry["output"]))
+        ):
+            skipped += 1
+            continue
+        entries[path] = entry
+        tasks.append((path, os.path.join(outdir, entry["output"]), settings))
+    # Start with the largest files, to keep all the workers busy to the end
+    tasks.sort(key=lambda task: -entries[task[0]]["size"])
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    pool = None
+    if workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(workers, len(tasks)))
+        results = pool.imap_unordered(tokenize_shard, tasks)
+    else:
+        results = (tokenize_shard(task) for task in tasks)
+
+    total_bytes = 0
+    total_tokens = 0
+    try:
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        with io.open(manifest_path, "a", encoding="utf-8") as manifest:
+            for path, tokens, seconds in results:
+                entry = entries[path]
+                entry["tokens"] = tokens
+                entry["seconds"] = round(seconds, 3)
+                # Record the shard as soon as it is complete
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest.flush()
+                os.fsync(manifest.fileno())
+                total_bytes += entry["size"]
+                total_tokens += tokens
+                if progress is not None:
+                    progress(entry)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return CorpusInfo(
+        len(tasks), skipped, total_bytes, total_tokens, time.time() - t0
+    )
+
+
+# Define the command line arguments
+
+parser = argparse.ArgumentParser(
+    description="Tokenizes a corpus of Icelandic text files in parallel",
+    parents=[options_parser],
+)
+
+parser.add_argument(
+    "inputs",
+    nargs="+",
+    help="Input files, directories or glob patterns of UTF-8 text files, "
+    "optionally compressed (.gz, .bz2, .xz, .zst)",
+)
+
+parser.add_argument(
+    "-o",
+    "--outdir",
+    required=True,
+    help="Output directory, which mirrors the directory tree of the inputs",
+)
+
+parser.add_argument(
+    "-j",
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of worker processes (default: one per CPU)",
+)
+
+parser.add_argument(
+    "-v",
+    "--verbose",
+    action="store_true",
+    help="Report each shard as it is completed",
+)
+
+
+def main():
+    """ Main function, called when the tokenize-corpus command is invoked """
+
+    args = parser.parse_args()
+
+    if args.csv:
+        output_format = "csv"
+    elif args.json:
+        output_format = "json"
+    elif args.columns:
+        output_format = default_format()
+    else:
+        output_format = "text"
+
+    def progress(entry):
+        print(
+            "{0} -> {1}: {2:,} tokens in {3:.1f} s".format(
+                entry["input"], entry["output"], entry["tokens"], entry["seconds"]
+            ),
+            file=sys.stderr,
+        )
+
+    try:
+        info = tokenize_corpus(
+            args.inputs,
+            args.outdir,
+            workers=args.workers,
+            output_format=output_format,
+            compress=args.compress,
+            normalize=args.normalize,
+            progress=progress if args.verbose else None,
+            **tokenize_options(args)
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    seconds = info.seconds or 1e-9
+    print(
+        "{0:,} shards tokenized ({1:,} already done): {2:,.1f} MB, {3:,} tokens "
+        "in {4:.1f} s, {5:,.2f} MB/s, {6:,.0f} tokens/s".format(
+            info.shards,
+            info.skipped,
+            info.bytes / 1e6,
+            info.tokens,
+            info.seconds,
+            info.bytes / 1e6 / seconds,
+            info.tokens / seconds,
+        ),
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
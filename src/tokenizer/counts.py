@@ -0,0 +1,452 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+
+    Tokenizer for Icelandic text
+
+    Copyright (C) 2021 Miðeind ehf.
+    Original author: Vilhjálmur Þorsteinsson
+
+    This software is licensed under the MIT License:
+
+        Permission is hereby granted, free of charge, to any person
+        obtaining a copy of this software and associated documentation
+        files (the "Software"), to deal in the Software without restriction,
+        including without limitation the rights to use, copy, modify, merge,
+        publish, distribute, sublicense, and/or sell copies of the Software,
+        and to permit persons to whom the Software is furnished to do so,
+        subject to the following conditions:
+
+        The above copyright notice and this permission notice shall be
+        included in all copies or substantial portions of the Software.
+
+        THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+        EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+        MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+        IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+        CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+        TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+        SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+    This module counts tokens, for building frequency lists from a corpus.
+    A TokenCounts object consumes a stream of tokens, such as the output
+    of tokenize(), and counts the tokens of each kind, the word forms
+    (token texts), the normalized forms (normalized token texts in lower
+    case) and optionally the bigrams, i.e. the pairs of adjacent
+    normalized forms within a sentence. Counts can be merged, so that
+    the files of a corpus can be counted in parallel worker processes
+    (count_corpus()), and saved to count files that can be merged later.
+    The counts are written out as frequency tables, sorted by descending
+    frequency. The main() function of this module is registered as the
+    'tokenize-count' console_script entry point in setup.py.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import io
+import sys
+import json
+import time
+import array
+import argparse
+import multiprocessing
+
+from .tokenizer import TOK, tokenize, open_compressed
+from .definitions import COMPRESSION_EXTENSIONS
+from .corpus import find_inputs
+from .main import open_infile, gen_lines
+
+
+# The token kinds whose texts are counted by default
+COUNTED_KINDS = frozenset((TOK.WORD,))
+
+# A bigram of the normalized forms numbered a and b is
+# stored as the single integer a * BIGRAM_BASE + b
+BIGRAM_BASE = 1 << 32
+
+# Array type code of counts (64-bit integers; the 'q' type
+# code is not available on Python 2.7, where 'l' is 64-bit
+# on most platforms)
+COUNT_TYPECODE = "q" if "q" in getattr(array, "typecodes", "") else "l"
+
+# Count files are recognized by this name suffix,
+# optionally followed by a compression extension
+COUNTS_SUFFIX = ".counts.json"
+
+# Format version of count files
+COUNTS_VERSION = 1
+
+# The frequency tables, in order, and their file names
+TABLES = ("kinds", "forms", "normalized", "bigrams")
+TABLE_NAMES = {name: name + ".tsv" for name in TABLES}
+
+
+class TokenCounts:
+
+    """ Frequency counts from streams of tokens. Each distinct normalized
+        form is stored once, sharing the string of the word form when they
+        are equal, and numbered in the order of its first occurrence. The
+        counts of the normalized forms are kept in an array, by number, and
+        the bigrams are stored as pairs of such numbers packed into single
+        integers, rather than as tuples of strings. TokenCounts objects
+        can be pickled, e.g. for returning them from worker processes, and
+        saved to count files. """
+
+    def __init__(self, kinds=COUNTED_KINDS, bigrams=False):
+        # The kinds of tokens whose texts are counted
+        self.counted_kinds = frozenset(kinds)
+        self.count_bigrams = bigrams
+        # Number of tokens, by kind
+        self.kinds = dict()
+        # Number of occurrences, by word form
+        self.forms = dict()
+        # Normalized forms, by number, their numbers and their counts
+        self.normalized = []
+        self.ids = dict()
+        self.normalized_counts = array.array(COUNT_TYPECODE)
+        # Number of occurrences, by packed pair of normalized form numbers
+        self.bigrams = dict()
+
+    @property
+    def tokens(self):
+        """ The total number of tokens counted """
+        return sum(self.kinds.values())
+
+    def _id(self, norm):
+        """ Return the number of a normalized form, adding it if new """
+        i = self.ids.get(norm)
+        if i is None:
+            i = len(self.normalized)
+            self.ids[norm] = i
+            self.normalized.append(norm)
+            self.normalized_counts.append(0)
+        return i
+
+    def update(self, tokens):
+        """ Count the tokens in a stream of tokens, returning the
+            number of tokens counted """
+        kinds = self.kinds
+        forms = self.forms
+        ids = self.ids
+        normalized = self.normalized
+        counts = self.normalized_counts
+        bigrams = self.bigrams if self.count_bigrams else None
+        counted = self.counted_kinds
+        punctuation = TOK.PUNCTUATION
+        n = 0
+        # The number of the preceding normalized form, if any, in a run
+        # of adjacent tokens of the counted kinds
+        prev = -1
+        for t in tokens:
+            n += 1
+            kind = t.kind
+            kinds[kind] = kinds.get(kind, 0) + 1
+            txt = t.txt
+            if kind not in counted or not txt:
+                prev = -1
+                continue
+            forms[txt] = forms.get(txt, 0) + 1
+            # Inline normalized_text()
+            norm = (t.val[1] if kind == punctuation else txt).lower()
+            i = ids.get(norm)
+            if i is None:
+                if norm == txt:
+                    # Share the string with the word form
+                    norm = txt
+                i = len(normalized)
+                ids[norm] = i
+                normalized.append(norm)
+                counts.append(1)
+            else:
+                counts[i] += 1
+            if bigrams is not None:
+                if prev >= 0:
+                    key = prev * BIGRAM_BASE + i
+                    bigrams[key] = bigrams.get(key, 0) + 1
+                prev = i
+        return n
+
+    def merge(self, other):
+        """ Add the counts of another TokenCounts object to this one """
+        if (
+            other.counted_kinds != self.counted_kinds
+            or other.count_bigrams != self.count_bigrams
+        ):
+            raise ValueError("Cannot merge counts of different kinds of tokens")
+        for d, other_d in ((self.kinds, other.kinds), (self.forms, other.forms)):
+            for key, count in other_d.items():
+                d[key] = d.get(key, 0) + count
+        counts = self.normalized_counts
+        # The numbers of the other object's normalized forms in this one
+        renumber = []
+        for norm, count in zip(other.normalized, other.normalized_counts):
+            i = self._id(norm)
+            counts[i] += count
+            renumber.append(i)
+        bigrams = self.bigrams
+        for key, count in other.bigrams.items():
+            a, b = divmod(key, BIGRAM_BASE)
+            key = renumber[a] * BIGRAM_BASE + renumber[b]
+            bigrams[key] = bigrams.get(key, 0) + count
+
+    def table(self, name, min_count=1):
+        """ Return a frequency table, i.e. a list of (key, count) tuples
+            sorted by descending count and then by key, of the counts of
+            the given name: 'kinds' (keyed by kind name), 'forms',
+            'normalized' or 'bigrams' (keyed by pairs of normalized
+            forms). Keys with a count below min_count are omitted. """
+        if name == "kinds":
+            items = (
+                (TOK.descr.get(kind, str(kind)), count)
+                for kind, count in self.kinds.items()
+            )
+        elif name == "forms":
+            items = self.forms.items()
+        elif name == "normalized":
+            items = zip(self.normalized, self.normalized_counts)
+        elif name == "bigrams":
+            normalized = self.normalized
+            items = (
+                (
+                    (normalized[key // BIGRAM_BASE], normalized[key % BIGRAM_BASE]),
+                    count,
+                )
+                for key, count in self.bigrams.items()
+            )
+        else:
+            raise ValueError("Unknown frequency table '{0}'".format(name))
+        return sorted(
+            ((key, count) for key, count in items if count >= min_count),
+            key=lambda item: (-item[1], item[0]),
+        )
+
+    def write_tables(self, outdir, min_count=1):
+        """ Write the frequency tables to tab-separated files in outdir,
+            one line per key, with the count in the last column.
+            Returns the paths of the files. """
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        paths = []
+        for name in TABLES:
+            if name == "bigrams" and not self.count_bigrams:
+                continue
+            path = os.path.join(outdir, TABLE_NAMES[name])
+            with io.open(path, "w", encoding="utf-8") as f:
+                for key, count in self.table(name, min_count):
+                    if name == "bigrams":
+                        key = "\t".join(key)
+                    f.write("{0}\t{1}\n".format(key, count))
+            paths.append(path)
+        return paths
+
+    def save(self, path):
+        """ Save the counts to a count file, in JSON format, which is
+            compressed if its name ends with a compression extension """
+        data = dict(
+            version=COUNTS_VERSION,
+            counted_kinds=sorted(self.counted_kinds),
+            count_bigrams=self.count_bigrams,
+            kinds=[[kind, count] for kind, count in self.kinds.items()],
+            forms=self.forms,
+            normalized=self.normalized,
+            normalized_counts=self.normalized_counts.tolist(),
+            bigrams=[
+                list(divmod(key, BIGRAM_BASE)) + [count]
+                for key, count in self.bigrams.items()
+            ],
+        )
+        with io.TextIOWrapper(open_compressed(path, "wb"), encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+    @classmethod
+    def load(cls, path):
+        """ Load counts from a count file that save() wrote """
+        with io.TextIOWrapper(open_compressed(path, "rb"), encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != COUNTS_VERSION:
+            raise ValueError("'{0}' is not a count file of a known version".format(path))
+        counts = cls(data["counted_kinds"], data["count_bigrams"])
+        counts.kinds = {kind: count for kind, count in data["kinds"]}
+        counts.forms = data["forms"]
+        counts.normalized = data["normalized"]
+        counts.ids = {norm: i for i, norm in enumerate(counts.normalized)}
+        counts.normalized_counts = array.array(COUNT_TYPECODE, data["normalized_counts"])
+        counts.bigrams = {a * BIGRAM_BASE + b: count for a, b, count in data["bigrams"]}
+        return counts
+
+
+def is_count_file(path):
+    """ Return True if the file name denotes a count file """
+    root, ext = os.path.splitext(path)
+    if ext.lower() in COMPRESSION_EXTENSIONS:
+        path = root
+    return path.endswith(COUNTS_SUFFIX)
+
+
+def count_file(task):
+    """ Count the tokens in a single input file, or load the counts from
+        a count file. This function runs in a worker process. """
+    path, kinds, bigrams, options = task
+    t0 = time.time()
+    if is_count_file(path):
+        counts = TokenCounts.load(path)
+    else:
+        counts = TokenCounts(kinds, bigrams)
+        infile = open_infile(path)
+        try:
+            counts.update(tokenize(gen_lines(infile), **options))
+        finally:
+            infile.close()
+    return path, counts, time.time() - t0
+
+
+def count_corpus(
+    paths,
+    workers=None,
+    kinds=COUNTED_KINDS,
+    bigrams=False,
+    progress=None,
+    exclude=None,
+    **options
+):
+    """ Count the tokens in the input files denoted by paths (see
+        corpus.find_inputs()), with the given tokenization options, and
+        merge the counts from any count files among them. The files are
+        counted in the given number of worker processes, by default one
+        per CPU, largest first, and the counts are merged as the workers
+        complete them. If given, progress(path, counts, seconds) is
+        called for each file. The directory exclude, such as the output
+        directory of a previous run, is not searched for input files.
+        Returns a TokenCounts object. """
+    files, _ = find_inputs(paths, exclude=exclude)
+    files.sort(key=lambda path: -os.path.getsize(path))
+    tasks = [(path, kinds, bigrams, options) for path in files]
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    pool = None
+    if workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(workers, len(tasks)))
+        results = pool.imap_unordered(count_file, tasks)
+    else:
+        results = (count_file(task) for task in tasks)
+    total = TokenCounts(kinds, bigrams)
+    try:
+        for path, counts, seconds in results:
+            total.merge(counts)
+            if progress is not None:
+                progress(path, counts, seconds)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return total
+
+
+# Define the command line arguments
+
+parser = argparse.ArgumentParser(
+    description="Counts the tokens, word forms and bigrams in a corpus "
+    "of Icelandic text files"
+)
+
+parser.add_argument(
+    "inputs",
+    nargs="+",
+    help="Input files, directories or glob patterns of UTF-8 text files, "
+    "optionally compressed (.gz, .bz2, .xz, .zst), and of count files "
+    "(*" + COUNTS_SUFFIX + ") to merge",
+)
+
+parser.add_argument(
+    "-o",
+    "--outdir",
+    required=True,
+    help="Output directory for the frequency tables and the count file",
+)
+
+parser.add_argument(
+    "-j",
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of worker processes (default: one per CPU)",
+)
+
+parser.add_argument(
+    "-b",
+    "--bigrams",
+    action="store_true",
+    help="Count bigrams of adjacent normalized word forms",
+)
+
+parser.add_argument(
+    "--min-count",
+    type=int,
+    default=1,
+    help="Omit keys that occur fewer times from the frequency tables",
+)
+
+parser.add_argument(
+    "-s",
+    "--one_sent_per_line",
+    action="store_true",
+    help="Input contains one sentence per line",
+)
+
+parser.add_argument(
+    "-v",
+    "--verbose",
+    action="store_true",
+    help="Report each file as it is counted",
+)
+
+
+def main():
+    """ Main function, called when the tokenize-count command is invoked """
+
+    args = parser.parse_args()
+
+    def progress(path, counts, seconds):
+        print(
+            "{0}: {1:,} tokens in {2:.1f} s".format(path, counts.tokens, seconds),
+            file=sys.stderr,
+        )
+
+    t0 = time.time()
+    try:
+        counts = count_corpus(
+            args.inputs,
+            workers=args.workers,
+            bigrams=args.bigrams,
+            progress=progress if args.verbose else None,
+            exclude=args.outdir,
+            one_sent_per_line=args.one_sent_per_line,
+        )
+    except (IOError, OSError, ValueError) as e:
+        parser.error(str(e))
+    counts.write_tables(args.outdir, args.min_count)
+    # The merged counts, for merging with other counts later
+    counts.save(os.path.join(args.outdir, "corpus" + COUNTS_SUFFIX + ".gz"))
+    seconds = time.time() - t0 or 1e-9
+    print(
+        "{0:,} tokens, {1:,} word forms, {2:,} normalized forms, {3:,} bigrams "
+        "in {4:.1f} s, {5:,.0f} tokens/s".format(
+            counts.tokens,
+            len(counts.forms),
+            len(counts.normalized),
+            len(counts.bigrams),
+            seconds,
+            counts.tokens / seconds,
+        ),
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -32,7 +32,7 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-from typing import Dict, Tuple, Union, Callable
+from typing import Any, Dict, Tuple, Union, Callable
 
 import sys
 import re
@@ -64,6 +64,70 @@ else:
     is_str = lambda s: isinstance(s, (unicode, str))
 
 
+def trie_regex(words):
+    """ Return a regex string that matches any of the given words,
+        factored into a prefix tree ('trie') so that the regex engine
+        does not need to try each alternative in turn. As in a flat
+        alternation sorted in descending order by length, longer
+        words are matched before shorter ones sharing the same prefix. """
+    trie = {}  # type: Dict[unicode, Any]
+    for word in words:
+        node = trie
+        for c in word:
+            node = node.setdefault(c, {})
+        # The empty string marks the end of a word
+        node[""] = None
+
+    def subtree(node):
+        """ Return the regex string for the subtree under node """
+        alternatives = []
+        single_chars = []
+        for c in sorted(k for k in node if k):
+            child = node[c]
+            if len(child) == 1 and "" in child:
+                # Leaf node: collect into a character class
+                single_chars.append(c)
+            else:
+                alternatives.append(re.escape(c) + subtree(child))
+        if len(single_chars) == 1:
+            alternatives.append(re.escape(single_chars[0]))
+        elif single_chars:
+            alternatives.append(
+                "[" + "".join(re.escape(c) for c in single_chars) + "]"
+            )
+        if "" in node:
+            # A word ends here: the rest is optional, but greedy
+            return "(?:" + "|".join(alternatives) + ")?"
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    return subtree(trie)
+
+
+class LazyRegex(object):
+
+    """ A compiled regex that is constructed on first use, i.e. not when
+        this module is imported. The pattern parameter is a function that
+        returns the regex string. Attribute access, such as .match()
+        or .search(), is delegated to the compiled regex object. """
+
+    def __init__(self, pattern, flags=0):
+        # type: (Callable[[], unicode], int) -> None
+        self._pattern = pattern
+        self._flags = flags
+        self._regex = None  # type: Any
+
+    def __getattr__(self, name):
+        # Only called for attributes that have not been cached
+        # in the instance, i.e. on first access to each of them
+        if self._regex is None:
+            self._regex = re.compile(self._pattern(), self._flags)
+        value = getattr(self._regex, name)
+        setattr(self, name, value)
+        return value
+
+
 ACCENT = unicode_chr(769)
 UMLAUT = unicode_chr(776)
 SOFT_HYPHEN = unicode_chr(173)
@@ -151,6 +215,21 @@ TP_SPACE = (
     (True, True, False, False, True),
 )
 
+# Punctuation type of each punctuation character, precomputed for fast lookup
+# by TOK.Punctuation(), correct_spaces() and detokenize(). Characters that
+# occur in more than one of the strings above are left punctuation in
+# preference to right, none and center punctuation, in that order.
+PUNCTUATION_CLASS = dict(
+    (c, tp)
+    for chars, tp in (
+        (CENTER_PUNCTUATION, TP_CENTER),
+        (NONE_PUNCTUATION, TP_NONE),
+        (RIGHT_PUNCTUATION, TP_RIGHT),
+        (LEFT_PUNCTUATION, TP_LEFT),
+    )
+    for c in chars
+)
+
 # Punctuation that ends a sentence
 END_OF_SENTENCE = frozenset([".", "?", "!", "…"])  # Removed […]
 # Punctuation symbols that may additionally occur at the end of a sentence
@@ -160,6 +239,9 @@ SENTENCE_FINISHERS = frozenset([")", "]", "“", "»", "”", "’", '"', "[…]
 PUNCT_INSIDE_WORD = frozenset([".", "'", "‘", "´", "’", HYPHEN, EN_DASH])
 # Punctuation symbols that can end words
 PUNCT_ENDING_WORD = frozenset(["'", "²", "³"])
+# Punctuation symbols that are split off the end of a word as plain,
+# unnormalized punctuation tokens ('orð.', 'orð,'), allowing a shortcut
+PUNCT_AFTER_WORD = frozenset([".", ",", ":", ";", "!", "?", ")", "]"])
 # Punctuation symbols that may occur together
 PUNCT_COMBINATIONS = frozenset(["?", "!", "…"])
 
@@ -178,6 +260,31 @@ COUNTRY_CODES = frozenset(("354", "+354", "00354",))
 # Words that can precede a year number; will be assimilated into the year token
 YEAR_WORD = frozenset(("árið", "ársins", "árinu"))
 
+# Default maximum number of entries in the parse_digits() result cache
+DIGITS_CACHE_SIZE = 1024
+
+# Default maximum number of paragraphs in the shared tokenization result cache
+PARAGRAPH_CACHE_SIZE = 1024
+
+# Number of characters or bytes read at a time from a stream in chunked mode
+STREAM_BLOCK_SIZE = 65536
+
+# Compression formats of input and output files, by file name extension
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zst": "zstd",
+}
+
+# Compression formats of input files, by the magic bytes at their start
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+
 # Characters that can start a numeric token
 DIGITS_PREFIX = frozenset([d for d in "0123456789"])
 SIGN_PREFIX = frozenset(("+", "-"))
@@ -987,15 +1094,13 @@ TOP_LEVEL_DOMAINS = frozenset(
     )
 )
 
-# This is a small hack to satisfy the Mypy type checker
-_escape = lambda s: re.escape(s)  # type: Callable[[unicode], unicode]
-
 # Regex to recognise domain names
 MIN_DOMAIN_LENGTH = 4  # E.g. "t.co"
-DOMAIN_REGEX = re.compile(
-    r"({0})({1}*)$".format(
-        r"|".join(r"\w\." + d for d in map(_escape, TOP_LEVEL_DOMAINS)),
-        PUNCTUATION_REGEX,
+# The top level domains are factored into a prefix tree, and the regex
+# is compiled on first use
+DOMAIN_REGEX = LazyRegex(
+    lambda: r"(\w\.{0})({1}*)$".format(
+        trie_regex(TOP_LEVEL_DOMAINS), PUNCTUATION_REGEX
     ),
     re.UNICODE,
 )
@@ -1128,8 +1233,11 @@ ELEMENTS = (
 # Regex to recognize molecules ('H2SO4')
 # Note that we place a further constraint on the token so that
 # it must contain at least one digit to qualify as a molecular formula
-ELEMENTS_REGEX = r"|".join(ELEMENTS)
-MOLECULE_REGEX = re.compile(r"^(({0})+\d*)+".format(ELEMENTS_REGEX))
+# The element symbols are factored into a prefix tree ('C', 'Ca', 'Cd'...
+# becomes 'C(?:[adeflmnorsu])?'), which preserves the preference for
+# two-letter symbols over single-letter ones
+ELEMENTS_REGEX = trie_regex(ELEMENTS)
+MOLECULE_REGEX = LazyRegex(lambda: r"^(({0})+\d*)+".format(ELEMENTS_REGEX))
 MOLECULE_FILTER = re.compile(r"\d")
 
 
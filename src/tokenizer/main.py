@@ -42,100 +42,91 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import sys
+import io
 import argparse
 import json
 from functools import partial
 
-from .tokenizer import TOK, tokenize
+from .tokenizer import TOK, tokenize, open_compressed
 from .definitions import make_str
 
 
-if sys.version_info >= (3, 0):
-    # Python 3: read and write strings from and to UTF-8 encoded files
-    ReadFile = argparse.FileType("r", encoding="utf-8")
-    WriteFile = argparse.FileType("w", encoding="utf-8")
-else:
-    # Python 2: read and write bytes, which are decoded from UTF-8 in the gen() function
-    ReadFile = argparse.FileType("r")
-    WriteFile = argparse.FileType("w")
+# Define the command line arguments. The tokenization options and the
+# output format are shared with the tokenize-corpus command (corpus.py).
 
-# Define the command line arguments
+options_parser = argparse.ArgumentParser(add_help=False)
 
-parser = argparse.ArgumentParser(description="Tokenizes Icelandic text")
-
-parser.add_argument(
-    "infile",
-    nargs="?",
-    type=ReadFile,
-    default=sys.stdin,
-    help="UTF-8 text file to tokenize",
-)
-parser.add_argument(
-    "outfile",
-    nargs="?",
-    type=WriteFile,
-    default=sys.stdout,
-    help="UTF-8 output text file",
+options_parser.add_argument(
+    "-z",
+    "--compress",
+    choices=["gzip", "bz2", "xz", "zstd"],
+    help="Compress the output in the given format",
 )
 
-group = parser.add_mutually_exclusive_group()
+group = options_parser.add_mutually_exclusive_group()
 group.add_argument(
     "--csv", help="Output one token per line in CSV format", action="store_true"
 )
 group.add_argument(
     "--json", help="Output one token per line in JSON format", action="store_true"
 )
+group.add_argument(
+    "--columns",
+    help="Output the tokens in a columnar layout: a Parquet file if pyarrow is "
+    "installed, otherwise a directory of NumPy .npy files",
+    action="store_true",
+)
 
-parser.add_argument(
+options_parser.add_argument(
     "-s",
     "--one_sent_per_line",
     action="store_true",
     help="Input contains one sentence per line",
 )
 
-parser.add_argument(
+options_parser.add_argument(
     "-m",
     "--convert_measurements",
     action="store_true",
     help="Degree signal in temperature tokens normalized (200° C -> 200 °C)",
 )
 
-parser.add_argument(
+options_parser.add_argument(
     "-p",
     "--coalesce_percent",
     action="store_true",
     help="Numbers combined into one token with percentage word forms (prósent/prósentustig/hundraðshlutar)",
 )
 
-parser.add_argument(
+options_parser.add_argument(
     "-n",
     "--normalize",
     action="store_true",
     help="Outputs normalized value of punctuation tokens instead of original text",
 )
 
-parser.add_argument(
+options_parser.add_argument(
     "-g",
     "--keep_composite_glyphs",
     action="store_true",
     help="Composite glyphs not replaced with a single code point",
 )
 
-parser.add_argument(
+options_parser.add_argument(
     "-e",
     "--replace_html_escapes",
     action="store_true",
     help="Escape codes from HTML replaced",
 )
 
-parser.add_argument(
+options_parser.add_argument(
     "-c",
     "--convert_numbers",
     action="store_true",
     help="English-style decimal points and thousands separators in numbers changed to Icelandic style",
 )
 
-parser.add_argument(
+options_parser.add_argument(
     "-k",
     "--handle_kludgy_ordinals",
     type=int,
@@ -143,68 +134,119 @@ parser.add_argument(
     help="Kludgy ordinal handling defined. \n\t0: Returns the original word form. \n\t1: Ordinals returned as pure words. \n\t2: Ordinals returned as numbers.",
 )
 
+parser = argparse.ArgumentParser(
+    description="Tokenizes Icelandic text", parents=[options_parser]
+)
 
-def main():
-    """ Main function, called when the tokenize command is invoked """
-
-    args = parser.parse_args()
-    options = dict()
+parser.add_argument(
+    "infile",
+    nargs="?",
+    default="-",
+    help="UTF-8 text file to tokenize, optionally compressed (.gz, .bz2, .xz, .zst)",
+)
+parser.add_argument(
+    "outfile",
+    nargs="?",
+    default="-",
+    help="UTF-8 output text file, compressed if its name ends with .gz, .bz2, .xz or .zst",
+)
 
-    def quote(s):
-        """ Return the string s within double quotes, and with any contained
-            backslashes and double quotes escaped with a backslash """
-        return '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
-
-    def gen(f):
-        """ Generate the lines of text in the input file """
-        for line in f:
-            yield make_str(line)
-
-    def val(t, quote_word=False):
-        """ Return the value part of the token t """
-        if t.val is None:
-            return None
-        if t.kind == TOK.WORD:
-            # Get the full expansion of an abbreviation
-            if quote_word:
-                # Return a |-delimited list of possible meanings,
-                # joined into a single string
-                return quote("|".join(m[0] for m in t.val))
-            # Return a list of all possible meanings
-            return [m[0] for m in t.val]
-        if t.kind in {TOK.PERCENT, TOK.NUMBER, TOK.CURRENCY}:
-            return t.val[0]
-        if t.kind == TOK.AMOUNT:
-            if quote_word:
-                # Format as "1234.56|USD"
-                return '"{0}|{1}"'.format(t.val[0], t.val[1])
-            return t.val[0], t.val[1]
-        if t.kind == TOK.S_BEGIN:
-            return None
-        if t.kind == TOK.PUNCTUATION:
-            return quote(t.val[1]) if quote_word else t.val[1]
-        if quote_word and t.kind in {
-            TOK.DATE,
-            TOK.TIME,
-            TOK.DATEABS,
-            TOK.DATEREL,
-            TOK.TIMESTAMP,
-            TOK.TIMESTAMPABS,
-            TOK.TIMESTAMPREL,
-            TOK.TELNO,
-            TOK.NUMWLETTER,
-            TOK.MEASUREMENT,
-        }:
-            # Return a |-delimited list of numbers
-            return quote("|".join(str(v) for v in t.val))
-        if quote_word and isinstance(t.val, str):
-            return quote(t.val)
-        return t.val
-
-    if args.normalize:
-        to_text = lambda t: (t.val[1] if t.kind == TOK.PUNCTUATION else t.txt)
+# Configure our JSON dump function
+json_dumps = partial(json.dumps, ensure_ascii=False, separators=(",", ":"))
+
+
+def open_infile(name):
+    """ Open the input file, decompressing it if required, for reading
+        lines of text. The name '-' denotes stdin. """
+    if name == "-":
+        buffer = getattr(sys.stdin, "buffer", None)
+        if buffer is None:
+            # Python 2 has no binary stdin buffer: open one on the file
+            # descriptor, leaving it open. The bytes that are read to
+            # detect the compression stay in this buffer, so the input
+            # is read through it whether or not it is compressed.
+            buffer = io.open(sys.stdin.fileno(), "rb", closefd=False)
+            stream = open_compressed(buffer, "rb")
+        else:
+            stream = open_compressed(buffer, "rb")
+            if stream is buffer:
+                return sys.stdin
     else:
-        to_text = lambda t: t.txt
+        stream = open_compressed(name, "rb")
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def open_outfile(name, compression):
+    """ Open the output file, compressing it if required, for writing
+        lines of text. The name '-' denotes stdout. """
+    if name == "-":
+        if compression is None:
+            return sys.stdout
+        stream = getattr(sys.stdout, "buffer", sys.stdout)
+        stream = open_compressed(stream, "wb", compression)
+    else:
+        stream = open_compressed(name, "wb", compression)
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def gen_lines(f):
+    """ Generate the lines of text in the input file """
+    for line in f:
+        yield make_str(line)
+
+
+def quote(s):
+    """ Return the string s within double quotes, and with any contained
+        backslashes and double quotes escaped with a backslash """
+    return '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def val(t, quote_word=False):
+    """ Return the value part of the token t """
+    if t.val is None:
+        return None
+    if t.kind == TOK.WORD:
+        # Get the full expansion of an abbreviation
+        if quote_word:
+            # Return a |-delimited list of possible meanings,
+            # joined into a single string
+            return quote("|".join(m[0] for m in t.val))
+        # Return a list of all possible meanings
+        return [m[0] for m in t.val]
+    if t.kind in {TOK.PERCENT, TOK.NUMBER, TOK.CURRENCY}:
+        return t.val[0]
+    if t.kind == TOK.AMOUNT:
+        if quote_word:
+            # Format as "1234.56|USD"
+            return '"{0}|{1}"'.format(t.val[0], t.val[1])
+        return t.val[0], t.val[1]
+    if t.kind == TOK.S_BEGIN:
+        return None
+    if t.kind == TOK.PUNCTUATION:
+        return quote(t.val[1]) if quote_word else t.val[1]
+    if quote_word and t.kind in {
+        TOK.DATE,
+        TOK.TIME,
+        TOK.DATEABS,
+        TOK.DATEREL,
+        TOK.TIMESTAMP,
+        TOK.TIMESTAMPABS,
+        TOK.TIMESTAMPREL,
+        TOK.TELNO,
+        TOK.NUMWLETTER,
+        TOK.MEASUREMENT,
+    }:
+        # Return a |-delimited list of numbers
+        return quote("|".join(str(v) for v in t.val))
+    if quote_word and isinstance(t.val, str):
+        return quote(t.val)
+    return t.val
+
+
+def tokenize_options(args):
+    """ Return a dict of tokenize() options from the parsed command line
+        arguments """
+    options = dict()
 
     if args.convert_measurements:
         options["convert_measurements"] = True
@@ -227,24 +269,37 @@ def main():
     if args.handle_kludgy_ordinals:
         options["handle_kludgy_ordinals"] = args.handle_kludgy_ordinals
 
-    # Configure our JSON dump function
-    json_dumps = partial(json.dumps, ensure_ascii=False, separators=(",", ":"))
+    return options
+
+
+def write_tokens(tokens, outfile, csv=False, json=False, normalize=False):
+    """ Write the tokens to the output file, either in CSV or JSON format,
+        one token per line, or as one sentence per line with the tokens
+        separated by spaces. Returns the number of tokens written. """
+
+    if normalize:
+        to_text = lambda t: (t.val[1] if t.kind == TOK.PUNCTUATION else t.txt)
+    else:
+        to_text = lambda t: t.txt
+
     curr_sent = []
+    count = 0
 
-    for t in tokenize(gen(args.infile), **options):
-        if args.csv:
+    for t in tokens:
+        count += 1
+        if csv:
             # Output the tokens in CSV format, one line per token
             if t.txt:
                 print(
                     "{0},{1},{2}".format(
                         t.kind, quote(t.txt), val(t, quote_word=True) or '""'
                     ),
-                    file=args.outfile,
+                    file=outfile,
                 )
             elif t.kind == TOK.S_END:
                 # Indicate end of sentence
-                print('0,"",""', file=args.outfile)
-        elif args.json:
+                print('0,"",""', file=outfile)
+        elif json:
             # Output the tokens in JSON format, one line per token
             d = dict(k=TOK.descr[t.kind])
             if t.txt is not None:
@@ -252,14 +307,14 @@ def main():
             v = val(t)
             if v is not None:
                 d["v"] = v
-            print(json_dumps(d), file=args.outfile)
+            print(json_dumps(d), file=outfile)
         else:
             # Normal shallow parse, one line per sentence,
             # tokens separated by spaces
             if t.kind in TOK.END:
                 # End of sentence/paragraph
                 if curr_sent:
-                    print(" ".join(curr_sent), file=args.outfile)
+                    print(" ".join(curr_sent), file=outfile)
                     curr_sent = []
             else:
                 txt = to_text(t)
@@ -267,7 +322,51 @@ def main():
                     curr_sent.append(txt)
 
     if curr_sent:
-        print(" ".join(curr_sent), file=args.outfile)
+        print(" ".join(curr_sent), file=outfile)
+
+    return count
+
+
+def main():
+    """ Main function, called when the tokenize command is invoked """
+
+    args = parser.parse_args()
+
+    if args.columns:
+        if args.outfile == "-":
+            parser.error("--columns requires an output file name")
+        from .columnar import export_columns
+
+        try:
+            infile = open_infile(args.infile)
+            export_columns(
+                tokenize(gen_lines(infile), **tokenize_options(args)), args.outfile
+            )
+        except (IOError, OSError, EOFError, ValueError) as e:
+            # Including corrupt compressed input, detected while reading
+            parser.error(str(e))
+        if infile is not sys.stdin:
+            infile.close()
+        return
+
+    try:
+        infile = open_infile(args.infile)
+        outfile = open_outfile(args.outfile, args.compress)
+        write_tokens(
+            tokenize(gen_lines(infile), **tokenize_options(args)),
+            outfile,
+            csv=args.csv,
+            json=args.json,
+            normalize=args.normalize,
+        )
+    except (IOError, OSError, EOFError, ValueError) as e:
+        # Including corrupt compressed input, detected while reading
+        parser.error(str(e))
+
+    if infile is not sys.stdin:
+        infile.close()
+    if outfile is not sys.stdout:
+        outfile.close()
 
 
 if __name__ == "__main__":
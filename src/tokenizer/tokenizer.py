@@ -42,10 +42,18 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from itertools import chain
+from operator import attrgetter
+from threading import Lock
 
 import re
+import io
+import os
+import sys
+import codecs
 import datetime
+import hashlib
 import unicodedata
 
 from .abbrev import Abbreviations
@@ -184,16 +192,11 @@ class TOK:
 
     @staticmethod
     def Punctuation(w, normalized=None):
-        tp = TP_CENTER  # Default punctuation type
         if normalized is None:
             normalized = w
-        if normalized and len(normalized) == 1:
-            if normalized in LEFT_PUNCTUATION:
-                tp = TP_LEFT
-            elif normalized in RIGHT_PUNCTUATION:
-                tp = TP_RIGHT
-            elif normalized in NONE_PUNCTUATION:
-                tp = TP_NONE
+        # The default punctuation type, also for punctuation
+        # of more than one character, is TP_CENTER
+        tp = PUNCTUATION_CLASS.get(normalized, TP_CENTER)
         return Tok(TOK.PUNCTUATION, w, (tp, normalized))
 
     @staticmethod
@@ -376,8 +379,99 @@ def is_valid_date(y, m, d):
     return False
 
 
+# Statistics for an LRUCache, as returned by LRUCache.info()
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class LRUCache:
+
+    """ A simple size-bounded cache that evicts the least recently
+        used entry when full. Unlike functools.lru_cache, this class
+        is available on Python 2.7, and its size can be changed and
+        its statistics inspected while it is in use. A maxsize of
+        zero disables the cache. """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._dict = OrderedDict()  # type: OrderedDict
+
+    def get(self, key, default=None):
+        """ Return the value for key, or default if it is not cached """
+        try:
+            value = self._dict.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # Re-insert the entry at the end, as the most recently used one
+        self._dict[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """ Add an entry to the cache, evicting the least
+            recently used entries if the cache is full """
+        if self.maxsize <= 0:
+            return
+        d = self._dict
+        d[key] = value
+        try:
+            while len(d) > self.maxsize:
+                d.popitem(last=False)
+        except KeyError:
+            # Another thread emptied the cache under our feet
+            pass
+
+    def resize(self, maxsize):
+        """ Change the maximum size of the cache, evicting
+            entries if necessary """
+        self.maxsize = maxsize
+        if maxsize <= 0:
+            self._dict.clear()
+            return
+        while len(self._dict) > maxsize:
+            self._dict.popitem(last=False)
+
+    def clear(self):
+        """ Empty the cache and reset its statistics """
+        self._dict.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """ Return the cache statistics as a CacheInfo tuple """
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._dict))
+
+    def hit_rate(self):
+        """ Return the ratio of cache hits to lookups, or 0.0 """
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+
+# Cache of parse_digits() results, keyed on the raw token and the
+# convert_numbers flag. Numeric tokens such as '2021', '1.000' and
+# '10%' recur frequently, and parse_digits() has no side effects.
+# Call DIGITS_CACHE.resize(0) to disable the cache.
+DIGITS_CACHE = LRUCache(maxsize=DIGITS_CACHE_SIZE)
+
+
 def parse_digits(w, convert_numbers):
-    """ Parse a raw token starting with a digit """
+    """ Parse a raw token starting with a digit, returning a tuple
+        of the resulting token and the number of characters eaten.
+        Results are memoized in DIGITS_CACHE. """
+    if DIGITS_CACHE.maxsize <= 0:
+        return _parse_digits(w, convert_numbers)
+    key = (w, convert_numbers)
+    result = DIGITS_CACHE.get(key)
+    if result is None:
+        result = _parse_digits(w, convert_numbers)
+        DIGITS_CACHE.put(key, result)
+    return result
+
+
+def _parse_digits(w, convert_numbers):
+    """ Parse a raw token starting with a digit (not memoized) """
     s = re.match(r"\d{1,2}:\d\d:\d\d,\d\d(?!\d)", w)
     if s:
         # Looks like a 24-hour clock with milliseconds, H:M:S:MS
@@ -698,16 +792,144 @@ def html_escape(match):
     return unicode_chr(int(g[1:]))
 
 
-def gen_from_string(txt, replace_composite_glyphs=True, replace_html_escapes=False, one_sent_per_line=False):
-    """ Generate rough tokens from a string """
+# Combining marks that compose a glyph with the preceding character
+COMPOSING_MARKS = tuple(
+    frozenset(key[1] for key in UNICODE_REPLACEMENTS if len(key) == 2)
+)
+
+# Single characters that are replaced (in practice, removed)
+CHAR_REPLACEMENTS = tuple(
+    (key, value) for key, value in items(UNICODE_REPLACEMENTS) if len(key) == 1
+)
+
+
+def compose_glyphs(txt, mark):
+    """ Replace each composite glyph ending with the given combining mark
+        by a single code point, in a single pass over the text """
+    parts = txt.split(mark)
+    for i in range(1, len(parts)):
+        prev = parts[i - 1]
+        glyph = UNICODE_REPLACEMENTS.get(prev[-1:] + mark)
+        if glyph is None:
+            # Not a known composite glyph: leave the mark in place
+            parts[i] = mark + parts[i]
+        else:
+            parts[i - 1] = prev[:-1] + glyph
+    return "".join(parts)
+
+
+# Statistics for the normalization of text, as returned by
+# NormalizationStats.info()
+NormalizationInfo = namedtuple(
+    "NormalizationInfo", ["documents", "glyph_passes", "escape_passes", "skipped"]
+)
+
+
+class NormalizationStats:
+
+    """ Counts the documents (strings, or lines of an iterable) that
+        replace_glyphs_and_escapes() normalizes, the number of them that
+        needed a composite glyph pass or an HTML escape pass, and the
+        number of them that were passed through untouched. The counts
+        are updated under a lock, so that an instance can be shared by
+        several threads. """
+
+    def __init__(self):
+        self.documents = 0
+        self.glyph_passes = 0
+        self.escape_passes = 0
+        self.skipped = 0
+        self._lock = Lock()
+
+    def record(self, glyph_pass, escape_pass):
+        """ Record the normalization of a single document """
+        with self._lock:
+            self.documents += 1
+            if glyph_pass:
+                self.glyph_passes += 1
+            if escape_pass:
+                self.escape_passes += 1
+            if not (glyph_pass or escape_pass):
+                self.skipped += 1
+
+    def clear(self):
+        """ Reset the statistics """
+        with self._lock:
+            self.documents = 0
+            self.glyph_passes = 0
+            self.escape_passes = 0
+            self.skipped = 0
+
+    def info(self):
+        """ Return the statistics as a NormalizationInfo tuple """
+        with self._lock:
+            return NormalizationInfo(
+                self.documents, self.glyph_passes, self.escape_passes, self.skipped
+            )
+
+    def skip_rate(self):
+        """ Return the ratio of untouched documents to all documents, or 0.0 """
+        return float(self.skipped) / self.documents if self.documents else 0.0
+
+
+# Statistics of all normalization done by the tokenizer
+NORMALIZATION_STATS = NormalizationStats()
+
+
+def replace_glyphs_and_escapes(
+    txt,
+    replace_composite_glyphs=True,
+    replace_html_escapes=False,
+    stats=NORMALIZATION_STATS,
+):
+    """ Replace composite glyphs with single code points ('a' + ACCENT -> 'á'),
+        remove soft hyphens and zero-width spaces and, optionally, replace
+        HTML escapes ('&aacute;' -> 'á'). Each step only runs if the text
+        contains a character that it acts upon, so text that needs no
+        normalization is returned as-is, without being copied.
+        The passes that replaced something are counted in the given
+        NormalizationStats instance, unless stats is None. """
+    glyph_pass = escape_pass = False
     if replace_composite_glyphs:
-        # Replace composite glyphs with single code points
-        txt = UNICODE_REGEX.sub(
-            lambda match: UNICODE_REPLACEMENTS[match.group(0)], txt,
-        )
-    if replace_html_escapes:
-        # Replace HTML escapes: '&aacute;' -> 'á'
-        txt = HTML_ESCAPE_REGEX.sub(html_escape, txt)
+        for mark in COMPOSING_MARKS:
+            if mark in txt:
+                # A mark that does not follow a vowel is left in place
+                composed = compose_glyphs(txt, mark)
+                if composed != txt:
+                    txt = composed
+                    glyph_pass = True
+        for ch, replacement in CHAR_REPLACEMENTS:
+            if ch in txt:
+                txt = txt.replace(ch, replacement)
+                glyph_pass = True
+    if replace_html_escapes and "&" in txt:
+        # Not every '&' starts an escape code
+        unescaped = HTML_ESCAPE_REGEX.sub(html_escape, txt)
+        if unescaped != txt:
+            txt = unescaped
+            escape_pass = True
+    if stats is not None:
+        stats.record(glyph_pass, escape_pass)
+    return txt
+
+
+def gen_from_string(
+    txt,
+    replace_composite_glyphs=True,
+    replace_html_escapes=False,
+    one_sent_per_line=False,
+    normalization_stats=NORMALIZATION_STATS,
+):
+    """ Generate rough tokens from a string """
+    txt = replace_glyphs_and_escapes(
+        txt, replace_composite_glyphs, replace_html_escapes, normalization_stats
+    )
+    for w in gen_rough_tokens(txt, one_sent_per_line):
+        yield w
+
+
+def gen_rough_tokens(txt, one_sent_per_line=False):
+    """ Generate rough tokens from a string that has been normalized """
     # If there are consecutive newlines in the string (i.e. two
     # newlines separated only by whitespace), we interpret
     # them as hard sentence boundaries
@@ -715,9 +937,9 @@ def gen_from_string(txt, replace_composite_glyphs=True, replace_html_escapes=Fal
     if one_sent_per_line:
         # We know there's a single sentence per line
         # Only split on newline
-        splitter = re.split(r"\n", txt)
+        splitter = _RE_NEWLINE.split(txt)
     else:
-        splitter = re.split(r"\n\s*\n", txt)
+        splitter = _RE_PARAGRAPH_BREAK.split(txt)
 
     for span in splitter:
         if first:
@@ -730,10 +952,143 @@ def gen_from_string(txt, replace_composite_glyphs=True, replace_html_escapes=Fal
             if w:
                 yield w
 
-def gen(text_or_gen, replace_composite_glyphs=True, replace_html_escapes=False, one_sent_per_line=False):
-    """ Generate rough tokens from a string or a generator """
+
+def gen_stream_blocks(stream):
+    """ Generate blocks of text or bytes read from a stream """
+    read = stream.read
+    while True:
+        block = read(STREAM_BLOCK_SIZE)
+        if not block:
+            return
+        yield block
+
+
+def gen_decoded_chunks(chunks, encoding=None, errors="strict"):
+    """ Generate text chunks from an iterable of text or byte chunks, or from
+        a text or binary stream. Bytes are decoded incrementally, so that
+        a multi-byte character can straddle a chunk boundary. """
+    if is_str(chunks) or isinstance(chunks, bytes):
+        chunks = [chunks]
+    elif hasattr(chunks, "read"):
+        chunks = gen_stream_blocks(chunks)
+    decoder = None
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors)
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    if decoder is not None:
+        chunk = decoder.decode(b"", True)
+        if chunk:
+            yield chunk
+
+
+def find_chunk_cut(buf, no_cut):
+    """ Return the index of the last position in buf where the text can
+        be cut without affecting its tokenization, or 0 if there is none.
+        This is the start of a whitespace run that follows a complete word,
+        i.e. a character that is not in no_cut. """
+    end = len(buf)
+    while True:
+        ix = max(buf.rfind(" ", 0, end), buf.rfind("\n", 0, end))
+        while ix > 0 and buf[ix - 1].isspace():
+            ix -= 1
+        if ix <= 0:
+            return 0
+        if buf[ix - 1] not in no_cut:
+            return ix
+        end = ix
+
+
+def gen_from_chunks(
+    chunks,
+    replace_composite_glyphs=True,
+    replace_html_escapes=False,
+    one_sent_per_line=False,
+    encoding=None,
+    normalization_stats=NORMALIZATION_STATS,
+):
+    """ Generate rough tokens from an iterable of text or byte chunks of
+        any size, or from a text or binary stream, with the same result as
+        gen() gives for the concatenation of the chunks as a single string.
+        Text is held back across chunk boundaries only from the start of
+        the last whitespace run, so that partial words, composite glyphs,
+        HTML escapes and blank lines are never cut in two. Memory use is
+        thus bounded by the chunk size plus the longest stretch of text
+        without a space or a newline. """
+    # Characters that normalization removes or that end an HTML escape,
+    # which may turn into whitespace: the text is not cut after them
+    no_cut = set()
+    if replace_composite_glyphs:
+        no_cut.update(ch for ch, _ in CHAR_REPLACEMENTS)
+    if replace_html_escapes:
+        no_cut.add(";")
+    # The statistics are recorded for the text as a whole
+    stats = NormalizationStats()
+    carry = ""
+    started = False
+    for chunk in gen_decoded_chunks(chunks, encoding):
+        buf = carry + chunk if carry else chunk
+        if not started:
+            # Leading whitespace is ignored, as in gen()
+            buf = buf.lstrip()
+            if not buf:
+                continue
+            started = True
+        cut = find_chunk_cut(buf, no_cut)
+        if not cut:
+            carry = buf
+            continue
+        carry = buf[cut:]
+        txt = replace_glyphs_and_escapes(
+            buf[:cut], replace_composite_glyphs, replace_html_escapes, stats
+        )
+        for w in gen_rough_tokens(txt, one_sent_per_line):
+            yield w
+    if not started:
+        # Empty input: signal this to the consumer of the generator
+        yield ""
+        return
+    txt = carry.rstrip()
+    if txt:
+        txt = replace_glyphs_and_escapes(
+            txt, replace_composite_glyphs, replace_html_escapes, stats
+        )
+        for w in gen_rough_tokens(txt, one_sent_per_line):
+            yield w
+    if normalization_stats is not None:
+        normalization_stats.record(stats.glyph_passes > 0, stats.escape_passes > 0)
+
+
+def gen(
+    text_or_gen,
+    replace_composite_glyphs=True,
+    replace_html_escapes=False,
+    one_sent_per_line=False,
+    chunked=False,
+    encoding=None,
+    normalization_stats=NORMALIZATION_STATS,
+):
+    """ Generate rough tokens from a string or a generator. If chunked is
+        True, a generator yields chunks of text, or of bytes in the given
+        encoding, rather than lines; see gen_from_chunks(). The
+        normalization of each string is counted in normalization_stats,
+        unless it is None. """
     if text_or_gen is None:
         return
+    if chunked:
+        for w in gen_from_chunks(
+            text_or_gen,
+            replace_composite_glyphs,
+            replace_html_escapes,
+            one_sent_per_line,
+            encoding,
+            normalization_stats,
+        ):
+            yield w
+        return
     if is_str(text_or_gen):
         # The parameter is a single string: wrap it in an iterable
         text_or_gen = [text_or_gen]
@@ -748,11 +1103,251 @@ def gen(text_or_gen, replace_composite_glyphs=True, replace_html_escapes=False,
             txt = make_str(txt)
             # Yield the contained rough tokens
             for w in gen_from_string(
-                txt, replace_composite_glyphs, replace_html_escapes, one_sent_per_line
+                txt,
+                replace_composite_glyphs,
+                replace_html_escapes,
+                one_sent_per_line,
+                normalization_stats,
             ):
                 yield w
 
 
+def gen_spans(
+    text_or_gen,
+    replace_composite_glyphs=True,
+    replace_html_escapes=False,
+    one_sent_per_line=False,
+    chunked=False,
+    encoding=None,
+    normalization_stats=NORMALIZATION_STATS,
+):
+    """ Generate the spans of text between the hard sentence boundaries
+        (empty lines) that gen() signals with empty strings. Each span is
+        returned as a string of rough tokens separated by single spaces. """
+    span = []
+    for w in gen(
+        text_or_gen,
+        replace_composite_glyphs,
+        replace_html_escapes,
+        one_sent_per_line,
+        chunked,
+        encoding,
+        normalization_stats,
+    ):
+        if w:
+            span.append(w)
+        elif span:
+            yield " ".join(span)
+            span = []
+    if span:
+        yield " ".join(span)
+
+
+# Empty lines, i.e. hard sentence boundaries (cf. gen_rough_tokens())
+_RE_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Newlines, the sentence boundaries of the one_sent_per_line option
+_RE_NEWLINE = re.compile(r"\n")
+# Rough tokens, i.e. the pieces that str.split() splits a string into
+_RE_NON_WHITESPACE = re.compile(r"\S+", re.UNICODE)
+
+
+def _replace_with_offsets(regex, replace, txt, offsets):
+    """ Replace the matches of the regex in txt with the result of calling
+        replace(match), returning the new text and a list mapping each
+        position within it, and the position at its end, to the offset
+        that offsets gives for the corresponding position in txt. The
+        characters of a replacement are mapped to the start of the match. """
+    parts = []
+    new_offsets = []
+    pos = 0
+    for m in regex.finditer(txt):
+        start, end = m.span()
+        r = replace(m)
+        parts.append(txt[pos:start])
+        parts.append(r)
+        new_offsets.extend(offsets[pos:start])
+        new_offsets.extend([offsets[start]] * len(r))
+        pos = end
+    parts.append(txt[pos:])
+    new_offsets.extend(offsets[pos:])
+    return "".join(parts), new_offsets
+
+
+def _normalization_offsets(txt, base, replace_composite_glyphs, replace_html_escapes):
+    """ Return a list mapping each position within the text that
+        replace_glyphs_and_escapes() returns for txt, and the position at
+        its end, to the offset of the corresponding character of txt, plus
+        the given base offset. This is only called for text that was
+        actually modified by the normalization. """
+    offsets = list(range(base, base + len(txt) + 1))
+    if replace_composite_glyphs:
+        txt, offsets = _replace_with_offsets(
+            UNICODE_REGEX, lambda m: UNICODE_REPLACEMENTS[m.group(0)], txt, offsets
+        )
+    if replace_html_escapes:
+        txt, offsets = _replace_with_offsets(
+            HTML_ESCAPE_REGEX, html_escape, txt, offsets
+        )
+    return offsets
+
+
+class _RoughTokenSpans:
+
+    """ Iterable of the rough tokens that gen() generates for a string or
+        an iterable of strings, which keeps track of where in the original
+        text the rough token that was generated last is located. The text
+        of an iterable is the concatenation of its strings. The location
+        is given in the current attribute as a (w, start, offsets) tuple:
+        if offsets is None, the rough token w is found at offset start of
+        the text; otherwise, the normalization of glyphs and escapes has
+        modified the text, and the character w[i] (and the position after
+        w, for i == len(w)) corresponds to offset offsets[start + i]. """
+
+    def __init__(
+        self,
+        text_or_gen,
+        replace_composite_glyphs=True,
+        replace_html_escapes=False,
+        one_sent_per_line=False,
+        chunked=False,
+        normalization_stats=NORMALIZATION_STATS,
+    ):
+        if chunked:
+            raise ValueError("Token spans cannot be recorded for chunked input")
+        self._text_or_gen = text_or_gen
+        self._replace_composite_glyphs = replace_composite_glyphs
+        self._replace_html_escapes = replace_html_escapes
+        self._one_sent_per_line = one_sent_per_line
+        self._normalization_stats = normalization_stats
+        self.current = None  # type: Optional[Tuple[str, int, Optional[List[int]]]]
+
+    def __iter__(self):
+        text_or_gen = self._text_or_gen
+        if text_or_gen is None:
+            return
+        if is_str(text_or_gen):
+            text_or_gen = [text_or_gen]
+        breaks = (
+            _RE_NEWLINE if self._one_sent_per_line else _RE_PARAGRAPH_BREAK
+        ).finditer
+        rough_tokens = _RE_NON_WHITESPACE.finditer
+        base = 0
+        for line in text_or_gen:
+            line = make_str(line)
+            txt = line.strip()
+            if not txt:
+                self.current = ("", base, None)
+                yield ""
+                base += len(line)
+                continue
+            # The offset of the stripped text within the original
+            start = base + len(line) - len(line.lstrip())
+            norm = replace_glyphs_and_escapes(
+                txt,
+                self._replace_composite_glyphs,
+                self._replace_html_escapes,
+                self._normalization_stats,
+            )
+            offsets = None
+            if norm is not txt:
+                offsets = _normalization_offsets(
+                    txt,
+                    start,
+                    self._replace_composite_glyphs,
+                    self._replace_html_escapes,
+                )
+            # Generate the same rough tokens as gen_rough_tokens()
+            pos = 0
+            for m in chain(breaks(norm), (None,)):
+                end = len(norm) if m is None else m.start()
+                for r in rough_tokens(norm, pos, end):
+                    if offsets is None:
+                        self.current = (r.group(), start + r.start(), None)
+                    else:
+                        self.current = (r.group(), r.start(), offsets)
+                    yield r.group()
+                if m is not None:
+                    self.current = ("", m.start(), None)
+                    yield ""
+                    pos = m.end()
+            base += len(line)
+
+
+def _record_spans(token_stream, rough_tokens, spans):
+    """ Pass the tokens that parse_tokens() generates from the given
+        _RoughTokenSpans through, appending a (token, start, end) tuple to
+        the spans list for each of them that has text. The tokens that are
+        generated from a rough token are collected until the next rough
+        token is reached, and their texts are then located within it. A
+        token whose text is not found within the rough token, such as a
+        number converted by the convert_numbers option, is given the text
+        between its neighbors. """
+
+    def flush(group, rough):
+        w, start, offsets = rough
+        pos = 0
+        # Tokens whose text was not found, and the position of each
+        unknown = []
+        located = []
+        for t in group:
+            if not t.txt:
+                continue
+            txt = t.txt
+            if unknown:
+                # Prefer the position that the unknown tokens would have if
+                # their text had the same length in the original
+                expected = pos + sum(len(u.txt) for u in unknown)
+                i = expected if w.startswith(txt, expected) else w.find(txt, pos)
+            else:
+                i = pos if w.startswith(txt, pos) else w.find(txt, pos)
+            if i < 0:
+                unknown.append(t)
+                continue
+            if unknown:
+                located.extend(_divide(unknown, pos, i))
+                unknown = []
+            located.append((t, i, i + len(txt)))
+            pos = i + len(txt)
+        if unknown:
+            located.extend(_divide(unknown, pos, len(w)))
+        for t, i, j in located:
+            if offsets is None:
+                spans.append((t, start + i, start + j))
+            else:
+                spans.append((t, offsets[start + i], offsets[start + j]))
+        for t in group:
+            yield t
+
+    group = []
+    rough = None
+    for t in token_stream:
+        if rough_tokens.current is not rough:
+            if rough is not None:
+                for gt in flush(group, rough):
+                    yield gt
+            else:
+                # Tokens without text, before the first rough token
+                for gt in group:
+                    yield gt
+            group = []
+            rough = rough_tokens.current
+        group.append(t)
+    for gt in flush(group, rough) if rough is not None else group:
+        yield gt
+
+
+def _divide(tokens, start, end):
+    """ Divide the text between start and end among the given tokens,
+        giving each of them (but the last) the length of its own text """
+    result = []
+    for t in tokens[:-1]:
+        j = min(start + len(t.txt), end)
+        result.append((t, start, j))
+        start = j
+    result.append((tokens[-1], start, end))
+    return result
+
+
 def could_be_end_of_sentence(next_token, test_set=TOK.TEXT, multiplier=False):
     """ Return True if next_token could be ending the current sentence or
         starting the next one """
@@ -769,20 +1364,69 @@ def could_be_end_of_sentence(next_token, test_set=TOK.TEXT, multiplier=False):
     )
 
 
-def parse_tokens(txt, **options):
-    """ Generator that parses contiguous text into a stream of tokens """
-
-    # Obtain individual flags from the options dict
-    convert_numbers = options.get("convert_numbers", False)
-    replace_composite_glyphs = options.get("replace_composite_glyphs", True)
-    replace_html_escapes = options.get("replace_html_escapes", False)
-    one_sent_per_line = options.get("one_sent_per_line", False)
-
+def parse_tokens(
+    txt,
+    convert_numbers=False,
+    replace_composite_glyphs=True,
+    replace_html_escapes=False,
+    one_sent_per_line=False,
     # The default behavior for kludgy ordinals is to pass them
     # through as word tokens
-    handle_kludgy_ordinals = options.get(
-        "handle_kludgy_ordinals", KLUDGY_ORDINALS_PASS_THROUGH
+    handle_kludgy_ordinals=KLUDGY_ORDINALS_PASS_THROUGH,
+    abbreviations=None,
+    chunked=False,
+    encoding=None,
+    spans=None,
+    normalization_stats=NORMALIZATION_STATS,
+    **options
+):
+    """ Return a generator that parses contiguous text into a stream of
+        tokens. Options that are not used by this phase are ignored.
+        If spans is a list, a (token, start, end) tuple is appended to it
+        for each token with text that is generated, giving the offsets of
+        the token within the text (or within the concatenation of the
+        strings, if an iterable of strings is given), before any glyphs
+        or escapes were replaced. This is not supported for chunked input.
+        The normalization of the text is counted in normalization_stats,
+        a NormalizationStats instance, unless it is None. """
+
+    # Use the default abbreviation set unless another one is given
+    abbreviations = abbreviations or Abbreviations.current()
+
+    if spans is None:
+        return _parse_tokens(
+            gen(
+                txt,
+                replace_composite_glyphs,
+                replace_html_escapes,
+                one_sent_per_line,
+                chunked,
+                encoding,
+                normalization_stats,
+            ),
+            convert_numbers,
+            handle_kludgy_ordinals,
+            abbreviations,
+        )
+    rough_tokens = _RoughTokenSpans(
+        txt,
+        replace_composite_glyphs,
+        replace_html_escapes,
+        one_sent_per_line,
+        chunked,
+        normalization_stats,
     )
+    return _record_spans(
+        _parse_tokens(
+            rough_tokens, convert_numbers, handle_kludgy_ordinals, abbreviations
+        ),
+        rough_tokens,
+        spans,
+    )
+
+
+def _parse_tokens(rough_tokens, convert_numbers, handle_kludgy_ordinals, abbreviations):
+    """ Generator that parses a stream of rough tokens into tokens """
 
     # This code proceeds roughly as follows:
     # 1) The text is split into raw tokens on whitespace boundaries.
@@ -803,7 +1447,7 @@ def parse_tokens(txt, **options):
     # 7) The process is repeated from step 4) until the current raw token is
     #    exhausted. At that point, we obtain the next token and start from 2).
 
-    for w in gen(txt, replace_composite_glyphs, replace_html_escapes, one_sent_per_line):
+    for w in rough_tokens:
 
         # Handle each sequence w of non-whitespace characters
 
@@ -818,6 +1462,14 @@ def parse_tokens(txt, **options):
             yield TOK.Word(w)
             continue
 
+        if w[-1] in PUNCT_AFTER_WORD and w[:-1].isalpha():
+            # Shortcut for the next most common case: a pure word
+            # followed by a period or comma ('orð.'), handled the
+            # same way as by the general case below
+            yield TOK.Word(w[:-1])
+            yield TOK.Punctuation(w[-1])
+            continue
+
         if len(w) > 1:
             if w[0] in SIGN_PREFIX and w[1] in DIGITS_PREFIX:
                 # Digit, preceded by sign (+/-): parse as a number
@@ -983,7 +1635,7 @@ def parse_tokens(txt, **options):
                 ate = True
                 w = endp
 
-            if w and len(w) >= 2 and re.match(r"#\w", w, re.UNICODE):
+            if w and len(w) >= 2 and w[0] == "#" and re.match(r"#\w", w, re.UNICODE):
                 # Handle hashtags. Eat all text up to next punctuation character
                 # so we can handle strings like "#MeToo-hreyfingin" as two words
                 tag = w[:1]
@@ -1068,7 +1720,7 @@ def parse_tokens(txt, **options):
                 r = MOLECULE_REGEX.match(w)
                 if r is not None:
                     g = r.group()
-                    if g not in Abbreviations.DICT and MOLECULE_FILTER.search(g):
+                    if g not in abbreviations.DICT and MOLECULE_FILTER.search(g):
                         # Correct format, containing at least one digit
                         # and not separately defined as an abbreviation:
                         # We assume that this is a molecular formula
@@ -1121,7 +1773,7 @@ def parse_tokens(txt, **options):
                     # The second part must start with an uppercase letter
                     and a[1][0].isupper()
                     # Corner case: an abbrev such as 'f.Kr' should not be split
-                    and w[0 : i + 1] not in Abbreviations.DICT
+                    and w[0 : i + 1] not in abbreviations.DICT
                 ):
                     # We have a lowercase word immediately followed by a period
                     # and an uppercase word
@@ -1167,11 +1819,14 @@ def parse_tokens(txt, **options):
     yield TOK.End_Sentinel()
 
 
-def parse_particles(token_stream, **options):
+def parse_particles(
+    token_stream, convert_measurements=False, abbreviations=None, **options
+):
     """ Parse a stream of tokens looking for 'particles'
         (simple token pairs and abbreviations) and making substitutions """
 
-    convert_measurements = options.pop("convert_measurements", False)
+    # Use the default abbreviation set unless another one is given
+    abbreviations = abbreviations or Abbreviations.current()
 
     def is_abbr_with_period(txt):
         """ Return True if the given token text is an abbreviation
@@ -1180,27 +1835,28 @@ def parse_particles(token_stream, **options):
             # There is already a period in it: must be an abbreviation
             # (this applies for instance to "t.d" but not to "mbl.is")
             return True
-        if txt in Abbreviations.SINGLES:
+        if txt in abbreviations.SINGLES:
             # The token's literal text is defined as an abbreviation
             # followed by a single period
             return True
-        if txt.lower() in Abbreviations.SINGLES:
+        if txt.lower() in abbreviations.SINGLES:
             # The token is in upper or mixed case:
             # We allow it as an abbreviation unless the exact form
             # (most often uppercase) is an abbreviation that doesn't
             # require a period (i.e. isn't in SINGLES).
             # This applies for instance to DR which means
             # "Danmark's Radio" instead of "doktor" (dr.)
-            return txt not in Abbreviations.DICT
+            return txt not in abbreviations.DICT
         return False
 
     def lookup(abbrev):
         """ Look up an abbreviation, both in original case and in lower case,
-            and return either None if not found or a meaning list having one entry """
-        m = Abbreviations.DICT.get(abbrev)
+            and return either None if not found or the (shared, immutable)
+            tuple of meanings """
+        m = abbreviations.DICT.get(abbrev)
         if not m:
-            m = Abbreviations.DICT.get(abbrev.lower())
-        return list(m) if m else None
+            m = abbreviations.DICT.get(abbrev.lower())
+        return m or None
 
     token = None
     try:
@@ -1255,7 +1911,7 @@ def parse_particles(token_stream, **options):
                     # the following token is an end-of-sentence or end-of-paragraph,
                     # or uppercase (and not a month name misspelled in upper case).
 
-                    if abbrev in Abbreviations.NAME_FINISHERS:
+                    if abbrev in abbreviations.NAME_FINISHERS:
                         # For name finishers (such as 'próf.') we don't consider a
                         # following person name as an indicator of an end-of-sentence
                         # !!! TODO: This does not work as intended because person names
@@ -1273,7 +1929,7 @@ def parse_particles(token_stream, **options):
                     )
                     if finish:
                         # Potentially at the end of a sentence
-                        if abbrev in Abbreviations.FINISHERS:
+                        if abbrev in abbreviations.FINISHERS:
                             # We see this as an abbreviation even if the next sentence
                             # seems to be starting just after it.
                             # Yield the abbreviation without a trailing dot,
@@ -1283,8 +1939,8 @@ def parse_particles(token_stream, **options):
                             # Set token to the period
                             token = next_token
                         elif (
-                            abbrev in Abbreviations.NOT_FINISHERS
-                            or abbrev.lower() in Abbreviations.NOT_FINISHERS
+                            abbrev in abbreviations.NOT_FINISHERS
+                            or abbrev.lower() in abbreviations.NOT_FINISHERS
                         ):
                             # This is a potential abbreviation that we don't interpret
                             # as such if it's at the end of a sentence
@@ -1406,7 +2062,7 @@ def parse_particles(token_stream, **options):
                     and RE_ROMAN_NUMERAL.match(token.txt)
                     # Don't interpret a known abbreviation as a Roman numeral,
                     # for instance the newspaper 'DV'
-                    and token.txt not in Abbreviations.DICT
+                    and token.txt not in abbreviations.DICT
                 ):
                     # Ordinal, i.e. whole number or Roman numeral followed by period:
                     # convert to an ordinal token
@@ -1523,7 +2179,7 @@ def parse_particles(token_stream, **options):
                 and next_token.kind == TOK.PUNCTUATION
                 and next_token.txt == "."
                 and token.txt[-1].isalpha()
-                # and token.txt.split()[-1] + "." not in Abbreviations.DICT
+                # and token.txt.split()[-1] + "." not in abbreviations.DICT
             ):
                 puncttoken = next_token
                 next_token = next(token_stream)
@@ -1567,9 +2223,9 @@ def parse_particles(token_stream, **options):
             # Replace straight abbreviations
             # (i.e. those that don't end with a period)
             if token.kind == TOK.WORD and token.val is None:
-                if Abbreviations.has_meaning(token.txt):
+                if abbreviations.has_meaning(token.txt):
                     # Add a meaning to the token
-                    token = TOK.Word(token.txt, Abbreviations.get_meaning(token.txt))
+                    token = TOK.Word(token.txt, abbreviations.get_meaning(token.txt))
 
             # Yield the current token and advance to the lookahead
             yield token
@@ -1610,7 +2266,11 @@ def parse_sentences(token_stream):
                     token = next(token_stream)
                     continue
             elif token.kind == TOK.X_END:
-                assert not in_sentence
+                # End sentinel of one of several texts in a batch
+                # (cf. tokenize_many()): finish the current sentence, if any
+                if in_sentence:
+                    yield tok_end_sentence
+                    in_sentence = False
             elif token.kind == TOK.S_SPLIT:
                 # Empty line in input: make sure to finish the current
                 # sentence, if any, even if no ending punctuation has
@@ -1669,7 +2329,12 @@ def parse_sentences(token_stream):
 
     # Final token (previous lookahead)
     if token is not None and token.kind != TOK.S_SPLIT:
-        if not in_sentence and token.kind not in TOK.END:
+        if token.kind == TOK.X_END:
+            # Finish the current sentence, if any, before the end sentinel
+            if in_sentence:
+                yield tok_end_sentence
+                in_sentence = False
+        elif not in_sentence and token.kind not in TOK.END:
             # Starting something here
             yield tok_begin_sentence
             in_sentence = True
@@ -1700,9 +2365,12 @@ def month_for_token(token, after_ordinal=False):
     return match_stem_list(token, MONTHS)
 
 
-def parse_phrases_1(token_stream):
+def parse_phrases_1(token_stream, abbreviations=None):
     """ Handle dates and times """
 
+    # Use the default abbreviation set unless another one is given
+    abbreviations = abbreviations or Abbreviations.current()
+
     token = None
     try:
 
@@ -1714,7 +2382,7 @@ def parse_phrases_1(token_stream):
             # Coalesce abbreviations and trailing period
             if token.kind == TOK.WORD and next_token.txt == ".":
                 abbrev = token.txt + next_token.txt
-                if abbrev in Abbreviations.FINISHERS:
+                if abbrev in abbreviations.FINISHERS:
                     token = TOK.Word(abbrev, token.val)
                     next_token = next(token_stream)
 
@@ -1744,7 +2412,7 @@ def parse_phrases_1(token_stream):
                     # the abbreviation "gr.", we assume that the only
                     # interpretation of the abbreviation is "grein".
                     next_token = TOK.Word(
-                        "gr.", [("grein", 0, "kvk", "skst", "gr.", "-")]
+                        "gr.", (("grein", 0, "kvk", "skst", "gr.", "-"),)
                     )
 
                 month = month_for_token(next_token, True)
@@ -2117,36 +2785,524 @@ def parse_phrases_2(token_stream, coalesce_percent=False):
         yield token
 
 
-def tokenize(text_or_gen, **options):
-    """ Tokenize text in several phases, returning a generator
-        (iterable sequence) of tokens that processes tokens on-demand. """
+# The phases of the tokenization pipeline after parse_tokens(), in order,
+# with the token kinds that each phase consumes (i.e. coalesces with other
+# tokens, or drops) or produces, and whether it inspects tokens of any other
+# kind when deciding what to do. A phase passes tokens of all other kinds
+# through unchanged, in the same order.
+PIPELINE_PHASES = (
+    (
+        "parse_particles",
+        frozenset(
+            (
+                TOK.PUNCTUATION, TOK.WORD, TOK.NUMBER, TOK.YEAR, TOK.ORDINAL,
+                TOK.TIME, TOK.DATEREL, TOK.TELNO, TOK.PERCENT, TOK.MEASUREMENT,
+                TOK.CURRENCY, TOK.AMOUNT,
+            )
+        ),
+        True,
+    ),
+    (
+        "parse_sentences",
+        frozenset(
+            (
+                TOK.PUNCTUATION, TOK.S_SPLIT, TOK.P_BEGIN, TOK.P_END,
+                TOK.S_BEGIN, TOK.S_END,
+            )
+        ),
+        True,
+    ),
+    (
+        "parse_phrases_1",
+        frozenset(
+            (
+                TOK.PUNCTUATION, TOK.WORD, TOK.NUMBER, TOK.YEAR, TOK.ORDINAL,
+                TOK.DATE, TOK.TIME, TOK.TIMESTAMP, TOK.TELNO,
+            )
+        ),
+        False,
+    ),
+    (
+        "parse_date_and_time",
+        frozenset(
+            (
+                TOK.WORD, TOK.NUMBER, TOK.YEAR, TOK.ORDINAL, TOK.TIME, TOK.DATE,
+                TOK.DATEABS, TOK.DATEREL, TOK.TIMESTAMP, TOK.TIMESTAMPABS,
+                TOK.TIMESTAMPREL,
+            )
+        ),
+        False,
+    ),
+    (
+        "parse_phrases_2",
+        frozenset(
+            (
+                TOK.PUNCTUATION, TOK.WORD, TOK.NUMBER, TOK.CURRENCY, TOK.AMOUNT,
+                TOK.PERCENT,
+            )
+        ),
+        False,
+    ),
+)
 
-    # Thank you Python for enabling this programming pattern ;-)
 
-    # Make sure that the abbreviation config file has been read
-    Abbreviations.initialize()
+def _phases_for_kinds(kinds, phases):
+    """ Return the subset of the given pipeline phases that must run for
+        the tokens of the given kinds to come out the same as if all of
+        them ran. A phase can be skipped if it neither consumes nor
+        produces tokens of those kinds, nor of any kind that a later
+        phase which runs depends on. """
+    needed = set(kinds)
+    result = set()
+    for name, affected, inspects_all in reversed(PIPELINE_PHASES):
+        if name not in phases:
+            continue
+        if needed is not None and not (affected & needed):
+            continue
+        result.add(name)
+        if inspects_all:
+            # This phase and all earlier ones must run
+            needed = None
+        elif needed is not None:
+            # The earlier phases must deliver the tokens that
+            # this phase consumes intact
+            needed |= affected
+    return result
+
+
+def _make_pipeline(options, segment_only=False, filter_kinds=True):
+    """ Resolve the given options and return a function that builds the
+        tokenization pipeline on top of a stream of rough tokens, as
+        generated by parse_tokens(). The function returns a generator of
+        tokens, where the end of each input text is marked with a
+        TOK.X_END sentinel token. If segment_only is True, the pipeline
+        ends with the phases that determine token and sentence boundaries
+        (and token texts); the later phases only coalesce adjacent tokens
+        within a sentence into multi-word tokens such as dates. If the
+        kinds option is given, the phases that cannot affect tokens of
+        those kinds are skipped, and unless filter_kinds is False, only
+        tokens of those kinds (and X_END sentinels) are generated. """
+
     with_annotation = options.pop("with_annotation", True)
     coalesce_percent = options.pop("coalesce_percent", False)
+    convert_measurements = options.pop("convert_measurements", False)
+    kinds = options.pop("kinds", None)
+    # The abbreviations option is also used by parse_tokens()
+    abbreviations = options.get("abbreviations")
+
+    phases = set(name for name, _, _ in PIPELINE_PHASES)
+    if segment_only:
+        phases -= {"parse_date_and_time", "parse_phrases_2"}
+    if not with_annotation:
+        # Skip the parse_phrases_2 pass if the with_annotation option is False
+        phases.discard("parse_phrases_2")
+    if kinds is not None:
+        kinds = frozenset(kinds)
+        phases = _phases_for_kinds(kinds, phases)
+
+    def pipeline(token_stream):
+        # Thank you Python for enabling this programming pattern ;-)
+        if "parse_particles" in phases:
+            token_stream = parse_particles(
+                token_stream,
+                convert_measurements=convert_measurements,
+                abbreviations=abbreviations,
+            )
+        if "parse_sentences" in phases:
+            token_stream = parse_sentences(token_stream)
+        if "parse_phrases_1" in phases:
+            token_stream = parse_phrases_1(token_stream, abbreviations=abbreviations)
+        if "parse_date_and_time" in phases:
+            token_stream = parse_date_and_time(token_stream)
+        if "parse_phrases_2" in phases:
+            token_stream = parse_phrases_2(
+                token_stream, coalesce_percent=coalesce_percent
+            )
+        if kinds is not None and filter_kinds:
+            keep = kinds | {TOK.X_END}
+            token_stream = (t for t in token_stream if t.kind in keep)
+        return token_stream
+
+    return pipeline
+
+
+def _paragraph_cache(options):
+    """ Pop the paragraph_cache option and return the LRUCache
+        instance to use, or None if no cache is to be used """
+    cache = options.pop("paragraph_cache", None)
+    if cache is True:
+        return PARAGRAPH_CACHE
+    return cache or None
+
+
+def _abbreviations(options):
+    """ Resolve the abbreviations option to an AbbreviationSet, once per
+        call, so that all phases of the pipeline use the same set """
+    if not options.get("abbreviations"):
+        # Use the default set, making sure that Abbrev.conf has been read
+        options["abbreviations"] = Abbreviations.current()
+
 
-    token_stream = parse_tokens(text_or_gen, **options)
-    token_stream = parse_particles(token_stream, **options)
-    token_stream = parse_sentences(token_stream)
-    token_stream = parse_phrases_1(token_stream)
-    token_stream = parse_date_and_time(token_stream)
+def tokenize(text_or_gen, **options):
+    """ Tokenize text in several phases, returning a generator
+        (iterable sequence) of tokens that processes tokens on-demand. """
 
-    # Skip the parse_phrases_2 pass if the with_annotation option is False
-    if with_annotation:
-        token_stream = parse_phrases_2(token_stream, coalesce_percent=coalesce_percent)
+    _abbreviations(options)
 
+    cache = _paragraph_cache(options)
+    if cache is not None and options.get("spans") is None:
+        # Cached tokens have no recorded spans: the spans option
+        # bypasses the cache
+        return tokenize_with_cache(text_or_gen, cache, **options)
+
+    pipeline = _make_pipeline(options)
+    token_stream = pipeline(parse_tokens(text_or_gen, **options))
     return (t for t in token_stream if t.kind != TOK.X_END)
 
 
+def tokenize_many(texts, **options):
+    """ Tokenize each text in an iterable of texts, such as search queries
+        or product titles, returning a generator that yields a list of
+        tokens for each text. The texts are tokenized independently of
+        each other, with the same options as tokenize(). The options are
+        resolved only once, and all the texts flow through a single
+        tokenization pipeline, where the end of each text is marked with
+        a TOK.X_END sentinel token. This is considerably faster than
+        calling tokenize() for each of many short texts. """
+
+    _abbreviations(options)
+
+    cache = _paragraph_cache(options)
+    if cache is not None:
+        for text in texts:
+            yield list(tokenize_with_cache(text, cache, **options))
+        return
+
+    pipeline = _make_pipeline(options)
+    token_stream = pipeline(
+        chain.from_iterable(parse_tokens(text, **options) for text in texts)
+    )
+    x_end = TOK.X_END
+    result = []
+    for t in token_stream:
+        if t.kind == x_end:
+            yield result
+            result = []
+        else:
+            result.append(t)
+
+
+# Shared cache for the paragraph_cache=True option of tokenize()
+PARAGRAPH_CACHE = LRUCache(maxsize=PARAGRAPH_CACHE_SIZE)
+
+
+def tokenize_with_cache(text_or_gen, cache, **options):
+    """ Tokenize text one paragraph at a time, i.e. one span between empty
+        lines at a time, looking up the resulting tokens in the given
+        LRUCache before running the tokenization pipeline. The cache key
+        is a hash of the paragraph text and the tokenization options. This
+        pays off for input containing many identical paragraphs, such as
+        bylines and boilerplate footers in news feeds. Since empty lines
+        are hard sentence boundaries, the paragraphs are tokenized
+        independently of each other. """
+    replace_composite_glyphs = options.pop("replace_composite_glyphs", True)
+    replace_html_escapes = options.pop("replace_html_escapes", False)
+    one_sent_per_line = options.get("one_sent_per_line", False)
+    chunked = options.pop("chunked", False)
+    encoding = options.pop("encoding", None)
+    normalization_stats = options.pop("normalization_stats", NORMALIZATION_STATS)
+    options_key = repr(sorted(items(options))).encode("utf-8")
+    pipeline = None
+    x_end = TOK.X_END
+    for span in gen_spans(
+        text_or_gen,
+        replace_composite_glyphs,
+        replace_html_escapes,
+        one_sent_per_line,
+        chunked,
+        encoding,
+        normalization_stats,
+    ):
+        key = hashlib.sha1(options_key + b"\0" + span.encode("utf-8")).digest()
+        tokens = cache.get(key)
+        if tokens is None:
+            if pipeline is None:
+                pipeline = _make_pipeline(dict(options))
+            # The glyph and escape replacements have already been
+            # applied to the span, and counted: they must not be
+            # applied or counted again
+            token_stream = pipeline(
+                parse_tokens(
+                    span,
+                    replace_composite_glyphs=False,
+                    replace_html_escapes=False,
+                    normalization_stats=None,
+                    **options
+                )
+            )
+            tokens = tuple(t for t in token_stream if t.kind != x_end)
+            cache.put(key, tokens)
+        for t in tokens:
+            yield t
+
+
 def tokenize_without_annotation(text_or_gen, **options):
     """ Tokenize without the last pass which can be done more thoroughly if BÍN
         annotation is available, for instance in GreynirPackage. """
     return tokenize(text_or_gen, with_annotation=False, **options)
 
 
+def detect_compression(name, head=b""):
+    """ Return the compression format of a file, i.e. 'gzip', 'bz2', 'xz'
+        or 'zstd', judging by its name or else by its first bytes,
+        or None if the file does not seem to be compressed """
+    compression = COMPRESSION_EXTENSIONS.get(os.path.splitext(name or "")[1].lower())
+    if compression is None:
+        for magic, c in COMPRESSION_MAGIC:
+            if head.startswith(magic):
+                return c
+    return compression
+
+
+class _RawStream(io.RawIOBase):
+
+    """ A raw binary stream on top of a file object that only has read()
+        or write() methods, such as the gzip.GzipFile and bz2.BZ2File
+        objects of Python 2.7, so that it can be buffered, and then
+        wrapped in an io.TextIOWrapper """
+
+    def __init__(self, f):
+        io.RawIOBase.__init__(self)
+        self._f = f
+
+    def readable(self):
+        return hasattr(self._f, "read")
+
+    def writable(self):
+        return hasattr(self._f, "write")
+
+    def readinto(self, b):
+        data = self._f.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def write(self, b):
+        data = memoryview(b).tobytes()
+        self._f.write(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        io.RawIOBase.close(self)
+
+
+class _Decompressor(io.RawIOBase):
+
+    """ A raw binary stream that decompresses the data read from a binary
+        file object, without seeking, using decompressor objects made by
+        new_decompressor(), such as those of the zlib and bz2 modules.
+        Concatenated compressed streams are decompressed one after the
+        other. This is used on Python 2.7, where gzip.GzipFile needs a
+        seekable file and bz2.BZ2File a path, to read from a pipe. The
+        given exception type of the decompressor, if any, is raised as
+        an IOError, as gzip.GzipFile does for corrupt data. """
+
+    def __init__(self, f, new_decompressor, error=()):
+        io.RawIOBase.__init__(self)
+        self._f = f
+        self._new_decompressor = new_decompressor
+        self._error = error
+        self._decompressor = new_decompressor()
+        self._data = b""
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def _decompress(self, data):
+        """ Decompress the data, starting another compressed
+            stream where the current one ends """
+        result = []
+        while data:
+            try:
+                result.append(self._decompressor.decompress(data))
+            except EOFError:
+                # The bz2 decompressor has reached the end of its stream
+                self._decompressor = self._new_decompressor()
+                continue
+            except self._error as e:
+                raise IOError(str(e))
+            data = self._decompressor.unused_data
+            if data:
+                self._decompressor = self._new_decompressor()
+        return b"".join(result)
+
+    def readinto(self, b):
+        while self._pos >= len(self._data):
+            data = self._f.read(STREAM_BLOCK_SIZE)
+            if not data:
+                return 0
+            self._data = self._decompress(data)
+            self._pos = 0
+        n = min(len(b), len(self._data) - self._pos)
+        b[:n] = self._data[self._pos : self._pos + n]
+        self._pos += n
+        return n
+
+
+class _Compressor(io.RawIOBase):
+
+    """ A raw binary stream that compresses the data written to it, with
+        a compressor object such as those of the zlib and bz2 modules, and
+        writes it to a binary file object, which is left open. This is
+        used on Python 2.7, where bz2.BZ2File needs a path. """
+
+    def __init__(self, f, compressor):
+        io.RawIOBase.__init__(self)
+        self._f = f
+        self._compressor = compressor
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = memoryview(b).tobytes()
+        self._f.write(self._compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._f.write(self._compressor.flush())
+            self._f.flush()
+        io.RawIOBase.close(self)
+
+
+def _open_compressed_stream(f, compression, reading):
+    """ Return a buffered binary stream that decompresses the data read
+        from the binary file object f, or compresses the data written to
+        it, in the gzip or bz2 format, on Python 2.7 """
+    if compression == "gzip":
+        import zlib
+
+        # The gzip header and trailer are handled by zlib
+        wbits = 16 + zlib.MAX_WBITS
+        if reading:
+            return io.BufferedReader(
+                _Decompressor(f, lambda: zlib.decompressobj(wbits), zlib.error),
+                STREAM_BLOCK_SIZE,
+            )
+        compressor = zlib.compressobj(9, zlib.DEFLATED, wbits)
+    else:
+        import bz2
+
+        if reading:
+            return io.BufferedReader(
+                _Decompressor(f, bz2.BZ2Decompressor), STREAM_BLOCK_SIZE
+            )
+        compressor = bz2.BZ2Compressor()
+    return io.BufferedWriter(_Compressor(f, compressor), STREAM_BLOCK_SIZE)
+
+
+def _buffered(stream, reading):
+    """ Return the decompressing or compressing stream as a buffered
+        binary stream. On Python 3 it already is one. """
+    if sys.version_info >= (3, 0):
+        return stream
+    if reading:
+        return io.BufferedReader(_RawStream(stream), STREAM_BLOCK_SIZE)
+    return io.BufferedWriter(_RawStream(stream), STREAM_BLOCK_SIZE)
+
+
+def open_compressed(f, mode="rb", compression=None):
+    """ Return a binary stream that reads from the file f, decompressing
+        it, or writes to it, compressing it. The file f is either a path or
+        a binary file object, such as sys.stdin.buffer. Unless compression
+        is given, the format is detected from the file name and, when
+        reading, from the magic bytes at the start of the file. If the file
+        is not compressed, a plain binary stream is returned. The zstd
+        format requires the zstandard package, and the xz format Python 3.
+        Closing the returned stream closes the file if it was opened from
+        a path. """
+    reading = "r" in mode
+    path = f if is_str(f) else None
+    if compression is None:
+        head = b""
+        if path is not None:
+            name = path
+            if reading:
+                with io.open(path, "rb") as raw:
+                    head = raw.read(8)
+        else:
+            name = getattr(f, "name", None)
+            if not is_str(name):
+                # File objects opened from a file descriptor
+                name = None
+            if reading and hasattr(f, "peek"):
+                head = f.peek(8)[:8]
+        compression = detect_compression(name, head)
+        if compression is None:
+            if path is not None:
+                return io.open(path, mode, buffering=STREAM_BLOCK_SIZE)
+            return f
+    if (
+        compression in ("gzip", "bz2")
+        and path is None
+        and sys.version_info < (3, 0)
+    ):
+        return _open_compressed_stream(f, compression, reading)
+    if compression == "gzip":
+        import gzip
+
+        if path is not None:
+            return _buffered(gzip.GzipFile(path, mode), reading)
+        return gzip.GzipFile(fileobj=f, mode=mode)
+    if compression == "bz2":
+        import bz2
+
+        return _buffered(bz2.BZ2File(f, mode), reading)
+    if compression == "xz":
+        try:
+            import lzma
+        except ImportError:
+            raise ValueError(
+                "The lzma module of Python 3 is required for xz compression"
+            )
+        return lzma.LZMAFile(f, mode)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(
+                "The zstandard package is required for zstd compression"
+            )
+        if path is not None:
+            f = io.open(path, mode, buffering=STREAM_BLOCK_SIZE)
+        if reading:
+            return zstandard.ZstdDecompressor().stream_reader(
+                f, read_size=STREAM_BLOCK_SIZE, closefd=path is not None
+            )
+        return zstandard.ZstdCompressor().stream_writer(f, closefd=path is not None)
+    raise ValueError("Unknown compression format '{0}'".format(compression))
+
+
+def tokenize_file(f, encoding="utf-8", compression=None, **options):
+    """ Tokenize a text file, given as a path or a binary file object,
+        reading it in blocks and, if it is compressed as .gz, .bz2, .xz
+        or .zst, decompressing it on the fly. The compression format
+        is detected as in open_compressed(). The text is tokenized as a
+        single string, using the chunked option of tokenize(). """
+    stream = open_compressed(f, "rb", compression)
+    try:
+        for t in tokenize(stream, chunked=True, encoding=encoding, **options):
+            yield t
+    finally:
+        # A file object given by the caller is left open
+        if stream is not f:
+            stream.close()
+
+
 def split_into_sentences(text_or_gen, **options):
     """ Shallow tokenization of the input text, which can be either
         a text string or a generator of lines of text (such as a file).
@@ -2155,9 +3311,21 @@ def split_into_sentences(text_or_gen, **options):
     if options.pop("normalize", False):
         to_text = normalized_text
     else:
-        to_text = lambda t: t.txt
+        to_text = attrgetter("txt")
+    _abbreviations(options)
+    cache = _paragraph_cache(options)
+    if cache is not None:
+        token_stream = tokenize_with_cache(
+            text_or_gen, cache, with_annotation=False, **options
+        )
+    else:
+        # Since the tokens of each sentence are joined by spaces, there is
+        # no need to run the phases that coalesce adjacent tokens into
+        # multi-word tokens, also joined by spaces: the result is the same
+        pipeline = _make_pipeline(options, segment_only=True)
+        token_stream = pipeline(parse_tokens(text_or_gen, **options))
     curr_sent = []
-    for t in tokenize_without_annotation(text_or_gen, **options):
+    for t in token_stream:
         if t.kind in TOK.END:
             # End of sentence/paragraph
             if curr_sent:
@@ -2171,6 +3339,38 @@ def split_into_sentences(text_or_gen, **options):
         yield " ".join(curr_sent)
 
 
+# A sentence as yielded by sentences(): the indexes of its TOK.S_BEGIN and
+# TOK.S_END tokens within the token stream of tokenize(), and a tuple of
+# the tokens between them
+Sentence = namedtuple("Sentence", ["start", "end", "tokens"])
+
+
+def sentences(text_or_gen, **options):
+    """ Tokenize the input text, which can be either a text string or a
+        generator of lines of text (such as a file), and return a generator
+        of Sentence tuples. Each sentence is yielded as soon as the
+        tokenization pipeline has closed it, so only the tokens of the
+        current sentence are held in memory, regardless of the length of
+        the paragraph or the text. Sentences without any tokens are
+        skipped. The options are the same as for tokenize(). """
+    s_begin = TOK.S_BEGIN
+    s_end = TOK.S_END
+    start = None
+    sent = []
+    for ix, t in enumerate(tokenize(text_or_gen, **options)):
+        kind = t.kind
+        if kind == s_begin:
+            start = ix
+            sent = []
+        elif kind == s_end:
+            if sent:
+                yield Sentence(start, ix, tuple(sent))
+            start = None
+            sent = []
+        elif start is not None:
+            sent.append(t)
+
+
 def mark_paragraphs(txt):
     """ Insert paragraph markers into plaintext, by newlines """
     if not txt:
@@ -2183,7 +3383,11 @@ def paragraphs(tokens):
         of sentence tuples. Sentence tuples consist of the index of the first token
         of the sentence (the TOK.S_BEGIN token) and a list of the tokens within the
         sentence, not including the starting TOK.S_BEGIN or the terminating TOK.S_END
-        tokens. """
+        tokens. The tokens can be any iterable, such as the generator returned by
+        tokenize(), and are consumed lazily: each paragraph is yielded as soon as
+        its terminating TOK.P_END (or the next TOK.P_BEGIN) arrives, and only the
+        current paragraph is held in memory. The indexes are absolute positions
+        within the whole token stream. """
 
     if not tokens:
         return
@@ -2244,6 +3448,43 @@ RE_SPLIT_STR = (
 )
 RE_SPLIT = re.compile(RE_SPLIT_STR)
 
+# The pieces that RE_SPLIT splits a whitespace-free string into, matched
+# in a single pass without capture groups: runs of characters other than
+# punctuation, where a digit may not start a number, then numbers and single
+# punctuation characters. Since the signs that may start a number are
+# punctuation, a number can only start within a run at a digit.
+_NUMBER_STR = (
+    r"(?:\d{1,3}(?:\.\d\d\d)+\,\d+"
+    r"|\d{1,3}(?:\,\d\d\d)+\.\d+"
+    r"|\d+\,\d+(?!\.\d)"
+    r"|\d+\.\d+(?!\,\d))"
+)
+_SPLIT_PUNCTUATION = "~" + "".join("\\" + c for c in PUNCTUATION)
+_RE_CORRECT_SPACES = re.compile(
+    r"(?:[^\s\d{1}]+|(?!{0})\d+)+|[\+\-\$€]?{0}|[{1}]".format(
+        _NUMBER_STR, _SPLIT_PUNCTUATION
+    )
+)
+# On Python 2.7, \s in these regexes only matches ASCII whitespace, while
+# unicode.split() also splits on other whitespace, such as U+00A0. There,
+# strings are split on ASCII whitespace only, as RE_SPLIT does, and the
+# pieces are stripped of any other whitespace, as they were before.
+if sys.version_info >= (3, 0):
+    _split_whitespace = str.split
+    _strip_pieces = False
+else:
+    _split_whitespace = re.compile(r"\s+").split
+    _strip_pieces = True
+
+# The separator between two adjacent tokens, indexed by 8 times the spacing
+# class of the former token plus the spacing class of the latter, as given by
+# TP_SPACE. Index 0 plus a class is used for the first token of a string.
+_TP_SEPARATOR = tuple(
+    " " if a and b and b <= TP_WORD and TP_SPACE[a - 1][b - 1] else ""
+    for a in range(TP_WORD + 1)
+    for b in range(8)
+)
+
 
 def correct_spaces(s):
     """ Utility function to split and re-compose a string
@@ -2253,51 +3494,423 @@ def correct_spaces(s):
     r = []
     last = TP_NONE
     double_quote_count = 0
-    for w in RE_SPLIT.split(s):
-        if w is None:
+    tp_class = PUNCTUATION_CLASS
+    split = _RE_CORRECT_SPACES.findall
+    strip = _strip_pieces
+    for chunk in _split_whitespace(s):
+        # Most whitespace-separated chunks are plain words,
+        # which need not be split any further
+        for w in (chunk,) if chunk.isalpha() else split(chunk):
+            if strip:
+                w = w.strip()
+                if not w:
+                    continue
+            if w == '"':
+                # For English-type double quotes, we glue them alternatively
+                # to the right and to the left token
+                this = (TP_LEFT, TP_RIGHT)[double_quote_count % 2]
+                double_quote_count += 1
+            else:
+                # Pieces longer than one character are never in the table
+                this = tp_class.get(w, TP_WORD)
+            if len(r) >= 2 and r[-1] == "-":
+                if (w == "og" or w == "eða") and r[-2].lstrip().isalpha():
+                    # Special case for compounds such as "fjármála- og efnahagsráðuneytið"
+                    # and "Iðnaðar-, ferðamála- og atvinnuráðuneytið":
+                    # detach the hyphen from "og"/"eða"
+                    r.append(" " + w)
+                    last = this
+                    continue
+                if (
+                    this == TP_WORD
+                    and w.isalpha()
+                    and (r[-2] == "," or r[-2].lstrip() in ("og", "eða"))
+                ):
+                    # Special case for compounds such as
+                    # "bensínstöðvar, -dælur og -tankar"
+                    r[-1] = " -"
+                    r.append(w)
+                    last = this
+                    continue
+            if TP_SPACE[last - 1][this - 1] and r:
+                r.append(" " + w)
+            else:
+                r.append(w)
+            last = this
+    return "".join(r)
+
+
+# Whitespace between tokens in an original text
+_RE_WHITESPACE = re.compile(r"\s*", re.UNICODE)
+# Characters removed by the replacement of composite glyphs,
+# such as soft hyphens
+_REMOVED_CHARS = "".join(k for k, v in items(UNICODE_REPLACEMENTS) if not v)
+# Characters that may be found between the characters of a token in an
+# original text: whitespace, and the removed characters
+_ALIGN_GAP = "[\\s{0}]*".format(_REMOVED_CHARS)
+# Patterns matching the original forms of each character of a token,
+# i.e. the composite glyphs that the character may have replaced
+_ALIGN_CHAR = {}
+for _glyph, _replacement in items(UNICODE_REPLACEMENTS):
+    if _replacement:
+        _ALIGN_CHAR.setdefault(_replacement, [re.escape(_replacement)]).append(
+            re.escape(_glyph)
+        )
+_ALIGN_CHAR = {c: "(?:{0})".format("|".join(v)) for c, v in items(_ALIGN_CHAR)}
+
+
+# Compiled patterns matching the original forms of token texts
+_ALIGN_PATTERNS = LRUCache(maxsize=1024)
+# The most tokens that may in a row not be found in the original text,
+# before align_tokens() gives up on them
+_ALIGN_MAX_PENDING = 8
+
+
+def _align_pattern(w):
+    """ Return a compiled regex matching the original forms of the token
+        text w, i.e. allowing whitespace to have been inserted or removed,
+        and composite glyphs to have been replaced """
+    pattern = _ALIGN_PATTERNS.get(w)
+    if pattern is None:
+        pattern = re.compile(
+            _ALIGN_GAP.join(_ALIGN_CHAR.get(c) or re.escape(c) for c in w if c != " "),
+            re.UNICODE,
+        )
+        _ALIGN_PATTERNS.put(w, pattern)
+    return pattern
+
+
+def _align(tokens, text):
+    """ Generate (token, span, exact) tuples for the tokens, aligned with
+        the text in a single forward scan, where exact is True if the token
+        text was found at the span. A token that is not found at the current
+        position in the text, for instance because its text was converted,
+        is held back until the next token is found, within a bounded
+        distance, and then given the text between its neighbors. """
+    pos = 0
+    skip = _RE_WHITESPACE.match
+    # Tokens that have not been found, and the length of their texts
+    pending = []
+    pending_len = 0
+    for t in tokens:
+        w = t.txt
+        if not w:
+            if pending:
+                pending.append(t)
+            else:
+                yield t, None, False
+            continue
+        start = skip(text, pos).end()
+        if not pending:
+            if text.startswith(w, start):
+                pos = start + len(w)
+                yield t, (start, pos), True
+                continue
+            m = _align_pattern(w).match(text, start)
+            if m is not None:
+                pos = m.end()
+                yield t, (start, pos), True
+                continue
+            pending.append(t)
+            pending_len = len(w)
+            continue
+        # Look for the token where it would be if the pending tokens had the
+        # same length in the text, and otherwise within a bounded distance
+        expected = skip(text, start + pending_len).end()
+        pattern = _align_pattern(w)
+        m = pattern.match(text, expected)
+        if m is None:
+            m = pattern.search(text, start, start + 2 * (pending_len + len(w)) + 16)
+        if m is None:
+            pending.append(t)
+            pending_len += len(w) + 1
+            if sum(1 for p in pending if p.txt) > _ALIGN_MAX_PENDING:
+                # Give up on the pending tokens, assuming
+                # that their texts had the same length
+                for p in pending:
+                    yield p, None, False
+                pending = []
+                pos = start + pending_len
+            continue
+        for item in _divide_text(pending, text, start, m.start()):
+            yield item
+        pending = []
+        pos = m.end()
+        yield t, m.span(), True
+    if pending:
+        end = min(len(text), skip(text, pos).end() + pending_len)
+        for item in _divide_text(pending, text, skip(text, pos).end(), end):
+            yield item
+
+
+def _divide_text(tokens, text, start, end):
+    """ Generate (token, span, False) tuples, dividing the text between
+        start and end, without surrounding whitespace, among the tokens
+        that have text. If the text consists of as many whitespace-separated
+        pieces as there are tokens, each of them gets one piece. """
+    pieces = [m.span() for m in _RE_NON_WHITESPACE.finditer(text, start, end)]
+    with_text = [t for t in tokens if t.txt]
+    if not pieces:
+        spans = [None] * len(with_text)
+    elif len(pieces) == len(with_text):
+        spans = pieces
+    else:
+        spans = [
+            (i, j) for _, i, j in _divide(with_text, pieces[0][0], pieces[-1][1])
+        ]
+    spans.reverse()
+    for t in tokens:
+        yield t, spans.pop() if t.txt else None, False
+
+
+def _align_recorded(tokens, spans):
+    """ Generate (token, span) tuples for tokens generated by a pipeline on
+        top of parse_tokens(), taking the spans from the (token, start, end)
+        tuples that parse_tokens() appended to the spans list. A token that
+        parse_tokens() generated gets its recorded span. A token that a later
+        phase created, for instance by joining several tokens into one, gets
+        the span of the tokens that it replaced, i.e. of those between the
+        preceding and the following tokens from parse_tokens(). The entries
+        that have been used are removed from the list as the tokens are
+        generated. """
+    # Indexes of the entries of each recorded token within the list (the
+    # same token object may be generated more than once, such as a cached
+    # number), plus the number of entries that have been removed from
+    # its front
+    index = dict()
+    indexed = 0
+    removed = 0
+    # The index of the first entry that has not been used
+    first = 0
+    # Tokens created by a later phase, which replaced the
+    # tokens between first and the next token that is found
+    pending = []
+    for t in tokens:
+        if not t.txt:
+            if pending:
+                pending.append(t)
+            else:
+                yield t, None
+            continue
+        while indexed < removed + len(spans):
+            index.setdefault(id(spans[indexed - removed][0]), []).append(indexed)
+            indexed += 1
+        j = next(
+            (
+                j
+                for j in index.get(id(t), ())
+                if j >= first and spans[j - removed][0] is t
+            ),
+            -1,
+        )
+        if j < 0:
+            pending.append(t)
+            continue
+        if pending:
+            for item in _replaced_spans(pending, spans[first - removed : j - removed]):
+                yield item
+            pending = []
+        entry = spans[j - removed]
+        yield t, (entry[1], entry[2])
+        first = j + 1
+        if first - removed >= 1024:
+            # Remove the entries that have been used
+            del spans[: first - removed]
+            removed = first
+            index = dict()
+            for j, entry in enumerate(spans):
+                index.setdefault(id(entry[0]), []).append(removed + j)
+    if pending:
+        for item in _replaced_spans(pending, spans[first - removed :]):
+            yield item
+
+
+def _replaced_spans(tokens, entries):
+    """ Generate (token, span) tuples for tokens created by a phase after
+        parse_tokens(), which replaced the tokens in the given entries
+        of a spans list. If there are several such tokens, each of them
+        gets the entries covering the length of its own text. """
+    with_text = [t for t in tokens if t.txt]
+    spans = []
+    ix = 0
+    for k, t in enumerate(with_text):
+        if ix >= len(entries):
+            spans.append(None)
             continue
-        w = w.strip()
+        if k == len(with_text) - 1:
+            # The last token gets the rest of the entries
+            jx = len(entries)
+        else:
+            # Leave at least one entry for each of the following tokens
+            need = len(t.txt.replace(" ", ""))
+            limit = max(ix + 1, len(entries) - (len(with_text) - k - 1))
+            jx = ix + 1
+            covered = len(entries[ix][0].txt)
+            while jx < limit and covered < need:
+                covered += len(entries[jx][0].txt)
+                jx += 1
+        spans.append((entries[ix][1], entries[jx - 1][2]))
+        ix = jx
+    spans.reverse()
+    for t in tokens:
+        yield t, spans.pop() if t.txt else None
+
+
+def align_tokens(tokens, text, spans=None):
+    """ Align an iterable of tokens, such as the result of tokenize(text),
+        with the original text, returning a generator of (token, span)
+        tuples. The span is a (start, end) tuple of the character offsets
+        of the token within the text, or None if the token has no text or
+        could not be located. The span of a token includes any whitespace
+        within it in the original, which may differ from the token text, as
+        may composite glyphs. The alignment is a single forward scan through
+        the text. A token whose text is not found where expected, for
+        instance because it was converted by the tokenizer, gets the text
+        between its neighbors, and the scan never skips any further ahead.
+        If the spans option was given to tokenize() or parse_tokens() for
+        the tokens, the list is passed in spans and the exact spans that
+        were recorded during tokenization are used instead. """
+    if spans is not None:
+        return _align_recorded(tokens, spans)
+    return ((t, span) for t, span, _ in _align(tokens, text))
+
+
+# The kinds of tokens that scan_pii() and redact_pii() look for
+PII_KINDS = frozenset((TOK.SSN, TOK.TELNO, TOK.EMAIL, TOK.URL, TOK.USERNAME))
+
+
+def _pii_prefilter(kinds, replace_html_escapes=False):
+    """ Return a compiled regex that matches any text that might contain
+        tokens of the given PII kinds, so that text without a match need
+        not be tokenized. Social security and telephone numbers contain
+        three digits followed by four more, which may be separated by
+        spaces or punctuation ('010130-2989', '555 1234', '5551234'),
+        and characters that the replacement of composite glyphs removes,
+        such as soft hyphens, may be found between any of the digits.
+        E-mail addresses and user names contain '@', and URLs start with
+        one of the URL_PREFIXES, which may also contain such characters. """
+    removed = "[{0}]*".format(_REMOVED_CHARS)
+    parts = []
+    if TOK.SSN in kinds or TOK.TELNO in kinds:
+        digit = r"\d" + removed
+        parts.append(digit * 3 + r"\W*" + digit * 3 + r"\d")
+    if TOK.EMAIL in kinds or TOK.USERNAME in kinds:
+        parts.append("@")
+    if TOK.URL in kinds:
+        parts.extend(
+            removed.join(re.escape(c) for c in prefix) for prefix in URL_PREFIXES
+        )
+    if replace_html_escapes and parts:
+        # The characters above may be written as HTML escape codes
+        parts.append("&")
+    return re.compile("|".join(parts) or "(?!)", re.UNICODE)
+
+
+def scan_pii(text, kinds=PII_KINDS, **options):
+    """ Scan a text for personally identifiable information, i.e. tokens
+        of the given kinds, by default social security numbers, telephone
+        numbers, e-mail addresses, URLs and user names (PII_KINDS). Returns
+        a generator of (token, span) tuples as from align_tokens(), with
+        exact spans relative to the text, recorded during tokenization
+        (cf. the spans option of parse_tokens()). The tokens are the same
+        as tokenize() returns for the text with the same options, but
+        paragraphs (spans between empty lines) that cannot contain such
+        tokens, such as those without digits or '@', are skipped without
+        being tokenized (see _pii_prefilter()), and the phases of the
+        tokenization pipeline that cannot affect tokens of the given kinds
+        are skipped (cf. the kinds option of tokenize()). """
+    kinds = frozenset(kinds)
+    if not kinds <= PII_KINDS:
+        raise ValueError(
+            "scan_pii() only scans for {0}".format(
+                ", ".join(sorted(TOK.descr[kind] for kind in PII_KINDS))
+            )
+        )
+    _abbreviations(options)
+    options["kinds"] = kinds
+    search = _pii_prefilter(kinds, options.get("replace_html_escapes", False)).search
+    # All tokens are needed to align the tokens with the text
+    pipeline = _make_pipeline(options, filter_kinds=False)
+    start = 0
+    ends = [m.span() for m in _RE_PARAGRAPH_BREAK.finditer(text)]
+    ends.append((len(text), len(text)))
+    for end, next_start in ends:
+        if search(text, start, end):
+            paragraph = text[start:end]
+            spans = []
+            tokens = pipeline(parse_tokens(paragraph, spans=spans, **options))
+            for t, span in _align_recorded(tokens, spans):
+                if t.kind in kinds:
+                    if span is not None:
+                        span = (start + span[0], start + span[1])
+                    yield t, span
+        start = next_start
+
+
+def redact_pii(text, kinds=PII_KINDS, replacement=None, **options):
+    """ Return the text with the tokens that scan_pii() finds replaced
+        by the given replacement string, or by the result of calling
+        replacement(token) if it is a function. By default, each token
+        is replaced by its kind in brackets, such as '[EMAIL]'. Raises
+        ValueError if a token cannot be located in the text, rather than
+        leaving it unredacted. """
+    result = []
+    pos = 0
+    for t, span in scan_pii(text, kinds, **options):
+        if span is None:
+            raise ValueError(
+                "The {0} token '{1}' was not located in the text".format(
+                    TOK.descr[t.kind], t.txt
+                )
+            )
+        if span[0] < pos:
+            # Overlaps the previous token, which has been replaced
+            pos = max(pos, span[1])
+            continue
+        if replacement is None:
+            r = "[" + TOK.descr[t.kind] + "]"
+        elif callable(replacement):
+            r = replacement(t)
+        else:
+            r = replacement
+        result.append(text[pos : span[0]])
+        result.append(r)
+        pos = span[1]
+    result.append(text[pos:])
+    return "".join(result)
+
+
+def detokenize(tokens, normalize=False, original=None):
+    """ Utility function to convert an iterable of tokens back
+        to a correctly spaced string. If normalize is True,
+        punctuation is normalized before assembling the string.
+        If the original text of the tokens is given, the tokens
+        are aligned with it and the original whitespace between
+        them is copied, falling back to the normal spacing rules
+        for tokens that are not found in the original. """
+    if original is not None:
+        return _detokenize_original(tokens, normalize, original)
+    to_text = normalized_text if normalize else attrgetter("txt")
+    punctuation = TOK.PUNCTUATION
+    tp_class = PUNCTUATION_CLASS.get
+    r = []
+    last = TP_NONE
+    double_quote_count = 0
+    for t in tokens:
+        w = to_text(t)
         if not w:
             continue
-        if len(w) > 1:
+        if t.kind != punctuation:
             this = TP_WORD
         elif w == '"':
             # For English-type double quotes, we glue them alternatively
             # to the right and to the left token
             this = (TP_LEFT, TP_RIGHT)[double_quote_count % 2]
             double_quote_count += 1
-        elif w in LEFT_PUNCTUATION:
-            this = TP_LEFT
-        elif w in RIGHT_PUNCTUATION:
-            this = TP_RIGHT
-        elif w in NONE_PUNCTUATION:
-            this = TP_NONE
-        elif w in CENTER_PUNCTUATION:
-            this = TP_CENTER
         else:
-            this = TP_WORD
-        if (
-            (w == "og" or w == "eða")
-            and len(r) >= 2
-            and r[-1] == "-"
-            and r[-2].lstrip().isalpha()
-        ):
-            # Special case for compounds such as "fjármála- og efnahagsráðuneytið"
-            # and "Iðnaðar-, ferðamála- og atvinnuráðuneytið":
-            # detach the hyphen from "og"/"eða"
-            r.append(" " + w)
-        elif (
-            this == TP_WORD
-            and len(r) >= 2
-            and r[-1] == "-"
-            and w.isalpha()
-            and (r[-2] == "," or r[-2].lstrip() in ("og", "eða"))
-        ):
-            # Special case for compounds such as
-            # "bensínstöðvar, -dælur og -tankar"
-            r[-1] = " -"
-            r.append(w)
-        elif TP_SPACE[last - 1][this - 1] and r:
+            # Punctuation longer than one character is not in the table
+            this = tp_class(w, TP_WORD)
+        if TP_SPACE[last - 1][this - 1] and r:
             r.append(" " + w)
         else:
             r.append(w)
@@ -2305,38 +3918,84 @@ def correct_spaces(s):
     return "".join(r)
 
 
-def detokenize(tokens, normalize=False):
-    """ Utility function to convert an iterable of tokens back
-        to a correctly spaced string. If normalize is True,
-        punctuation is normalized before assembling the string. """
-    to_text = normalized_text if normalize else lambda t: t.txt
+def _detokenize_original(tokens, normalize, original):
+    """ Convert tokens back to a string, with the whitespace between them
+        copied from the original text where possible """
     r = []
     last = TP_NONE
+    last_end = None
     double_quote_count = 0
-    for t in tokens:
-        w = to_text(t)
+    for t, span, exact in _align(tokens, original):
+        if not exact:
+            w = normalized_text(t) if normalize else t.txt
+        elif normalize and t.kind == TOK.PUNCTUATION:
+            w = t.val[1]
+        else:
+            # The original token text, with its original inner whitespace
+            w = original[span[0] : span[1]]
         if not w:
             continue
         this = TP_WORD
-        if t.kind == TOK.PUNCTUATION:
-            if len(w) > 1:
-                pass
-            elif w == '"':
-                # For English-type double quotes, we glue them alternatively
-                # to the right and to the left token
+        if t.kind == TOK.PUNCTUATION and len(w) == 1:
+            if w == '"':
                 this = (TP_LEFT, TP_RIGHT)[double_quote_count % 2]
                 double_quote_count += 1
-            elif w in LEFT_PUNCTUATION:
-                this = TP_LEFT
-            elif w in RIGHT_PUNCTUATION:
-                this = TP_RIGHT
-            elif w in NONE_PUNCTUATION:
-                this = TP_NONE
-            elif w in CENTER_PUNCTUATION:
-                this = TP_CENTER
-        if TP_SPACE[last - 1][this - 1] and r:
+            else:
+                this = PUNCTUATION_CLASS.get(w, TP_WORD)
+        gap = None
+        if span is not None and last_end is not None:
+            gap = original[last_end : span[0]]
+            if gap and not gap.isspace():
+                # Something between the tokens, such as a paragraph
+                # marker, is not whitespace: use the spacing rules
+                gap = None
+        if gap is not None:
+            r.append(gap + w)
+        elif TP_SPACE[last - 1][this - 1] and r:
             r.append(" " + w)
         else:
             r.append(w)
         last = this
+        last_end = None if span is None else span[1]
+    return "".join(r)
+
+
+def detokenize_batch(kinds, texts):
+    """ Convert a batch of tokens, given as parallel sequences of token
+        kinds and texts, to a correctly spaced string, in the same way as
+        detokenize(). The sequences can for instance be lists, arrays or
+        NumPy arrays, such as the columns of a table of tokens. Tokens
+        without text are skipped. The spacing class of each token and the
+        separator in front of it are looked up in precomputed tables, and
+        the separators and texts are collected in a single list that is
+        joined once at the end. """
+    if hasattr(kinds, "tolist"):
+        # array.array or NumPy array: iterate over Python ints
+        kinds = kinds.tolist()
+    if hasattr(texts, "tolist"):
+        texts = texts.tolist()
+    punctuation = TOK.PUNCTUATION
+    tp_class = PUNCTUATION_CLASS.get
+    separator = _TP_SEPARATOR
+    r = []
+    append = r.append
+    # Index into the separator table: 8 times the class of the last token
+    last = 0
+    double_quote_count = 0
+    for kind, w in zip(kinds, texts):
+        if not w:
+            continue
+        if kind != punctuation:
+            this = TP_WORD
+        elif w == '"':
+            # For English-type double quotes, we glue them alternatively
+            # to the right and to the left token
+            this = (TP_LEFT, TP_RIGHT)[double_quote_count % 2]
+            double_quote_count += 1
+        else:
+            # Punctuation longer than one character is not in the table
+            this = tp_class(w, TP_WORD)
+        append(separator[last + this])
+        append(w)
+        last = 8 * this
     return "".join(r)
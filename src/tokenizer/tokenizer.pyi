@@ -31,18 +31,24 @@
 
 from typing import (
     Any,
+    Callable,
+    Hashable,
     Optional,
     Union,
     Set,
+    FrozenSet,
     List,
     Dict,
     Tuple,
     Iterable,
     Iterator,
+    IO,
     NamedTuple,
     Sequence,
 )
 
+from .abbrev import AbbreviationSet
+
 class Tok(NamedTuple):
     kind: int
     txt: str
@@ -54,6 +60,7 @@ PersonNameList = Sequence[Tuple[str, Optional[str], Optional[str]]]
 Options = Union[bool, int, str]
 SentenceTuple = Tuple[int, List[Tok]]
 StringIterable = Union[str, Iterable[str]]
+ChunkIterable = Union[StringIterable, bytes, Iterable[bytes], IO[Any]]
 
 TP_LEFT: int = ...
 TP_CENTER: int = ...
@@ -211,35 +218,165 @@ def normalized_text(token: Tok) -> str: ...
 def text_from_tokens(tokens: Iterable[Tok]) -> str: ...
 def normalized_text_from_tokens(tokens: Iterable[Tok]) -> str: ...
 def is_valid_date(y: int, m: int, d: int) -> bool: ...
-def parse_digits(w: str, convert_numbers: bool) -> Tok: ...
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+class LRUCache:
+
+    maxsize: int = ...
+    hits: int = ...
+    misses: int = ...
+    def __init__(self, maxsize: int = ...) -> None: ...
+    def get(self, key: Hashable, default: Any = ...) -> Any: ...
+    def put(self, key: Hashable, value: Any) -> None: ...
+    def resize(self, maxsize: int) -> None: ...
+    def clear(self) -> None: ...
+    def info(self) -> CacheInfo: ...
+    def hit_rate(self) -> float: ...
+
+DIGITS_CACHE: LRUCache = ...
+
+def parse_digits(w: str, convert_numbers: bool) -> Tuple[Tok, int]: ...
+class NormalizationInfo(NamedTuple):
+    documents: int
+    glyph_passes: int
+    escape_passes: int
+    skipped: int
+
+class NormalizationStats:
+
+    documents: int = ...
+    glyph_passes: int = ...
+    escape_passes: int = ...
+    skipped: int = ...
+    def __init__(self) -> None: ...
+    def record(self, glyph_pass: bool, escape_pass: bool) -> None: ...
+    def clear(self) -> None: ...
+    def info(self) -> NormalizationInfo: ...
+    def skip_rate(self) -> float: ...
+
+NORMALIZATION_STATS: NormalizationStats = ...
+
+def replace_glyphs_and_escapes(
+    txt: str,
+    replace_composite_glyphs: bool = ...,
+    replace_html_escapes: bool = ...,
+    stats: Optional[NormalizationStats] = ...,
+) -> str: ...
 def gen_from_string(
-    txt: str, replace_composite_glyphs: bool = ...
+    txt: str,
+    replace_composite_glyphs: bool = ...,
+    replace_html_escapes: bool = ...,
+    one_sent_per_line: bool = ...,
+    normalization_stats: Optional[NormalizationStats] = ...,
+) -> Iterator[str]: ...
+def gen_rough_tokens(txt: str, one_sent_per_line: bool = ...) -> Iterator[str]: ...
+def gen_stream_blocks(stream: IO[Any]) -> Iterator[Union[str, bytes]]: ...
+def gen_decoded_chunks(
+    chunks: ChunkIterable, encoding: Optional[str] = ..., errors: str = ...
+) -> Iterator[str]: ...
+def find_chunk_cut(buf: str, no_cut: Set[str]) -> int: ...
+def gen_from_chunks(
+    chunks: ChunkIterable,
+    replace_composite_glyphs: bool = ...,
+    replace_html_escapes: bool = ...,
+    one_sent_per_line: bool = ...,
+    encoding: Optional[str] = ...,
+    normalization_stats: Optional[NormalizationStats] = ...,
 ) -> Iterator[str]: ...
 def gen(
-    text_or_gen: StringIterable, replace_composite_glyphs: bool = ...
+    text_or_gen: ChunkIterable,
+    replace_composite_glyphs: bool = ...,
+    replace_html_escapes: bool = ...,
+    one_sent_per_line: bool = ...,
+    chunked: bool = ...,
+    encoding: Optional[str] = ...,
+    normalization_stats: Optional[NormalizationStats] = ...,
+) -> Iterator[str]: ...
+def gen_spans(
+    text_or_gen: ChunkIterable,
+    replace_composite_glyphs: bool = ...,
+    replace_html_escapes: bool = ...,
+    one_sent_per_line: bool = ...,
+    chunked: bool = ...,
+    encoding: Optional[str] = ...,
+    normalization_stats: Optional[NormalizationStats] = ...,
 ) -> Iterator[str]: ...
 def could_be_end_of_sentence(
     next_token: Tok, test_set: Set[int] = ..., multiplier: bool = ...
 ) -> bool: ...
-def parse_tokens(txt: StringIterable, **options: Options) -> Iterator[Tok]: ...
+def parse_tokens(
+    txt: ChunkIterable,
+    convert_numbers: bool = ...,
+    replace_composite_glyphs: bool = ...,
+    replace_html_escapes: bool = ...,
+    one_sent_per_line: bool = ...,
+    handle_kludgy_ordinals: int = ...,
+    abbreviations: Optional[AbbreviationSet] = ...,
+    chunked: bool = ...,
+    encoding: Optional[str] = ...,
+    spans: Optional[List[Tuple[Tok, int, int]]] = ...,
+    normalization_stats: Optional[NormalizationStats] = ...,
+    **options: Any
+) -> Iterator[Tok]: ...
 def parse_particles(
-    token_stream: Iterator[Tok], **options: Options
+    token_stream: Iterator[Tok],
+    convert_measurements: bool = ...,
+    abbreviations: Optional[AbbreviationSet] = ...,
+    **options: Any
 ) -> Iterator[Tok]: ...
 def parse_sentences(token_stream: Iterator[Tok]) -> Iterator[Tok]: ...
 def match_stem_list(token: Tok, stems: Dict[str, int]) -> Optional[int]: ...
 def month_for_token(token: Tok, after_ordinal: bool = ...) -> Optional[int]: ...
-def parse_phrases_1(token_stream: Iterator[Tok]) -> Iterator[Tok]: ...
+def parse_phrases_1(
+    token_stream: Iterator[Tok], abbreviations: Optional[AbbreviationSet] = ...
+) -> Iterator[Tok]: ...
 def parse_date_and_time(token_stream: Iterator[Tok]) -> Iterator[Tok]: ...
 def parse_phrases_2(
     token_stream: Iterator[Tok], coalesce_percent: bool = ...
 ) -> Iterator[Tok]: ...
-def tokenize(text_or_gen: StringIterable, **options: Options) -> Iterator[Tok]: ...
+
+PIPELINE_PHASES: Tuple[Tuple[str, FrozenSet[int], bool], ...] = ...
+
+def tokenize(text_or_gen: ChunkIterable, **options: Options) -> Iterator[Tok]: ...
+def tokenize_many(
+    texts: Iterable[StringIterable], **options: Options
+) -> Iterator[List[Tok]]: ...
+
+PARAGRAPH_CACHE: LRUCache = ...
+
+def tokenize_with_cache(
+    text_or_gen: ChunkIterable, cache: LRUCache, **options: Options
+) -> Iterator[Tok]: ...
 def tokenize_without_annotation(
-    text_or_gen: StringIterable, **options: Options
+    text_or_gen: ChunkIterable, **options: Options
+) -> Iterator[Tok]: ...
+def detect_compression(name: Optional[str], head: bytes = ...) -> Optional[str]: ...
+def open_compressed(
+    f: Union[str, IO[bytes]], mode: str = ..., compression: Optional[str] = ...
+) -> IO[bytes]: ...
+def tokenize_file(
+    f: Union[str, IO[bytes]],
+    encoding: str = ...,
+    compression: Optional[str] = ...,
+    **options: Options
 ) -> Iterator[Tok]: ...
 def split_into_sentences(
-    text_or_gen: StringIterable, **options: Options
+    text_or_gen: ChunkIterable, **options: Options
 ) -> Iterator[str]: ...
+
+class Sentence(NamedTuple):
+    start: int
+    end: int
+    tokens: Tuple[Tok, ...]
+
+def sentences(
+    text_or_gen: StringIterable, **options: Options
+) -> Iterator[Sentence]: ...
 def mark_paragraphs(txt: str) -> str: ...
 def paragraphs(tokens: Iterable[Tok]) -> Iterator[List[SentenceTuple]]: ...
 
@@ -247,4 +384,28 @@ RE_SPLIT_STR: str
 RE_SPLIT: str
 
 def correct_spaces(s: str) -> str: ...
-def detokenize(tokens: Iterable[Tok], normalize: bool = ...) -> str: ...
+Span = Tuple[int, int]
+
+def align_tokens(
+    tokens: Iterable[Tok],
+    text: str,
+    spans: Optional[List[Tuple[Tok, int, int]]] = ...,
+) -> Iterator[Tuple[Tok, Optional[Span]]]: ...
+
+PII_KINDS: FrozenSet[int] = ...
+
+def scan_pii(
+    text: str, kinds: Iterable[int] = ..., **options: Options
+) -> Iterator[Tuple[Tok, Optional[Span]]]: ...
+def redact_pii(
+    text: str,
+    kinds: Iterable[int] = ...,
+    replacement: Union[None, str, Callable[[Tok], str]] = ...,
+    **options: Options
+) -> str: ...
+def detokenize(
+    tokens: Iterable[Tok], normalize: bool = ..., original: Optional[str] = ...
+) -> str: ...
+def detokenize_batch(
+    kinds: Sequence[int], texts: Sequence[Optional[str]]
+) -> str: ...
@@ -0,0 +1,1063 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+"""
+
+    benchmark.py
+
+    Performance benchmarks for the Tokenizer module
+
+    Copyright (C) 2021 by Miðeind ehf.
+    Original author: Vilhjálmur Þorsteinsson
+
+    This software is licensed under the MIT License:
+
+        Permission is hereby granted, free of charge, to any person
+        obtaining a copy of this software and associated documentation
+        files (the "Software"), to deal in the Software without restriction,
+        including without limitation the rights to use, copy, modify, merge,
+        publish, distribute, sublicense, and/or sell copies of the Software,
+        and to permit persons to whom the Software is furnished to do so,
+        subject to the following conditions:
+
+        The above copyright notice and this permission notice shall be
+        included in all copies or substantial portions of the Software.
+
+        THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+        EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+        MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+        IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+        CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+        TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+        SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+    This program is not a part of the pytest test suite. It is invoked
+    from the command line, optionally with the names of the benchmarks
+    to run:
+
+        $ python test/benchmark.py [benchmark_name ...]
+
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import io
+import os
+import re
+import sys
+from timeit import default_timer as timer
+
+import tokenizer as t
+from tokenizer.definitions import (
+    TOP_LEVEL_DOMAINS, ELEMENTS, PUNCTUATION_REGEX, DOMAIN_REGEX, MOLECULE_REGEX,
+)
+
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Registry of benchmarks, in the order of definition
+BENCHMARKS = []
+
+
+def benchmark(func):
+    """ Decorator to register a benchmark function """
+    BENCHMARKS.append(func)
+    return func
+
+
+def read_file(name):
+    """ Return the contents of a file in the test directory """
+    with io.open(os.path.join(TEST_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def timed(func, repeat=5):
+    """ Call func() repeat times and return the best time in seconds """
+    best = None
+    for _ in range(repeat):
+        t0 = timer()
+        func()
+        elapsed = timer() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(name, before, after):
+    """ Print a comparison of two timings """
+    print(
+        "  {0:<40} {1:9.4f} s {2:9.4f} s   {3:5.2f}x".format(
+            name, before, after, before / after if after else float("inf")
+        )
+    )
+
+
+@benchmark
+def trie_regexes():
+    """ Flat alternations vs. prefix trees for DOMAIN_REGEX and MOLECULE_REGEX """
+    flat_domain = re.compile(
+        r"({0})({1}*)$".format(
+            r"|".join(r"\w\." + re.escape(d) for d in TOP_LEVEL_DOMAINS),
+            PUNCTUATION_REGEX,
+        ),
+        re.UNICODE,
+    )
+    flat_molecule = re.compile(r"^(({0})+\d*)+".format(r"|".join(ELEMENTS)))
+    words = read_file("toktest_large.txt").split()
+    # Verify that the results are the same
+    for w in words:
+        assert bool(flat_domain.search(w)) == bool(DOMAIN_REGEX.search(w)), w
+        m1 = flat_molecule.match(w)
+        m2 = MOLECULE_REGEX.match(w)
+        assert (m1 and m1.group()) == (m2 and m2.group()), w
+
+    def run(regex, method):
+        f = getattr(regex, method)
+        return lambda: [f(w) for w in words]
+
+    report(
+        "DOMAIN_REGEX.search()",
+        timed(run(flat_domain, "search")),
+        timed(run(DOMAIN_REGEX, "search")),
+    )
+    report(
+        "MOLECULE_REGEX.match()",
+        timed(run(flat_molecule, "match")),
+        timed(run(MOLECULE_REGEX, "match")),
+    )
+
+
+@benchmark
+def digits_cache():
+    """ Tokenization of numeric text without and with the parse_digits() cache """
+    chunks = (
+        "Staðan var 3-1 árið 2021 og hlutabréfin hækkuðu um 10% "
+        "í 1.000 viðskiptum fyrir 2,5 milljarða kr. þann 12.3.2021 kl. 14:30. "
+    )
+    text = chunks * 2000
+    cache = t.DIGITS_CACHE
+    maxsize = cache.maxsize
+    run = lambda: list(t.tokenize(text))
+    try:
+        cache.resize(0)
+        before = timed(run, repeat=3)
+        cache.resize(maxsize)
+        cache.clear()
+        after = timed(run, repeat=3)
+    finally:
+        cache.resize(maxsize)
+    report("tokenize() of numeric text", before, after)
+    print("  Cache statistics: {0}".format(cache.info()))
+
+
+@benchmark
+def paragraph_cache():
+    """ split_into_sentences() of a feed with repeated boilerplate paragraphs """
+    boilerplate = [
+        "Eftir Jón Jónsson, blaðamann. Birt 12. mars 2021 kl. 14:30.",
+        "Vefurinn notar vafrakökur til að bæta þjónustu sína. "
+        "Með því að halda áfram samþykkir þú notkun þeirra.",
+        "Lesa meira á mbl.is. Öll réttindi áskilin © Árvakur hf.",
+    ]
+    articles = read_file("toktest_normal.txt").split("\n")
+    paragraphs = []
+    for line in articles:
+        paragraphs.append(boilerplate[0])
+        paragraphs.append(line)
+        paragraphs.extend(boilerplate[1:])
+    text = "\n\n".join(paragraphs * 5)
+    cache = t.LRUCache(maxsize=4096)
+    before = timed(lambda: list(t.split_into_sentences(text)), repeat=3)
+    after = timed(
+        lambda: list(t.split_into_sentences(text, paragraph_cache=cache)), repeat=3
+    )
+    assert list(t.split_into_sentences(text)) == list(
+        t.split_into_sentences(text, paragraph_cache=cache)
+    )
+    report("split_into_sentences() with a cache", before, after)
+    print("  Cache hit rate: {0:.1%}".format(cache.hit_rate()))
+
+
+@benchmark
+def tokenize_many():
+    """ A loop of tokenize() calls vs. tokenize_many() for many short texts """
+    words = read_file("toktest_normal.txt").split()
+    # Generate short 'search queries' of one to five words
+    texts = [
+        " ".join(words[i : i + 1 + i % 5]) for i in range(0, len(words), 3)
+    ] * 10
+    before = timed(lambda: [list(t.tokenize(text)) for text in texts], repeat=3)
+    after = timed(lambda: list(t.tokenize_many(texts)), repeat=3)
+    assert [list(t.tokenize(text)) for text in texts] == list(t.tokenize_many(texts))
+    report("{0} short texts".format(len(texts)), before, after)
+
+
+@benchmark
+def initialize_contention():
+    """ Abbreviations.initialize() called from many threads at once """
+    import threading
+
+    Abbreviations = t.Abbreviations
+    Abbreviations.initialize()
+    num_threads = 16
+    num_calls = 50000
+
+    def locked_initialize():
+        # The previous implementation, which always took the lock
+        with Abbreviations._lock:
+            if len(Abbreviations.DICT):
+                return
+
+    def run(func):
+        def worker():
+            for _ in range(num_calls):
+                func()
+
+        def run_threads():
+            threads = [threading.Thread(target=worker) for _ in range(num_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        return run_threads
+
+    report(
+        "{0} threads x {1} calls".format(num_threads, num_calls),
+        timed(run(locked_initialize), repeat=3),
+        timed(run(Abbreviations.initialize), repeat=3),
+    )
+
+
+@benchmark
+def abbrev_tables():
+    """ Abbreviation tables as OrderedSets and lists vs. frozen tuples """
+    from collections import OrderedDict
+
+    Abbreviations = t.Abbreviations
+    Abbreviations.initialize()
+
+    def thaw():
+        # The previous representation of the tables, where each set
+        # of meanings was an OrderedSet wrapping an OrderedDict
+        d = {k: OrderedDict((m, None) for m in v) for k, v in Abbreviations.DICT.items()}
+        w = {
+            k: OrderedDict((m, None) for m in v)
+            for k, v in Abbreviations.WRONGDICT.items()
+        }
+        return d, w
+
+    def freeze(d, w):
+        return (
+            {k: tuple(v) for k, v in d.items()},
+            {k: tuple(v) for k, v in w.items()},
+        )
+
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        old = thaw()
+        old_size = tracemalloc.get_traced_memory()[0]
+        new = freeze(*old)
+        new_size = tracemalloc.get_traced_memory()[0] - old_size
+        tracemalloc.stop()
+        print(
+            "  {0:<40} {1:9.0f} kB {2:8.0f} kB".format(
+                "Memory used by DICT and WRONGDICT", old_size / 1024, new_size / 1024
+            )
+        )
+        del old, new
+
+    old_dict, old_wrongdict = thaw()
+
+    new_dict, new_wrongdict = Abbreviations.DICT, Abbreviations.WRONGDICT
+
+    def old_get_meaning(abbrev):
+        m = old_dict.get(abbrev)
+        if not m:
+            m = old_wrongdict.get(abbrev)
+        return list(m) if m else None
+
+    def new_get_meaning(abbrev):
+        m = new_dict.get(abbrev)
+        if not m:
+            m = new_wrongdict.get(abbrev)
+        return m or None
+
+    words = read_file("toktest_normal.txt").split() * 10
+    words.extend(Abbreviations.DICT.keys())
+    report(
+        "get_meaning() x {0}".format(len(words)),
+        timed(lambda: [old_get_meaning(w) for w in words]),
+        timed(lambda: [new_get_meaning(w) for w in words]),
+    )
+
+
+@benchmark
+def abbrev_reload():
+    """ Tokenization latency while Abbrev.conf is reloaded in the background """
+    import threading
+
+    Abbreviations = t.Abbreviations
+    Abbreviations.initialize()
+    reload_time = timed(Abbreviations.reload, repeat=3)
+    print("  {0:<40} {1:9.4f} s".format("Abbreviations.reload()", reload_time))
+
+    lines = read_file("toktest_large.txt").split("\n")
+    sentences = [line for line in lines if line][:3000]
+
+    def latencies():
+        result = []
+        for sentence in sentences:
+            t0 = timer()
+            list(t.tokenize(sentence))
+            result.append(timer() - t0)
+        result.sort()
+        return result
+
+    def percentile(lat, p):
+        return lat[min(len(lat) - 1, int(len(lat) * p))] * 1000.0
+
+    before = latencies()
+    stop = threading.Event()
+
+    def reloader():
+        while not stop.is_set():
+            Abbreviations.reload()
+            reloads[0] += 1
+            stop.wait(0.01)
+
+    reloads = [0]
+    thread = threading.Thread(target=reloader)
+    thread.start()
+    try:
+        after = latencies()
+    finally:
+        stop.set()
+        thread.join()
+    print("  {0} reloads during {1} tokenize() calls".format(reloads[0], len(after)))
+    for name, p in (("median", 0.5), ("99th percentile", 0.99), ("max", 1.0)):
+        print(
+            "  {0:<40} {1:9.3f} ms {2:8.3f} ms".format(
+                "Latency, " + name, percentile(before, p), percentile(after, p)
+            )
+        )
+
+
+@benchmark
+def abbrev_mapped():
+    """ Abbreviation tables read from Abbrev.conf vs. memory-mapped """
+    import tempfile
+    from tokenizer.abbrev import AbbreviationSet
+
+    path = os.path.join(tempfile.mkdtemp(), "abbrev.bin")
+    t.Abbreviations.current().save(path)
+    report(
+        "Initialization",
+        timed(lambda: AbbreviationSet._compile(None, None)),
+        timed(lambda: AbbreviationSet.map(path)),
+    )
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+    if tracemalloc is not None:
+        sizes = []
+        for func in (lambda: AbbreviationSet._compile(None, None), lambda: AbbreviationSet.map(path)):
+            tracemalloc.start()
+            aset = func()
+            sizes.append(tracemalloc.get_traced_memory()[0])
+            tracemalloc.stop()
+            del aset
+        print(
+            "  {0:<40} {1:9.0f} kB {2:8.0f} kB".format(
+                "Private memory per process", sizes[0] / 1024, sizes[1] / 1024
+            )
+        )
+        print(
+            "  {0:<40} {1:>12} {2:8.0f} kB".format(
+                "Shared memory (page cache)", "", os.path.getsize(path) / 1024
+            )
+        )
+    mapped = AbbreviationSet.map(path)
+    text = read_file("toktest_large.txt")
+    report(
+        "tokenize() of toktest_large.txt",
+        timed(lambda: list(t.tokenize(text)), repeat=3),
+        timed(lambda: list(t.tokenize(text, abbreviations=mapped)), repeat=3),
+    )
+
+
+
+@benchmark
+def sentences_iterator():
+    """ paragraphs(list(tokenize())) vs. sentences() for one long paragraph """
+    # Without paragraph markers, the whole text is a single paragraph.
+    # It is passed in as lines, as if read from a file, so that the input
+    # does not count towards the peak memory of the tokenizer.
+    text = read_file("toktest_large.txt").splitlines(True)
+
+    def count_before():
+        return sum(len(p) for p in t.paragraphs(list(t.tokenize(text))))
+
+    def count_after():
+        return sum(1 for _ in t.sentences(text))
+
+    assert count_before() == len(
+        [s for s in t.sentences(text) if any(tok.kind != t.TOK.PUNCTUATION for tok in s.tokens)]
+    )
+    report(
+        "Sentences of toktest_large.txt",
+        timed(count_before, repeat=3),
+        timed(count_after, repeat=3),
+    )
+    try:
+        import tracemalloc
+    except ImportError:
+        return
+    peaks = []
+    for func in (count_before, count_after):
+        tracemalloc.start()
+        func()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    print(
+        "  {0:<40} {1:9.0f} kB {2:8.0f} kB".format(
+            "Peak memory", peaks[0] / 1024, peaks[1] / 1024
+        )
+    )
+
+
+@benchmark
+def paragraphs_streaming():
+    """ paragraphs() of a synthetic token stream of a gigabyte of text """
+    TOK = t.TOK
+    # A paragraph of 20 sentences of 25 tokens each, about 4 kB of text,
+    # reused to generate a stream of a gigabyte of text without holding
+    # the stream itself in memory
+    words = read_file("toktest_normal.txt").split()[:24]
+    paragraph = [TOK.Begin_Paragraph()]
+    for _ in range(20):
+        paragraph.append(TOK.Begin_Sentence())
+        paragraph.extend(TOK.Word(w) for w in words)
+        paragraph.append(TOK.Punctuation("."))
+        paragraph.append(TOK.End_Sentence())
+    paragraph.append(TOK.End_Paragraph())
+    plen = sum(len(tok.txt) + 1 for tok in paragraph if tok.txt)
+    num_paragraphs = (1 << 30) // plen
+
+    def gen():
+        for _ in range(num_paragraphs):
+            for tok in paragraph:
+                yield tok
+
+    try:
+        # tracemalloc would slow this benchmark down severalfold,
+        # so the growth of the maximum resident set size is reported
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = timer()
+    count = 0
+    last = None
+    for p in t.paragraphs(gen()):
+        count += 1
+        last = p
+    elapsed = timer() - t0
+    assert count == num_paragraphs
+    assert last[-1][0] == num_paragraphs * len(paragraph) - len(words) - 4
+    print(
+        "  {0:<40} {1:9.4f} s {2:9.1f} MB/s".format(
+            "{0:,} tokens, {1:,} MB of text".format(
+                num_paragraphs * len(paragraph), (num_paragraphs * plen) >> 20
+            ),
+            elapsed,
+            (num_paragraphs * plen) / elapsed / (1 << 20),
+        )
+    )
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+        # ru_maxrss is in kilobytes on Linux
+        print("  {0:<40} {1:9.0f} kB".format("Growth of maximum RSS", rss))
+
+
+@benchmark
+def split_sentences_fast_path():
+    """ split_into_sentences() via the full pipeline vs. the segmentation phases """
+
+    def full_pipeline(text):
+        # split_into_sentences() as it was, on top of tokenize_without_annotation()
+        sent = []
+        for tok in t.tokenize_without_annotation(text):
+            if tok.kind in t.TOK.END:
+                if sent:
+                    yield " ".join(sent)
+                    sent = []
+            elif tok.txt:
+                sent.append(tok.txt)
+        if sent:
+            yield " ".join(sent)
+
+    for name in ("toktest_sentences.txt", "toktest_large.txt"):
+        text = read_file(name)
+        assert list(full_pipeline(text)) == list(t.split_into_sentences(text))
+        report(
+            name,
+            timed(lambda: list(full_pipeline(text)), repeat=3),
+            timed(lambda: list(t.split_into_sentences(text)), repeat=3),
+        )
+
+
+@benchmark
+def correct_spaces():
+    """ correct_spaces() via RE_SPLIT.split() vs. the chunk scanner """
+    from tokenizer.definitions import (
+        TP_SPACE, LEFT_PUNCTUATION, RIGHT_PUNCTUATION,
+        NONE_PUNCTUATION, CENTER_PUNCTUATION,
+    )
+    from tokenizer.tokenizer import RE_SPLIT
+
+    def correct_spaces_re_split(s):
+        # The previous implementation of correct_spaces()
+        r = []
+        last = t.TP_NONE
+        double_quote_count = 0
+        for w in RE_SPLIT.split(s):
+            if w is None:
+                continue
+            w = w.strip()
+            if not w:
+                continue
+            if len(w) > 1:
+                this = t.TP_WORD
+            elif w == '"':
+                this = (t.TP_LEFT, t.TP_RIGHT)[double_quote_count % 2]
+                double_quote_count += 1
+            elif w in LEFT_PUNCTUATION:
+                this = t.TP_LEFT
+            elif w in RIGHT_PUNCTUATION:
+                this = t.TP_RIGHT
+            elif w in NONE_PUNCTUATION:
+                this = t.TP_NONE
+            elif w in CENTER_PUNCTUATION:
+                this = t.TP_CENTER
+            else:
+                this = t.TP_WORD
+            if (
+                (w == "og" or w == "eða")
+                and len(r) >= 2
+                and r[-1] == "-"
+                and r[-2].lstrip().isalpha()
+            ):
+                r.append(" " + w)
+            elif (
+                this == t.TP_WORD
+                and len(r) >= 2
+                and r[-1] == "-"
+                and w.isalpha()
+                and (r[-2] == "," or r[-2].lstrip() in ("og", "eða"))
+            ):
+                r[-1] = " -"
+                r.append(w)
+            elif TP_SPACE[last - 1][this - 1] and r:
+                r.append(" " + w)
+            else:
+                r.append(w)
+            last = this
+        return "".join(r)
+
+    for name in ("toktest_sentences.txt", "toktest_large.txt", "toktest_normal.txt"):
+        lines = read_file(name).splitlines()
+        assert [correct_spaces_re_split(s) for s in lines] == [
+            t.correct_spaces(s) for s in lines
+        ]
+        report(
+            name,
+            timed(lambda: [correct_spaces_re_split(s) for s in lines]),
+            timed(lambda: [t.correct_spaces(s) for s in lines]),
+        )
+
+
+@benchmark
+def detokenize_batch():
+    """ detokenize() of token tuples vs. detokenize_batch() of token columns """
+    toklist = list(t.tokenize(read_file("toktest_large.txt")))
+    toklist = (toklist * (1000000 // len(toklist) + 1))[:1000000]
+    kinds = [tok.kind for tok in toklist]
+    texts = [tok.txt for tok in toklist]
+    assert t.detokenize(toklist) == t.detokenize_batch(kinds, texts)
+    report(
+        "{0:,} tokens".format(len(toklist)),
+        timed(lambda: t.detokenize(toklist), repeat=3),
+        timed(lambda: t.detokenize_batch(kinds, texts), repeat=3),
+    )
+
+
+@benchmark
+def punctuation_class():
+    """ Chains of punctuation string tests vs. PUNCTUATION_CLASS lookups """
+    from tokenizer.definitions import (
+        TP_SPACE, LEFT_PUNCTUATION, RIGHT_PUNCTUATION,
+        NONE_PUNCTUATION, CENTER_PUNCTUATION,
+    )
+
+    TOK = t.TOK
+    text = (
+        "„Já!“ sagði hann – (og þó?) [sjá: bls. 5–7]; „nei…“ — 3/4 @ 50% & "
+        "«svo» ‚já‘ #1 $5 = €4 ± 0,5 ^ 2 * \"hér\" | 'þar' ~ <tag> © "
+    ) * 2000
+    toklist = list(t.tokenize(text))
+    punct = [tok.val[1] for tok in toklist if tok.kind == TOK.PUNCTUATION]
+
+    def punctuation_chain(w, normalized=None):
+        # TOK.Punctuation() with the previous chain of tests
+        tp = t.TP_CENTER
+        if normalized is None:
+            normalized = w
+        if normalized and len(normalized) == 1:
+            if normalized in LEFT_PUNCTUATION:
+                tp = t.TP_LEFT
+            elif normalized in RIGHT_PUNCTUATION:
+                tp = t.TP_RIGHT
+            elif normalized in NONE_PUNCTUATION:
+                tp = t.TP_NONE
+        return t.Tok(TOK.PUNCTUATION, w, (tp, normalized))
+
+    def detokenize_chain(tokens):
+        # detokenize() with the previous chain of tests
+        r = []
+        last = t.TP_NONE
+        double_quote_count = 0
+        for tok in tokens:
+            w = tok.txt
+            if not w:
+                continue
+            this = t.TP_WORD
+            if tok.kind == TOK.PUNCTUATION:
+                if len(w) > 1:
+                    pass
+                elif w == '"':
+                    this = (t.TP_LEFT, t.TP_RIGHT)[double_quote_count % 2]
+                    double_quote_count += 1
+                elif w in LEFT_PUNCTUATION:
+                    this = t.TP_LEFT
+                elif w in RIGHT_PUNCTUATION:
+                    this = t.TP_RIGHT
+                elif w in NONE_PUNCTUATION:
+                    this = t.TP_NONE
+                elif w in CENTER_PUNCTUATION:
+                    this = t.TP_CENTER
+            if TP_SPACE[last - 1][this - 1] and r:
+                r.append(" " + w)
+            else:
+                r.append(w)
+            last = this
+        return "".join(r)
+
+    assert [punctuation_chain(w) for w in punct] == [TOK.Punctuation(w) for w in punct]
+    assert detokenize_chain(toklist) == t.detokenize(toklist)
+    report(
+        "TOK.Punctuation() x {0:,}".format(len(punct)),
+        timed(lambda: [punctuation_chain(w) for w in punct]),
+        timed(lambda: [TOK.Punctuation(w) for w in punct]),
+    )
+    report(
+        "detokenize() of {0:,} tokens".format(len(toklist)),
+        timed(lambda: detokenize_chain(toklist)),
+        timed(lambda: t.detokenize(toklist)),
+    )
+
+@benchmark
+def glyphs_and_escapes():
+    """ Two regex substitution passes vs. replace_glyphs_and_escapes() """
+    from tokenizer.definitions import (
+        UNICODE_REGEX, UNICODE_REPLACEMENTS, HTML_ESCAPE_REGEX,
+        ACCENT, UMLAUT, SOFT_HYPHEN, ZEROWIDTH_SPACE,
+    )
+
+    def two_passes(txt):
+        # The previous normalization in gen_from_string()
+        txt = UNICODE_REGEX.sub(lambda match: UNICODE_REPLACEMENTS[match.group(0)], txt)
+        return HTML_ESCAPE_REGEX.sub(t.tokenizer.html_escape, txt)
+
+    def single_pass(txt):
+        return t.tokenizer.replace_glyphs_and_escapes(txt, True, True)
+
+    corpus = read_file("toktest_large.txt")
+    # The corpus has a few composite glyphs and ampersands: remove them
+    clean = corpus.replace(ACCENT, "").replace("&", "+")
+    dirty = corpus.replace("á", "a" + ACCENT).replace("ö", "o" + UMLAUT)
+    dirty = dirty.replace("ing", "in" + SOFT_HYPHEN + "g").replace(" og ", " &amp; ")
+    dirty = dirty.replace("ð", "&eth;").replace(". ", "." + ZEROWIDTH_SPACE + " ")
+    for name, text in (("clean", clean), ("corpus", corpus), ("dirty", dirty)):
+        assert two_passes(text) == single_pass(text)
+        report(
+            "{0} text, {1:,} chars".format(name, len(text)),
+            timed(lambda: two_passes(text)),
+            timed(lambda: single_pass(text)),
+        )
+
+
+@benchmark
+def glyph_detection():
+    """ Composite glyph regex pass per line vs. detecting when it is needed """
+    from tokenizer.definitions import UNICODE_REGEX, UNICODE_REPLACEMENTS
+
+    lines = read_file("toktest_large.txt").split("\n")
+
+    def regex_pass():
+        # The previous composite glyph pass, run on every line
+        for line in lines:
+            UNICODE_REGEX.sub(lambda match: UNICODE_REPLACEMENTS[match.group(0)], line)
+
+    def detection():
+        for line in lines:
+            t.tokenizer.replace_glyphs_and_escapes(line)
+
+    report(
+        "{0:,} lines".format(len(lines)),
+        timed(regex_pass),
+        timed(detection),
+    )
+    stats = t.NORMALIZATION_STATS
+    stats.clear()
+    detection()
+    print("  {0}, skip rate {1:.2%}".format(stats.info(), stats.skip_rate()))
+
+
+@benchmark
+def chunked_streaming():
+    """ Rough tokens of a 256 MB binary stream, read in chunks """
+    text = read_file("toktest_large.txt")
+    data = text.encode("utf-8")
+    num_copies = (256 << 20) // len(data)
+
+    class Stream(object):
+        # A binary stream of num_copies copies of data, generated on demand
+        def __init__(self):
+            self.copies = num_copies
+            self.pos = 0
+
+        def read(self, size):
+            if self.pos >= len(data):
+                if self.copies <= 1:
+                    return b""
+                self.copies -= 1
+                self.pos = 0
+            block = data[self.pos : self.pos + size]
+            self.pos += size
+            return block
+
+    # Tokenizing the chunks gives the same result as the whole text
+    chunks = [data[i : i + 4096] for i in range(0, len(data), 4096)]
+    assert list(t.tokenize(chunks, chunked=True)) == list(t.tokenize(text))
+    report(
+        "tokenize() of {0:,} bytes".format(len(data)),
+        timed(lambda: list(t.tokenize(text)), repeat=3),
+        timed(lambda: list(t.tokenize(chunks, chunked=True)), repeat=3),
+    )
+
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = timer()
+    count = 0
+    for _ in t.tokenizer.gen(Stream(), chunked=True):
+        count += 1
+    elapsed = timer() - t0
+    size = num_copies * len(data)
+    print(
+        "  {0:<40} {1:9.4f} s {2:9.1f} MB/s".format(
+            "{0:,} rough tokens, {1:,} MB".format(count, size >> 20),
+            elapsed,
+            size / elapsed / (1 << 20),
+        )
+    )
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+        # ru_maxrss is in kilobytes on Linux
+        print("  {0:<40} {1:9.0f} kB".format("Growth of maximum RSS", rss))
+
+
+@benchmark
+def compressed_input():
+    """ The tokenize command on compressed files, piped vs. decompressed in-process """
+    import gzip
+    import bz2
+    import lzma
+    import shutil
+    import subprocess
+    import tempfile
+
+    data = read_file("toktest_large.txt").encode("utf-8") * 2
+    tmpdir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(t.__file__)))
+    command = [sys.executable, "-m", "tokenizer.main"]
+    # Only read the input lines, as the tokenize command does
+    read_command = [
+        sys.executable,
+        "-c",
+        "import sys; from tokenizer.main import open_infile; "
+        "[0 for _ in open_infile(sys.argv[1] if len(sys.argv) > 1 else '-')]",
+    ]
+    formats = [("gzip", ".gz", gzip), ("bz2", ".bz2", bz2), ("xz", ".xz", lzma)]
+
+    def run(args, stdin=None):
+        with open(os.devnull, "wb") as devnull:
+            subprocess.check_call(args, stdin=stdin, stdout=devnull, env=env)
+
+    def piped(command, path, decompressor):
+        # The previous approach: an external decompressor piped into tokenize
+        p = subprocess.Popen([decompressor, "-dc", path], stdout=subprocess.PIPE)
+        run(command, stdin=p.stdout)
+        p.stdout.close()
+        p.wait()
+
+    try:
+        for name, ext, module in formats:
+            decompressor = "bzip2" if name == "bz2" else name
+            if shutil.which(decompressor) is None:
+                continue
+            path = os.path.join(tmpdir, "corpus" + ext)
+            with module.open(path, "wb") as f:
+                f.write(data)
+            report(
+                "{0}, {1:,} bytes".format(name, len(data)),
+                timed(lambda: piped(command, path, decompressor), repeat=3),
+                timed(lambda: run(command + [path]), repeat=3),
+            )
+            # The cost of decompression and reading alone, on more data
+            with module.open(path, "wb") as f:
+                f.write(data * 50)
+            report(
+                "{0}, read only, {1:,} bytes".format(name, len(data) * 50),
+                timed(lambda: piped(read_command, path, decompressor), repeat=3),
+                timed(lambda: run(read_command + [path]), repeat=3),
+            )
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@benchmark
+def corpus_driver():
+    """ tokenize_corpus() of 8 files, in one process vs. one per CPU """
+    import multiprocessing
+    import shutil
+    import tempfile
+    from tokenizer.corpus import tokenize_corpus
+
+    text = read_file("toktest_large.txt")
+    tmpdir = tempfile.mkdtemp()
+    indir = os.path.join(tmpdir, "in")
+    os.makedirs(indir)
+    for i in range(8):
+        with io.open(os.path.join(indir, "part{0}.txt".format(i)), "w", encoding="utf-8") as f:
+            f.write(text)
+    workers = multiprocessing.cpu_count()
+    infos = []
+
+    def run(workers):
+        # A fresh output directory, so that no shards are skipped
+        outdir = tempfile.mkdtemp(dir=tmpdir)
+        infos.append(tokenize_corpus([indir], outdir, workers=workers))
+
+    try:
+        report(
+            "8 x {0:,} bytes, {1} workers".format(len(text.encode("utf-8")), workers),
+            timed(lambda: run(1), repeat=1),
+            timed(lambda: run(workers), repeat=1),
+        )
+    finally:
+        shutil.rmtree(tmpdir)
+    for info in infos:
+        print(
+            "  {0:<40} {1:9.2f} MB/s {2:9,.0f} tokens/s".format(
+                "{0} shards, {1:,} tokens".format(info.shards, info.tokens),
+                info.bytes / 1e6 / info.seconds,
+                info.tokens / info.seconds,
+            )
+        )
+
+
+@benchmark
+def columnar_export():
+    """ JSON lines written and parsed vs. columnar layout written and read """
+    import json
+    import shutil
+    import tempfile
+    from tokenizer.columnar import export_columns, read_columns
+    from tokenizer.main import write_tokens
+
+    tokens = list(t.tokenize(read_file("toktest_large.txt")))
+    tmpdir = tempfile.mkdtemp()
+
+    def json_lines():
+        path = os.path.join(tmpdir, "tokens.jsonl")
+        with io.open(path, "w", encoding="utf-8") as f:
+            write_tokens(tokens, f, json=True)
+        with io.open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def columns():
+        path = os.path.join(tmpdir, "tokens.columns")
+        export_columns(tokens, path, format="npy")
+        return read_columns(path)
+
+    try:
+        report(
+            "{0:,} tokens".format(len(tokens)),
+            timed(json_lines, repeat=3),
+            timed(columns, repeat=3),
+        )
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@benchmark
+def kinds_filter():
+    """ tokenize() filtered afterwards vs. tokenize(kinds=...), for PII scanning """
+    text = read_file("toktest_large.txt")
+    TOK = t.TOK
+    pii = {TOK.SSN, TOK.TELNO, TOK.EMAIL, TOK.URL, TOK.USERNAME}
+    for name, kinds in (
+        ("PII (SSN, TELNO, EMAIL, URL, USERNAME)", pii),
+        ("URL and EMAIL only", {TOK.URL, TOK.EMAIL}),
+        ("WORD only", {TOK.WORD}),
+    ):
+        report(
+            name,
+            timed(lambda: [tok for tok in t.tokenize(text) if tok.kind in kinds], repeat=3),
+            timed(lambda: list(t.tokenize(text, kinds=kinds)), repeat=3),
+        )
+
+
+@benchmark
+def pii_scan():
+    """ tokenize() filtered afterwards vs. scan_pii(), one paragraph per message """
+    lines = [line for line in read_file("toktest_large.txt").split("\n") if line.strip()]
+    # A feed of messages, separated by empty lines
+    feed = "\n\n".join(lines)
+    # Without empty lines, the whole text is a single paragraph
+    text = "\n".join(lines)
+
+    def scan(text):
+        return [tok for tok in t.tokenize(text) if tok.kind in t.PII_KINDS]
+
+    report(
+        "{0:,} messages".format(len(lines)),
+        timed(lambda: scan(feed), repeat=3),
+        timed(lambda: list(t.scan_pii(feed)), repeat=3),
+    )
+    report(
+        "one message at a time",
+        timed(lambda: [scan(line) for line in lines], repeat=3),
+        timed(lambda: [list(t.scan_pii(line)) for line in lines], repeat=3),
+    )
+    report(
+        "redact_pii()",
+        timed(lambda: scan(feed), repeat=3),
+        timed(lambda: t.redact_pii(feed), repeat=3),
+    )
+    report(
+        "single paragraph",
+        timed(lambda: scan(text), repeat=3),
+        timed(lambda: list(t.scan_pii(text)), repeat=3),
+    )
+
+
+@benchmark
+def token_counts():
+    """ Counters of strings and string pairs vs. TokenCounts, time and memory """
+    import random
+    from collections import Counter
+    from tokenizer.counts import TokenCounts
+
+    word = t.TOK.WORD
+
+    def counters(tokens):
+        kinds, forms, normalized, bigrams = Counter(), Counter(), Counter(), Counter()
+        prev = None
+        for tok in tokens:
+            kinds[tok.kind] += 1
+            if tok.kind != word:
+                prev = None
+                continue
+            forms[tok.txt] += 1
+            norm = tok.txt.lower()
+            normalized[norm] += 1
+            if prev is not None:
+                bigrams[(prev, norm)] += 1
+            prev = norm
+        return kinds, forms, normalized, bigrams
+
+    def token_counts(tokens):
+        counts = TokenCounts(bigrams=True)
+        counts.update(tokens)
+        return counts
+
+    tokens = list(t.tokenize(read_file("toktest_large.txt")))
+    report(
+        "{0:,} tokens".format(len(tokens)),
+        timed(lambda: counters(tokens), repeat=3),
+        timed(lambda: token_counts(tokens), repeat=3),
+    )
+    # A large vocabulary, with word frequencies following Zipf's law
+    random.seed(50)
+    letters = "aábdðeéfghiíjklmnoóprstuúvxyýþæö"
+    vocabulary = [
+        "".join(random.choice(letters) for _ in range(random.randint(2, 12)))
+        for _ in range(100000)
+    ]
+    # Log-uniform ranks, i.e. P(rank) proportional to 1 / rank
+    words = [
+        vocabulary[int(len(vocabulary) ** random.random()) - 1] for _ in range(1000000)
+    ]
+    tokens = [
+        t.TOK.Word(w.capitalize() if random.random() < 0.1 else w) for w in words
+    ]
+    report(
+        "{0:,} tokens, Zipfian vocabulary".format(len(tokens)),
+        timed(lambda: counters(tokens), repeat=1),
+        timed(lambda: token_counts(tokens), repeat=1),
+    )
+    try:
+        import tracemalloc
+    except ImportError:
+        # Python 2.7
+        return
+    sizes = []
+    for func in (counters, token_counts):
+        tracemalloc.start()
+        result = func(tokens)
+        sizes.append(tracemalloc.get_traced_memory()[0])
+        tracemalloc.stop()
+        del result
+    print(
+        "  {0:<40} {1:9.1f} MB {2:8.1f} MB   {3:5.2f}x".format(
+            "memory", sizes[0] / 1e6, sizes[1] / 1e6, sizes[0] / sizes[1]
+        )
+    )
+
+
+def main(names):
+    print("{0:<42} {1:>11} {2:>11} {3:>8}".format("Benchmark", "Before", "After", "Speedup"))
+    for func in BENCHMARKS:
+        if names and func.__name__ not in names:
+            continue
+        print("{0}: {1}".format(func.__name__, func.__doc__.strip()))
+        func()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -34,6 +34,7 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import re
 import sys
 import tokenizer as t
 
@@ -1059,18 +1060,18 @@ def test_abbrev():
         Tok(
             kind=TOK.WORD,
             txt="IBM",
-            val=[("International Business Machines", 0, "hk", "skst", "IBM", "-")],
+            val=(("International Business Machines", 0, "hk", "skst", "IBM", "-"),),
         ),
         Tok(
             kind=TOK.WORD,
             txt="t.d.",
-            val=[("til dæmis", 0, "ao", "frasi", "t.d.", "-")],
+            val=(("til dæmis", 0, "ao", "frasi", "t.d.", "-"),),
         ),
         Tok(kind=TOK.WORD, txt="á", val=None),
         Tok(
             kind=TOK.WORD,
             txt="Mbl",
-            val=[("Morgunblaðið", 0, "hk", "skst", "Mbl", "-")],
+            val=(("Morgunblaðið", 0, "hk", "skst", "Mbl", "-"),),
         ),
         Tok(kind=TOK.PUNCTUATION, txt=".", val=(3, ".")),
         Tok(kind=TOK.S_END, txt=None, val=None),
@@ -1081,7 +1082,7 @@ def test_abbrev():
         Tok(kind=TOK.WORD, txt="Reykjavík", val=None),
         Tok(kind=TOK.WORD, txt="er", val=None),
         Tok(kind=TOK.WORD, txt="stór", val=None),
-        Tok(kind=TOK.WORD, txt="m.v.", val=[('miðað við', 0, 'fs', 'frasi', 'm.v.', '-')]),
+        Tok(kind=TOK.WORD, txt="m.v.", val=(('miðað við', 0, 'fs', 'frasi', 'm.v.', '-'),)),
         Tok(kind=TOK.WORD, txt="Akureyri", val=None),
         Tok(kind=TOK.PUNCTUATION, txt=".", val=(3, ".")),
         Tok(kind=TOK.S_END, txt=None, val=None),
@@ -1091,7 +1092,7 @@ def test_abbrev():
         Tok(kind=TOK.S_BEGIN, txt=None, val=(0, None)),
         Tok(kind=TOK.WORD, txt="Ég", val=None),
         Tok(kind=TOK.WORD, txt="nefndi", val=None),
-        Tok(kind=TOK.WORD, txt="t.d.", val=[('til dæmis', 0, 'ao', 'frasi', 't.d.', '-')]),
+        Tok(kind=TOK.WORD, txt="t.d.", val=(('til dæmis', 0, 'ao', 'frasi', 't.d.', '-'),)),
         Tok(kind=TOK.WORD, txt="Guðmund", val=None),
         Tok(kind=TOK.PUNCTUATION, txt=".", val=(3, ".")),
         Tok(kind=TOK.S_END, txt=None, val=None),
@@ -1101,7 +1102,7 @@ def test_abbrev():
         Tok(kind=TOK.S_BEGIN, txt=None, val=(0, None)),
         Tok(kind=TOK.WORD, txt="Jón", val=None),
         Tok(kind=TOK.WORD, txt="var", val=None),
-        Tok(kind=TOK.WORD, txt="sérfr.", val=[('sérfræðingur', 0, 'kk', 'skst', 'sérfr.', '-')]),
+        Tok(kind=TOK.WORD, txt="sérfr.", val=(('sérfræðingur', 0, 'kk', 'skst', 'sérfr.', '-'),)),
         Tok(kind=TOK.S_END, txt=None, val=None),
         Tok(kind=TOK.S_BEGIN, txt=None, val=(0, None)),
         Tok(kind=TOK.WORD, txt="Guðmundur", val=None),
@@ -1115,12 +1116,12 @@ def test_abbrev():
         Tok(kind=TOK.S_BEGIN, txt=None, val=(0, None)),
         Tok(kind=TOK.WORD, txt="Jón", val=None),
         Tok(kind=TOK.WORD, txt="var", val=None),
-        Tok(kind=TOK.WORD, txt="t.h.", val=[('til hægri', 0, 'ao', 'frasi', 't.h.', '-')]),
+        Tok(kind=TOK.WORD, txt="t.h.", val=(('til hægri', 0, 'ao', 'frasi', 't.h.', '-'),)),
         Tok(kind=TOK.S_END, txt=None, val=None),
         Tok(kind=TOK.S_BEGIN, txt=None, val=(0, None)),
         Tok(kind=TOK.WORD, txt="Guðmundur", val=None),
         Tok(kind=TOK.WORD, txt="var", val=None),
-        Tok(kind=TOK.WORD, txt="t.v.", val=[('til vinstri', 0, 'ao', 'frasi', 't.v.', '-')]),
+        Tok(kind=TOK.WORD, txt="t.v.", val=(('til vinstri', 0, 'ao', 'frasi', 't.v.', '-'),)),
         Tok(kind=TOK.WORD, txt="á", val=None),
         Tok(kind=TOK.WORD, txt="myndinni", val=None),
         Tok(kind=TOK.PUNCTUATION, txt=".", val=(3, ".")),
@@ -1131,7 +1132,7 @@ def test_abbrev():
         Tok(kind=TOK.S_BEGIN, txt=None, val=(0, None)),
         Tok(kind=TOK.WORD, txt="Bréfið", val=None),
         Tok(kind=TOK.WORD, txt="var", val=None),
-        Tok(kind=TOK.WORD, txt="dags.", val=[('dagsetja', 0, 'so', 'skst', 'dags.', '-'), ('dagsettur', 0, 'lo', 'skst', 'dags.', '-')]),
+        Tok(kind=TOK.WORD, txt="dags.", val=(('dagsetja', 0, 'so', 'skst', 'dags.', '-'), ('dagsettur', 0, 'lo', 'skst', 'dags.', '-'),)),
         Tok(kind=TOK.DATEREL, txt="20. maí", val=(0, 5, 20)),
         Tok(kind=TOK.PUNCTUATION, txt=".", val=(3, ".")),
         Tok(kind=TOK.S_END, txt=None, val=None),
@@ -1142,8 +1143,8 @@ def test_abbrev():
         Tok(kind=TOK.WORD, txt="Ég", val=None),
         Tok(kind=TOK.WORD, txt="ræddi", val=None),
         Tok(kind=TOK.WORD, txt="við", val=None),
-        Tok(kind=TOK.WORD, txt="hv.", val=[('hæstvirtur', 0, 'lo', 'skst', 'hv.', '-'), ('háttvirtur', 0, 'lo', 'skst', 'hv.', '-')]),
-        Tok(kind=TOK.WORD, txt="þm.", val=[('þingmaður', 0, 'kk', 'skst', 'þm.', '-')]),
+        Tok(kind=TOK.WORD, txt="hv.", val=(('hæstvirtur', 0, 'lo', 'skst', 'hv.', '-'), ('háttvirtur', 0, 'lo', 'skst', 'hv.', '-'),)),
+        Tok(kind=TOK.WORD, txt="þm.", val=(('þingmaður', 0, 'kk', 'skst', 'þm.', '-'),)),
         Tok(kind=TOK.WORD, txt="Halldóru", val=None),
         Tok(kind=TOK.WORD, txt="Mogensen", val=None),
         Tok(kind=TOK.PUNCTUATION, txt=".", val=(3, ".")),
@@ -1411,6 +1412,1256 @@ def test_one_sent_per_line():
     assert toklist == correct
 
 
+def test_trie_regex():
+    from tokenizer.definitions import trie_regex, DOMAIN_REGEX, MOLECULE_REGEX
+    r = re.compile("^" + trie_regex(["C", "Ca", "Cd", "Co", "com", "co", "H"]) + "$")
+    for w in ("C", "Ca", "Cd", "Co", "com", "co", "H"):
+        assert r.match(w), w
+    for w in ("", "c", "Cx", "Com", "cox", "HH"):
+        assert not r.match(w), w
+    # Longer alternatives are preferred over shorter ones
+    r = re.compile(trie_regex(["C", "Ca", "Cab"]))
+    assert r.match("Cab").group() == "Cab"
+    assert r.match("Cax").group() == "Ca"
+    assert MOLECULE_REGEX.match("H2SO4").group() == "H2SO4"
+    assert MOLECULE_REGEX.match("CaCO3.").group() == "CaCO3"
+    assert MOLECULE_REGEX.match("Cl2").group() == "Cl2"
+    assert DOMAIN_REGEX.search("greynir.is")
+    assert DOMAIN_REGEX.search("mbl.is).")
+    assert DOMAIN_REGEX.search("t.co")
+    assert not DOMAIN_REGEX.search("greynir.iss")
+    assert not DOMAIN_REGEX.search("frá.því")
+
+
+def test_digits_cache():
+    cache = t.DIGITS_CACHE
+    maxsize = cache.maxsize
+    cache.clear()
+    text = "Staðan var 3-1 árið 2021 en 10% af 1.000 kr. fóru 2021 til 3-1 liðsins."
+    toklist = list(t.tokenize(text))
+    info = cache.info()
+    assert info.hits >= 2
+    assert info.currsize == info.misses
+    assert 0.0 < cache.hit_rate() < 1.0
+    try:
+        cache.resize(0)
+        assert cache.info().currsize == 0
+        assert list(t.tokenize(text)) == toklist
+        assert cache.info().currsize == 0
+    finally:
+        cache.resize(maxsize)
+    # Least recently used entries are evicted first
+    c = t.LRUCache(maxsize=2)
+    c.put("a", 1)
+    c.put("b", 2)
+    assert c.get("a") == 1
+    c.put("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    assert c.get("c") == 3
+    assert c.info() == t.CacheInfo(hits=3, misses=1, maxsize=2, currsize=2)
+    c.resize(1)
+    assert c.get("a") is None
+    assert c.get("c") == 3
+
+
+def test_paragraph_cache():
+    byline = "Lesa meira á mbl.is.\nÖll réttindi áskilin © Árvakur hf. 2021."
+    text = "\n\n".join(
+        [byline, "Jón fór út kl. 14:30 í gær.", byline, "Veðrið var gott.\n", byline]
+    )
+    toklist = list(t.tokenize(text))
+    cache = t.LRUCache(maxsize=10)
+    assert list(t.tokenize(text, paragraph_cache=cache)) == toklist
+    assert cache.info() == t.CacheInfo(hits=2, misses=3, maxsize=10, currsize=3)
+    assert list(t.tokenize(text, paragraph_cache=cache)) == toklist
+    assert cache.info() == t.CacheInfo(hits=7, misses=3, maxsize=10, currsize=3)
+    # Different options result in different cache entries
+    toklist = list(t.tokenize(text, convert_numbers=True))
+    assert list(t.tokenize(text, convert_numbers=True, paragraph_cache=cache)) == toklist
+    assert cache.info().currsize == 6
+    # A generator of lines works the same way as a string
+    lines = text.split("\n")
+    assert list(t.tokenize(lines, paragraph_cache=cache)) == list(t.tokenize(lines))
+    # The glyph and HTML escape replacements are applied only once
+    text = "Gu\u00f0mundur &amp;aacute; og a&shy;\u0301"
+    assert list(t.tokenize(text, replace_html_escapes=True, paragraph_cache=cache)) == list(
+        t.tokenize(text, replace_html_escapes=True)
+    )
+    # The shared cache is used if paragraph_cache is True
+    t.PARAGRAPH_CACHE.clear()
+    sents = list(t.split_into_sentences(byline + "\n\n" + byline, paragraph_cache=True))
+    assert sents == [
+        "Lesa meira á mbl.is .",
+        "Öll réttindi áskilin © Árvakur hf. 2021 .",
+    ] * 2
+    assert t.PARAGRAPH_CACHE.info().hits == 1
+    assert t.PARAGRAPH_CACHE.hit_rate() == 0.5
+
+
+def test_tokenize_many():
+    texts = [
+        "ódýr sjónvörp",
+        "",
+        "Samsung 55\" 4K sjónvarp á 99.900 kr.",
+        "opnunartími kl. 14:30",
+        "Hvar er t.d. næsta verslun? Í Kringlunni.",
+        "",
+    ]
+    results = list(t.tokenize_many(texts))
+    assert len(results) == len(texts)
+    for text, toklist in zip(texts, results):
+        assert toklist == list(t.tokenize(text))
+    assert results[1] == []
+    assert results[-1] == []
+    # Options are applied to all texts
+    results = list(t.tokenize_many(texts, convert_numbers=True, with_annotation=False))
+    for text, toklist in zip(texts, results):
+        assert toklist == list(t.tokenize_without_annotation(text, convert_numbers=True))
+    # Generators are accepted as input
+    cache = t.LRUCache()
+    results = list(t.tokenize_many((s for s in texts * 2), paragraph_cache=cache))
+    assert results == [list(t.tokenize(s)) for s in texts * 2]
+    assert cache.info().hits == 4
+
+
+def test_abbrev_initialize_lock_free():
+    t.Abbreviations.initialize()
+    # Once the tables have been published, initialize() must return
+    # without taking the lock (which would deadlock here)
+    with t.Abbreviations._lock:
+        t.Abbreviations.initialize()
+        toklist = list(t.tokenize("Þetta er t.d. prófun."))
+    assert toklist[3].txt == "t.d."
+    assert toklist[3].val
+
+
+def test_abbrev_tables_frozen():
+    A = t.Abbreviations
+    A.initialize()
+    assert isinstance(A.DICT, dict)
+    assert isinstance(A.DICT["t.d."], tuple)
+    assert isinstance(A.WRONGDICT["td"], tuple)
+    assert isinstance(A.WRONGDOTS["td"], tuple)
+    for s in (A.MEANINGS, A.SINGLES, A.WRONGSINGLES, A.FINISHERS, A.NOT_FINISHERS):
+        assert isinstance(s, frozenset)
+    # Missing keys are not silently added to the tables
+    assert A.get_meaning("xyzzy") is None
+    assert "xyzzy" not in A.DICT
+    assert "xyzzy" not in A.WRONGDICT
+    # Tokens share the meaning tuples of the abbreviation tables
+    m = A.get_meaning("t.d.")
+    assert m is A.DICT["t.d."]
+    toklist = list(t.tokenize("Þetta er t.d. prófun og t.d. önnur."))
+    assert toklist[3].val is m
+    assert toklist[6].val is m
+
+
+def test_abbreviation_set():
+    import os
+    import shutil
+    import tempfile
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        medical = os.path.join(tmpdir, "medical.conf")
+        with open(medical, "wb") as f:
+            f.write(
+                "[abbreviations]\n"
+                'blþr. = "blóðþrýstingur" kk\n'
+                "# Not an abbreviation in this domain\n"
+                "[not_abbreviations]\n"
+                '"ca"\n'.encode("utf-8")
+            )
+        legal = os.path.join(tmpdir, "legal.conf")
+        with open(legal, "wb") as f:
+            f.write('[abbreviations]\ndskj. = "dómskjal" hk\n'.encode("utf-8"))
+
+        default = t.Abbreviations.current()
+        assert t.AbbreviationSet.load() is default
+        med = t.AbbreviationSet.load(medical)
+        # Each combination of files is only read once
+        assert t.AbbreviationSet.load(medical) is med
+        both = t.AbbreviationSet.load(medical, legal)
+    finally:
+        shutil.rmtree(tmpdir)
+    assert both.files == (os.path.abspath(medical), os.path.abspath(legal))
+    assert med.serial != default.serial != both.serial
+    # Meaning tuples are shared between the sets
+    assert med.DICT["t.d."] is default.DICT["t.d."]
+    assert "blþr." in med.DICT and "blþr." in both.DICT and "dskj." in both.DICT
+    assert "blþr." not in default.DICT and "dskj." not in med.DICT
+    assert "ca" in default.WRONGDICT and "ca" not in med.WRONGDICT
+    assert "ca" not in both.WRONGDICT and both.WRONGDICT.get("ca") is None
+    # The tables of the set below are looked up, not copied
+    assert len(med.DICT) == len(default.DICT) + 1
+    assert len(med.WRONGDICT) == len(default.WRONGDICT)
+    assert set(both.SINGLES) == set(default.SINGLES) | {"blþr", "dskj"}
+    assert not hasattr(med.SINGLES, "add")
+    assert dict(both.DICT.items())["blþr."] == med.DICT["blþr."]
+
+    def tokens(text, **options):
+        return [(tok.txt, tok.val) for tok in t.tokenize(text, **options)][1:-1]
+
+    text = "Mældur var blþr. sjúklings"
+    meaning = (("blóðþrýstingur", 0, "kk", "skst", "blþr.", "-"),)
+    assert ("blþr.", meaning) in tokens(text, abbreviations=med)
+    assert ("blþr.", meaning) not in tokens(text)
+    # The sets are kept apart in the paragraph cache
+    cache = t.LRUCache(maxsize=10)
+    assert ("blþr.", meaning) not in tokens(text, paragraph_cache=cache)
+    assert ("blþr.", meaning) in tokens(text, abbreviations=med, paragraph_cache=cache)
+    assert [[tok.val for tok in toks[1:-1]] for toks in t.tokenize_many(
+        ["blþr.", "dskj. 5"], abbreviations=both
+    )] == [
+        [meaning],
+        [(("dómskjal", 0, "hk", "skst", "dskj.", "-"),), (5, None, None)],
+    ]
+    # The default tables are not affected
+    assert not t.Abbreviations.has_meaning("blþr.")
+    assert t.Abbreviations.DICT is default.DICT
+
+    # Abbreviations can still be added to the default set one at a time
+    try:
+        t.Abbreviations.add("blþr.", "blóðþrýstingur", "kk")
+        t.Abbreviations.add("dskj.", "dómskjal", "hk")
+        added = t.Abbreviations.current()
+        assert added is not default and t.AbbreviationSet.load() is added
+        assert ("blþr.", meaning) in tokens(text)
+        assert t.Abbreviations.has_meaning("dskj.")
+        assert t.Abbreviations.get_meaning("t.d.") is default.DICT["t.d."]
+        assert len(added.DICT) == len(default.DICT) + 2
+    finally:
+        t.Abbreviations.reload()
+    assert not t.Abbreviations.has_meaning("blþr.")
+    from tokenizer.abbrev import OrderedSet
+
+    s = OrderedSet()
+    for item in ("b", "a", "b"):
+        s.add(item)
+    assert list(s) == ["b", "a"] and "a" in s
+
+
+def test_abbreviations_reload():
+    import os
+    import shutil
+    import tempfile
+    import time
+
+    old = t.Abbreviations.current()
+    toks = t.tokenize("Þetta er t.d. prófun. " * 3)
+    assert next(toks).kind == TOK.S_BEGIN
+    t.Abbreviations.reload()
+    new = t.Abbreviations.current()
+    assert new is not old and new.serial > old.serial
+    assert new.DICT == old.DICT and t.Abbreviations.DICT is new.DICT
+    assert t.AbbreviationSet.load() is new
+    # A tokenization call in progress keeps using the set it started with
+    vals = [tok.val for tok in toks if tok.txt == "t.d."]
+    assert len(vals) == 3
+    assert all(val is old.DICT["t.d."] for val in vals)
+    assert list(t.tokenize("t.d."))[1].val is new.DICT["t.d."]
+    # Reload in a background thread
+    thread = t.Abbreviations.reload(background=True)
+    thread.join()
+    assert t.Abbreviations.current().serial > new.serial
+
+    # Overlay sets are read again, on top of the new set, after a reload
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "overlay.conf")
+    with open(path, "wb") as f:
+        f.write('[abbreviations]\nblþr. = "blóðþrýstingur" kk\n'.encode("utf-8"))
+    try:
+        overlay = t.AbbreviationSet.load(path)
+        assert not overlay.changed()
+        mtime = os.stat(path).st_mtime
+        os.utime(path, (mtime + 10, mtime + 10))
+        assert overlay.changed()
+        # The watcher reloads the abbreviations when it notices the change
+        current = t.Abbreviations.current()
+        stop = t.Abbreviations.watch(interval=0.01)
+        try:
+            for _ in range(500):
+                if t.Abbreviations.current() is not current:
+                    break
+                time.sleep(0.01)
+        finally:
+            stop.set()
+        assert t.Abbreviations.current() is not current
+        reloaded = t.AbbreviationSet.load(path)
+        assert reloaded is not overlay and not reloaded.changed()
+        assert reloaded.DICT["t.d."] is t.Abbreviations.current().DICT["t.d."]
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_abbreviations_mapped():
+    import os
+    import shutil
+    import tempfile
+
+    default = t.Abbreviations.current()
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "abbrev.bin")
+    try:
+        default.save(path)
+        mapped = t.AbbreviationSet.map(path)
+        assert mapped.files == default.files and mapped.sources == default.sources
+        for name in ("DICT", "WRONGDICT", "WRONGDOTS"):
+            assert len(getattr(mapped, name)) == len(getattr(default, name))
+            assert dict(getattr(mapped, name).items()) == getattr(default, name)
+        for name in ("MEANINGS", "SINGLES", "FINISHERS", "NOT_FINISHERS"):
+            assert set(getattr(mapped, name)) == getattr(default, name)
+        assert mapped.get_meaning("t.d.") == default.get_meaning("t.d.")
+        assert mapped.get_meaning("xyzzy") is None
+        assert "xyzzy" not in mapped.DICT and "xyzzy" not in mapped.SINGLES
+        try:
+            mapped.DICT["xyzzy"]
+            assert False, "KeyError expected"
+        except KeyError:
+            pass
+
+        src_dir = os.path.dirname(__file__)
+        with open(os.path.join(src_dir, "toktest_sentences.txt"), "rb") as f:
+            text = f.read().decode("utf-8")
+        assert list(t.tokenize(text, abbreviations=mapped)) == list(t.tokenize(text))
+
+        # Overlay sets can be laid over a mapped set
+        overlay = os.path.join(os.path.dirname(path), "overlay.conf")
+        with open(overlay, "wb") as f:
+            f.write('[abbreviations]\nblþr. = "blóðþrýstingur" kk\n'.encode("utf-8"))
+        try:
+            t.Abbreviations.map(path)
+            assert t.Abbreviations.current().DICT is t.Abbreviations.DICT
+            assert t.Abbreviations.get_meaning("t.d.") == default.get_meaning("t.d.")
+            assert t.AbbreviationSet.load() is t.Abbreviations.current()
+            aset = t.AbbreviationSet.load(overlay)
+            assert aset.DICT["t.d."] == default.DICT["t.d."] and "blþr." in aset.DICT
+        finally:
+            t.Abbreviations.reload()
+
+        with open(path, "wb") as f:
+            f.write(b"Not a compiled abbreviation file")
+        try:
+            t.AbbreviationSet.map(path)
+            assert False, "ConfigError expected"
+        except t.ConfigError:
+            pass
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_sentences_iterator():
+    text = (
+        "[[ Jón fór út í búð. Hann keypti t.d. mjólk kl. 14:30. ]] "
+        "[[ Þetta var 3. maí 2021! ]] [[ ]] Síðasta setningin"
+    )
+    toklist = list(t.tokenize(text))
+    sents = list(t.sentences(text))
+    assert [s.tokens for s in sents] == [
+        tuple(sent) for p in t.paragraphs(toklist) for _, sent in p
+    ]
+    for s in sents:
+        assert toklist[s.start].kind == t.TOK.S_BEGIN
+        assert toklist[s.end].kind == t.TOK.S_END
+        assert toklist[s.start + 1 : s.end] == list(s.tokens)
+    assert t.text_from_tokens(sents[1].tokens) == "Hann keypti t.d. mjólk kl. 14:30 ."
+    # Options are passed on to tokenize()
+    sents = list(t.sentences("Hann keypti 1,234.5 lítra.", convert_numbers=True))
+    assert sents[0].tokens[2].txt == "1.234,5"
+
+    # Each sentence is yielded before the rest of the input has been read
+    lines_read = []
+
+    def gen():
+        for i in range(100):
+            lines_read.append(i)
+            yield "Þetta er setning númer {0}.\n".format(i)
+
+    it = t.sentences(gen())
+    first = next(it)
+    assert t.text_from_tokens(first.tokens) == "Þetta er setning númer 0 ."
+    assert len(lines_read) < 5
+    assert len(list(it)) == 99
+
+
+def test_paragraphs_streaming():
+    TOK = t.TOK
+    consumed = [0]
+
+    def gen(num_paragraphs, sents_per_paragraph):
+        # A lazily generated synthetic token stream
+        for _ in range(num_paragraphs):
+            yield TOK.Begin_Paragraph()
+            for _ in range(sents_per_paragraph):
+                yield TOK.Begin_Sentence()
+                yield TOK.Word("Halló")
+                yield TOK.Word("heimur")
+                yield TOK.Punctuation(".")
+                yield TOK.End_Sentence()
+            consumed[0] += 1
+            yield TOK.End_Paragraph()
+
+    plen = 1 + 3 * 5 + 1
+    for pix, p in enumerate(t.paragraphs(gen(10000, 3))):
+        # Each paragraph is yielded as soon as its P_END arrives,
+        # before the next paragraph is generated
+        assert consumed[0] == pix + 1
+        assert [ix for ix, _ in p] == [pix * plen + 1 + 5 * i for i in range(3)]
+        assert all(len(sent) == 3 for _, sent in p)
+    assert pix == 9999
+    # An empty iterator, an empty list or None yields no paragraphs
+    assert list(t.paragraphs(iter([]))) == []
+    assert list(t.paragraphs([])) == []
+    assert list(t.paragraphs(None)) == []
+    # The same result is obtained from a list and a generator
+    text = t.mark_paragraphs("Fyrsta málsgrein.\nÖnnur. Sú þriðja.\n\n")
+    assert list(t.paragraphs(t.tokenize(text))) == list(
+        t.paragraphs(list(t.tokenize(text)))
+    )
+
+
+def test_split_sentences_fast_path():
+    import io
+    import os
+
+    # split_into_sentences() skips the phases that coalesce multi-word
+    # tokens, but must agree with joining the output of the full pipeline
+    def reference(text_or_gen, normalize=False, **options):
+        to_text = t.normalized_text if normalize else (lambda tok: tok.txt)
+        sent = []
+        for tok in t.tokenize_without_annotation(text_or_gen, **options):
+            if tok.kind in t.TOK.END:
+                if sent:
+                    yield " ".join(sent)
+                    sent = []
+            elif to_text(tok):
+                sent.append(to_text(tok))
+        if sent:
+            yield " ".join(sent)
+
+    for name in ("toktest_sentences.txt", "toktest_normal.txt"):
+        path = os.path.join(os.path.dirname(__file__), name)
+        with io.open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        for options in (
+            {},
+            {"normalize": True},
+            {"convert_numbers": True, "convert_measurements": True},
+            {"handle_kludgy_ordinals": t.KLUDGY_ORDINALS_TRANSLATE},
+        ):
+            expected = list(reference(text, **options))
+            assert list(t.split_into_sentences(text, **options)) == expected
+            assert list(
+                t.split_into_sentences(text.splitlines(), **options)
+            ) == list(reference(text.splitlines(), **options))
+        assert list(
+            t.split_into_sentences(text, paragraph_cache=t.LRUCache())
+        ) == list(reference(text))
+
+
+def test_correct_spaces_scanner():
+    import io
+    import os
+    import random
+    from tokenizer.definitions import (
+        PUNCTUATION, LEFT_PUNCTUATION, RIGHT_PUNCTUATION,
+        NONE_PUNCTUATION, CENTER_PUNCTUATION, TP_SPACE,
+    )
+
+    def reference(s):
+        # The previous implementation of correct_spaces(), based on RE_SPLIT
+        r = []
+        last = t.TP_NONE
+        double_quote_count = 0
+        for w in t.tokenizer.RE_SPLIT.split(s):
+            if w is None:
+                continue
+            w = w.strip()
+            if not w:
+                continue
+            if len(w) > 1:
+                this = t.TP_WORD
+            elif w == '"':
+                this = (t.TP_LEFT, t.TP_RIGHT)[double_quote_count % 2]
+                double_quote_count += 1
+            elif w in LEFT_PUNCTUATION:
+                this = t.TP_LEFT
+            elif w in RIGHT_PUNCTUATION:
+                this = t.TP_RIGHT
+            elif w in NONE_PUNCTUATION:
+                this = t.TP_NONE
+            elif w in CENTER_PUNCTUATION:
+                this = t.TP_CENTER
+            else:
+                this = t.TP_WORD
+            if (
+                (w == "og" or w == "eða")
+                and len(r) >= 2
+                and r[-1] == "-"
+                and r[-2].lstrip().isalpha()
+            ):
+                r.append(" " + w)
+            elif (
+                this == t.TP_WORD
+                and len(r) >= 2
+                and r[-1] == "-"
+                and w.isalpha()
+                and (r[-2] == "," or r[-2].lstrip() in ("og", "eða"))
+            ):
+                r[-1] = " -"
+                r.append(w)
+            elif TP_SPACE[last - 1][this - 1] and r:
+                r.append(" " + w)
+            else:
+                r.append(w)
+            last = this
+        return "".join(r)
+
+    # Property test: random strings built from pieces that exercise
+    # numbers, signs, punctuation, whitespace and the special cases
+    pieces = (
+        list(PUNCTUATION) + list("~$€+-.,0123456789")
+        + [" ", "  ", "\t", "\n", "\u00a0", "a", "Þú", "orð", "og", "eða", "x1"]
+        + ["1.234,5", "12,345.6", "1,5", "2.5", "-3,14", "$9.99", "€1.000,00"]
+    )
+    rnd = random.Random(38)
+    for _ in range(5000):
+        s = "".join(rnd.choice(pieces) for _ in range(rnd.randint(0, 30)))
+        assert t.correct_spaces(s) == reference(s), s
+    # The test corpora, line by line
+    for name in ("toktest_sentences.txt", "toktest_large.txt"):
+        path = os.path.join(os.path.dirname(__file__), name)
+        with io.open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                assert t.correct_spaces(line) == reference(line), line
+
+
+def test_detokenize_batch():
+    import array
+
+    texts = [
+        "Hann sagði: \"Þú ert ágæt!\".",
+        "Verðið hækkaði um 10% árið 2021 ( sjá t.d. bls. 5 ) og „meira“ – eða hvað?",
+        "\"A\" og \"B\" og 'C'",
+        "",
+    ]
+    for text in texts:
+        toklist = list(t.tokenize(text))
+        kinds = [tok.kind for tok in toklist]
+        txts = [tok.txt for tok in toklist]
+        expected = t.detokenize(toklist)
+        assert t.detokenize_batch(kinds, txts) == expected
+        assert t.detokenize_batch(array.array("i", kinds), tuple(txts)) == expected
+    assert t.detokenize_batch([], []) == ""
+    # Only punctuation tokens are classified as punctuation
+    assert t.detokenize_batch(
+        [TOK.WORD, TOK.PUNCTUATION, TOK.UNKNOWN, TOK.WORD], ["a", ",", ",", "b"]
+    ) == "a, , b"
+
+
+def test_detokenize_original():
+    text = (
+        "Hann  sagði:\n\"Þú ert ágæt!\".   Þann 3.  maí\tfór hann "
+        "á 200 °C heitan stað og keypti ½dl af Ver\xadum. Það kostaði $ 54."
+    )
+    toklist = list(t.tokenize(text))
+    # The original text is reconstructed exactly, apart from
+    # leading and trailing whitespace
+    assert t.detokenize(toklist, original=text) == text
+    assert t.detokenize(toklist, original="\n  " + text + " \n") == text
+    # Normalization applies to the punctuation, not the spacing
+    assert t.detokenize(toklist, normalize=True, original=text) == text.replace(
+        '"Þú ert ágæt!"', "„Þú ert ágæt!“"
+    )
+    spans = [span for _, span in t.align_tokens(toklist, text)]
+    assert spans[0] is None  # Sentence begin
+    assert text[spans[1][0] : spans[1][1]] == "Hann"
+    assert all(span is None for tok, span in zip(toklist, spans) if not tok.txt)
+    # Tokens whose text was converted get the original text between
+    # their neighbors, and keep the whitespace around them
+    text = "Verðið er  1,234.5 kr. og  „meira“"
+    toklist = list(t.tokenize(text, convert_numbers=True))
+    spans = [span for _, span in t.align_tokens(toklist, text)]
+    assert spans.count(None) == 2
+    assert text[spans[3][0] : spans[3][1]] == "1,234.5 kr."
+    assert t.detokenize(toklist, original=text) == "Verðið er  1.234,5 kr. og  „meira“"
+    # The alignment does not jump ahead to a later copy of a converted text
+    text = "Verð 1,5 og 1.5 eða 1,5."
+    toklist = list(t.tokenize(text, convert_numbers=True))
+    spans = [span for _, span in t.align_tokens(toklist, text)]
+    assert [text[i:j] for i, j in spans[1:-1]] == [
+        "Verð", "1,5", "og", "1.5", "eða", "1,5", "."
+    ]
+    # Spans recorded during tokenization are exact
+    spans = []
+    text = "Sjá  https://x.is?a=1&amp;b=2 eða jon&#64;mbl.is, 1,234.5 kr."
+    toklist = list(
+        t.tokenize(text, convert_numbers=True, replace_html_escapes=True, spans=spans)
+    )
+    assert [
+        text[span[0] : span[1]]
+        for _, span in t.align_tokens(toklist, text, spans=spans)
+        if span is not None
+    ] == [
+        "Sjá", "https://x.is?a=1&amp;b=2", "eða", "jon&#64;mbl.is", ",",
+        "1,234.5 kr.",
+    ]
+    # The spans option bypasses the paragraph cache
+    spans = []
+    toklist = list(t.tokenize(text, paragraph_cache=True, spans=spans))
+    assert spans[0] == (toklist[1], 0, 3)
+    # The alignment takes linear time, even if no token is found
+    text = " ".join(["1,5"] * 20000)
+    toklist = list(t.tokenize(text, convert_numbers=True))
+    assert sum(1 for _ in t.align_tokens(toklist, text)) == len(toklist)
+    # Paragraph markers are not copied from the original
+    text = "[[ Jón  fór. ]] [[ Páll  kom. ]]"
+    assert t.detokenize(t.tokenize(text), original=text) == "Jón  fór. Páll  kom."
+
+
+def test_replace_glyphs_and_escapes():
+    import random
+    from tokenizer.definitions import (
+        UNICODE_REGEX, UNICODE_REPLACEMENTS, HTML_ESCAPE_REGEX,
+        ACCENT, UMLAUT, SOFT_HYPHEN, ZEROWIDTH_SPACE, ZEROWIDTH_NBSP,
+    )
+
+    def two_passes(txt, glyphs, escapes):
+        # The previous normalization in gen_from_string()
+        if glyphs:
+            txt = UNICODE_REGEX.sub(lambda m: UNICODE_REPLACEMENTS[m.group(0)], txt)
+        if escapes:
+            txt = HTML_ESCAPE_REGEX.sub(t.tokenizer.html_escape, txt)
+        return txt
+
+    replace = t.tokenizer.replace_glyphs_and_escapes
+    samples = [
+        "",
+        "Hér er ekkert að gera.",
+        "Ve" + SOFT_HYPHEN + "ður" + ZEROWIDTH_SPACE + "inn er go" + UMLAUT + "tt",
+        "a" + ACCENT + "sta" + ZEROWIDTH_NBSP + "r &amp; &aacute;st &#225; &#xE1; &#x2013;",
+        "U" + UMLAUT + "ber &lt;tag&gt; &nbsp;x &amp &foo; & og &",
+        "E" + ACCENT + "g á " + SOFT_HYPHEN * 3 + "&ouml;",
+    ]
+    for txt in samples:
+        for glyphs in (False, True):
+            for escapes in (False, True):
+                assert replace(txt, glyphs, escapes) == two_passes(txt, glyphs, escapes)
+    # Random strings, dense with the characters that the replacements act upon
+    rnd = random.Random(42)
+    alphabet = [
+        "a", "o", "u", "E", " ", "&", ";", "amp", "aacute", "&#225;", "&#x2013;",
+        ACCENT, UMLAUT, SOFT_HYPHEN, ZEROWIDTH_SPACE, ZEROWIDTH_NBSP,
+    ]
+    for _ in range(5000):
+        txt = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 20)))
+        assert replace(txt, True, True) == two_passes(txt, True, True), repr(txt)
+    # Text that needs no normalization is returned as-is, without a copy
+    txt = "Hér er ekkert að gera, & ekki hér heldur. " * 10
+    assert replace(txt, True, False) is txt
+    assert replace(txt, False, True) is txt
+    assert replace(txt, True, True) is txt
+
+
+def test_normalization_stats():
+    from tokenizer.definitions import ACCENT, SOFT_HYPHEN
+
+    stats = t.NORMALIZATION_STATS
+    stats.clear()
+    assert stats.info() == t.NormalizationInfo(0, 0, 0, 0)
+    assert stats.skip_rate() == 0.0
+    lines = [
+        "Hér er allt í lagi.",
+        "",
+        "Hér er la" + SOFT_HYPHEN + "ngt orð.",
+        "Ha" + ACCENT + "lfur &amp; heill.",
+        "Einn &amp; tveir.",
+    ]
+    toklist = list(t.tokenize(lines))
+    assert "".join(tok.txt for tok in toklist if tok.txt).count("&") == 2
+    # Empty lines are not normalized; escapes are not replaced by default
+    assert stats.info() == t.NormalizationInfo(4, 2, 0, 2)
+    assert stats.skip_rate() == 0.5
+    stats.clear()
+    toklist = list(t.tokenize(lines, replace_html_escapes=True))
+    assert stats.info() == t.NormalizationInfo(4, 2, 2, 1)
+    stats.clear()
+    list(t.tokenize(lines, replace_composite_glyphs=False))
+    assert stats.info() == t.NormalizationInfo(4, 0, 0, 4)
+    assert stats.skip_rate() == 1.0
+    # A pass is only counted if it replaced something
+    stats.clear()
+    list(t.tokenize(["Ekkert " + ACCENT + " hér & þar."], replace_html_escapes=True))
+    assert stats.info() == t.NormalizationInfo(1, 0, 0, 1)
+    # The paragraphs are counted once with the paragraph cache,
+    # whether or not they are found in the cache
+    stats.clear()
+    text = "Ha" + ACCENT + "lfur &amp; heill."
+    for _ in range(2):
+        list(t.tokenize(text, replace_html_escapes=True, paragraph_cache=True))
+    assert stats.info() == t.NormalizationInfo(2, 2, 2, 0)
+    # A separate NormalizationStats instance counts a single call
+    stats.clear()
+    own = t.NormalizationStats()
+    list(t.tokenize(lines, normalization_stats=own))
+    assert own.info() == t.NormalizationInfo(4, 2, 0, 2)
+    list(t.tokenize(lines, normalization_stats=None))
+    assert stats.info() == t.NormalizationInfo(0, 0, 0, 0)
+
+
+def test_chunked_input():
+    import io
+    import os
+    import random
+    from tokenizer.definitions import ACCENT, SOFT_HYPHEN, ZEROWIDTH_SPACE
+
+    rnd = random.Random(7)
+
+    def split(s, maxlen):
+        # Cut s into chunks of random lengths
+        chunks = []
+        i = 0
+        while i < len(s):
+            n = rnd.randint(1, maxlen)
+            chunks.append(s[i : i + n])
+            i += n
+        return chunks
+
+    def gen_rough(txt, **options):
+        return list(t.tokenizer.gen(txt, **options))
+
+    # The chunks are tokenized as if they were a single string
+    src_dir = os.path.dirname(os.path.realpath(__file__))
+    for fname in ("toktest_normal.txt", "toktest_sentences.txt"):
+        with io.open(os.path.join(src_dir, fname), "r", encoding="utf-8") as f:
+            text = f.read()
+        toklist = list(t.tokenize(text))
+        assert list(t.tokenize(split(text, 100), chunked=True)) == toklist
+        data = text.encode("utf-8")
+        assert list(t.tokenize(split(data, 100), chunked=True)) == toklist
+        assert list(t.tokenize(io.BytesIO(data), chunked=True)) == toklist
+        assert list(t.tokenize(io.StringIO(text), chunked=True)) == toklist
+        assert (
+            list(t.tokenize(split(data, 100), chunked=True, paragraph_cache=True))
+            == toklist
+        )
+
+    # Blank lines, composite glyphs, removed characters and HTML escapes
+    # may straddle chunk boundaries
+    alphabet = [
+        "a", "á", "ð", " ", "\n", "\n \n", "\t", "&", ";", "amp;", "&nbsp;",
+        "&#10;", "&shy;", ACCENT, SOFT_HYPHEN, ZEROWIDTH_SPACE,
+    ]
+    for _ in range(2000):
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 30)))
+        for options in (
+            dict(),
+            dict(replace_html_escapes=True),
+            dict(replace_composite_glyphs=False, one_sent_per_line=True),
+        ):
+            expected = gen_rough(text, **options)
+            chunks = split(text, 4)
+            assert gen_rough(chunks, chunked=True, **options) == expected
+            chunks = split(text.encode("utf-8"), 4)
+            assert gen_rough(chunks, chunked=True, **options) == expected
+
+    # Other encodings
+    text = "Þórður fór í bæinn. Þar var gaman!\n\nEn svo kom nóttin."
+    data = text.encode("utf-16")
+    assert list(t.tokenize(split(data, 3), chunked=True, encoding="utf-16")) == list(
+        t.tokenize(text)
+    )
+
+    # The chunks are consumed lazily
+    consumed = [0]
+
+    def chunks():
+        for _ in range(1000):
+            consumed[0] += 1
+            yield "Hér er setning. "
+
+    for tok in t.tokenize(chunks(), chunked=True):
+        if tok.kind == t.TOK.S_END:
+            break
+    assert consumed[0] < 5
+
+
+def test_tokenize_file():
+    import bz2
+    import gzip
+    import io
+    import os
+    import shutil
+    import tempfile
+
+    src_dir = os.path.dirname(os.path.realpath(__file__))
+    with io.open(
+        os.path.join(src_dir, "toktest_normal.txt"), "r", encoding="utf-8"
+    ) as f:
+        text = f.read()
+    data = text.encode("utf-8")
+    toklist = list(t.tokenize(text))
+    tmpdir = tempfile.mkdtemp()
+
+    class Unseekable(io.RawIOBase):
+        def __init__(self, f):
+            self.f = f
+
+        def readable(self):
+            return True
+
+        def readinto(self, b):
+            data = self.f.read(len(b))
+            b[: len(data)] = data
+            return len(data)
+
+    assert t.tokenizer.detect_compression("a.txt.gz") == "gzip"
+    assert t.tokenizer.detect_compression("a.XZ") == "xz"
+    assert t.tokenizer.detect_compression("a.txt", b"BZh91AY") == "bz2"
+    assert t.tokenizer.detect_compression("a.txt", b"Texti") is None
+
+    try:
+        formats = [(".txt", None), (".gz", gzip.GzipFile), (".bz2", bz2.BZ2File)]
+        try:
+            import lzma
+
+            formats.append((".xz", lzma.LZMAFile))
+        except ImportError:
+            # Python 2.7: xz compression is not available
+            try:
+                t.tokenizer.open_compressed(
+                    os.path.join(tmpdir, "corpus.xz"), "wb"
+                )
+                assert False, "ValueError expected"
+            except ValueError:
+                pass
+        for ext, opener in formats:
+            path = os.path.join(tmpdir, "corpus" + ext)
+            # Compressed output, with the format given by the file name
+            with t.tokenizer.open_compressed(path, "wb") as f:
+                f.write(data)
+            if opener is not None:
+                with opener(path, "rb") as f:
+                    assert f.read() == data
+            assert list(t.tokenize_file(path)) == toklist
+            # Without an extension, the format is detected from the magic bytes
+            other = os.path.join(tmpdir, "corpus")
+            os.rename(path, other)
+            assert list(t.tokenize_file(other)) == toklist
+            with io.open(other, "rb") as f:
+                assert list(t.tokenize_file(f)) == toklist
+                assert not f.closed
+            # A pipe, which cannot seek, such as stdin
+            with io.open(other, "rb") as f:
+                pipe = io.BufferedReader(Unseekable(f))
+                assert list(t.tokenize_file(pipe)) == toklist
+            os.remove(other)
+
+        # Other encodings
+        path = os.path.join(tmpdir, "latin1.gz")
+        with gzip.GzipFile(path, "wb") as f:
+            f.write("Þórður fór í bæinn.".encode("latin-1"))
+        assert [tok.txt for tok in t.tokenize_file(path, encoding="latin-1")] == [
+            None, "Þórður", "fór", "í", "bæinn", ".", None,
+        ]
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_corpus_driver():
+    import gzip
+    import io
+    import os
+    import shutil
+    import tempfile
+    from tokenizer.corpus import tokenize_corpus, read_manifest, MANIFEST_NAME
+    from tokenizer.main import write_tokens, open_infile
+
+    src_dir = os.path.dirname(os.path.realpath(__file__))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        indir = os.path.join(tmpdir, "in")
+        outdir = os.path.join(tmpdir, "out")
+        os.makedirs(os.path.join(indir, "sub"))
+        shutil.copy(os.path.join(src_dir, "toktest_normal.txt"), indir)
+        shutil.copy(
+            os.path.join(src_dir, "toktest_sentences.txt"), os.path.join(indir, "sub")
+        )
+        with io.open(os.path.join(src_dir, "example.txt"), "rb") as f:
+            data = f.read()
+        with gzip.open(os.path.join(indir, "sub", "example.txt.gz"), "wb") as f:
+            f.write(data)
+        shards = [
+            "sub/example.txt.gz", "sub/toktest_sentences.txt", "toktest_normal.txt"
+        ]
+
+        def expected(relpath, **options):
+            # The output of the tokenize command for the input file
+            f = open_infile(os.path.join(indir, relpath))
+            try:
+                lines = f.readlines()
+            finally:
+                f.close()
+            out = io.StringIO()
+            write_tokens(t.tokenize(lines), out, **options)
+            return out.getvalue()
+
+        def output(relpath):
+            with io.open(os.path.join(outdir, relpath), "r", encoding="utf-8") as f:
+                return f.read()
+
+        # A run that is killed after the first completed shard
+        class Killed(Exception):
+            pass
+
+        first = []
+
+        def kill(entry):
+            first.append(entry)
+            raise Killed()
+
+        try:
+            tokenize_corpus([indir], outdir, workers=1, progress=kill)
+        except Killed:
+            pass
+        assert len(read_manifest(os.path.join(outdir, MANIFEST_NAME))) == 1
+        # Resuming the run only tokenizes the remaining shards
+        info = tokenize_corpus([indir], outdir, workers=2)
+        assert info.shards == 2 and info.skipped == 1
+        manifest = read_manifest(os.path.join(outdir, MANIFEST_NAME))
+        assert sorted(manifest) == shards
+        assert manifest[first[0]["input"]]["tokens"] == first[0]["tokens"]
+        assert sum(entry["tokens"] for entry in manifest.values()) == (
+            info.tokens + first[0]["tokens"]
+        )
+        assert output("sub/example.txt.tok") == expected("sub/example.txt.gz")
+        assert output("toktest_normal.txt.tok") == expected("toktest_normal.txt")
+        assert not any(f.endswith(".part") for _, _, fs in os.walk(outdir) for f in fs)
+        # Nothing is left to do
+        info = tokenize_corpus([indir], outdir, workers=2)
+        assert info.shards == 0 and info.skipped == 3
+        # Other settings, or a changed input file, cause a shard to be redone
+        info = tokenize_corpus(
+            [os.path.join(indir, "*.txt")], outdir, workers=1, output_format="csv"
+        )
+        assert info.shards == 1 and info.skipped == 0
+        assert output("toktest_normal.txt.csv") == expected("toktest_normal.txt", csv=True)
+        with io.open(os.path.join(indir, "sub", "toktest_sentences.txt"), "ab") as f:
+            f.write(b"Ein setning enn.\n")
+        info = tokenize_corpus([indir], outdir, workers=1)
+        assert info.shards == 2 and info.skipped == 1
+        # An output directory within the input directory is not an input
+        inner = os.path.join(indir, "out")
+        info = tokenize_corpus([indir], inner, workers=1)
+        assert info.shards == 3
+        info = tokenize_corpus([indir], inner, workers=1)
+        assert info.shards == 0 and info.skipped == 3
+        # Input files that would have the same output file
+        shutil.copy(os.path.join(src_dir, "example.txt"), os.path.join(indir, "sub"))
+        try:
+            tokenize_corpus([indir], outdir, workers=1)
+            assert False, "ValueError expected"
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_columnar_export():
+    import io
+    import json
+    import os
+    import shutil
+    import struct
+    import tempfile
+    from tokenizer.columnar import export_columns, read_columns, read_npy
+    from tokenizer.main import val
+
+    text = t.mark_paragraphs(
+        "Jón fæddist 3. janúar 1990.\nHann á netfangið jon@example.com.\n"
+        "Hann keypti 3 kg af eplum á € 30. Þau voru góð."
+    )
+    tokens = list(t.tokenize(text))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, "out.columns")
+        # A small batch size, so that the output spans several batches
+        rows = export_columns(iter(tokens), path, batch_size=7, format="npy")
+        assert rows == len(tokens)
+        cols = read_columns(path)
+        assert list(cols["kind"]) == [tok.kind for tok in tokens]
+        assert cols["text"] == [tok.txt for tok in tokens]
+        assert cols["normalized"] == [
+            None if tok.txt is None else t.normalized_text(tok) for tok in tokens
+        ]
+        values = [None if v is None else json.loads(v) for v in cols["value"]]
+        assert values == [
+            json.loads(json.dumps(val(tok), ensure_ascii=False)) for tok in tokens
+        ]
+        # Sentence and paragraph ids
+        sentences = list(cols["sentence"])
+        paragraphs = list(cols["paragraph"])
+        assert sentences == sorted(sentences) and paragraphs == sorted(paragraphs)
+        assert sentences[-1] == sum(1 for tok in tokens if tok.kind == t.TOK.S_BEGIN) - 1
+        assert paragraphs[-1] == 2
+        ix = cols["text"].index("jon@example.com")
+        assert (sentences[ix], paragraphs[ix]) == (1, 1)
+        ix = cols["text"].index("Þau")
+        assert (sentences[ix], paragraphs[ix]) == (3, 2)
+        # Null texts are encoded as -1
+        kinds = read_npy(os.path.join(path, "kind.npy"))
+        codes = read_npy(os.path.join(path, "text.npy"))
+        assert all(
+            (code == -1) == (tok.txt is None) for code, tok in zip(codes, tokens)
+        )
+        assert len(kinds) == rows
+        # The .npy headers are valid
+        with io.open(os.path.join(path, "sentence.npy"), "rb") as f:
+            assert f.read(8) == b"\x93NUMPY\x01\x00"
+            (header_len,) = struct.unpack("<H", f.read(2))
+            assert (10 + header_len) % 64 == 0
+            header = f.read(header_len).decode("latin-1")
+            assert "'shape': ({0},)".format(rows) in header
+            assert header.endswith("\n")
+            assert len(f.read()) == 8 * rows
+        # Exporting to an existing layout replaces it; an empty stream
+        # gives empty columns
+        assert export_columns(iter([]), path, format="npy") == 0
+        assert all(len(c) == 0 for c in read_columns(path).values())
+        try:
+            export_columns(iter(tokens), path, format="feather")
+            assert False, "ValueError expected"
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_tokenize_kinds():
+    import io
+    import os
+    from tokenizer.tokenizer import _phases_for_kinds, PIPELINE_PHASES
+
+    TOK = t.TOK
+    src_dir = os.path.dirname(os.path.realpath(__file__))
+    with io.open(os.path.join(src_dir, "toktest_normal.txt"), "r", encoding="utf-8") as f:
+        texts = [f.read()]
+    texts.append(
+        "Hringdu í 354 5551234 eða 555-1234 fyrir kl. 17:00 hinn 3. mars 2020. "
+        "Kt. 010130-2989, netfang jon.jonsson@example.com, vefur "
+        "https://www.example.com/leit?q=1 og @jonjonsson á Twitter. "
+        "Verðið er $10, kr. 9.900 eða 3 þúsund krónur, um 17 prósent.\n\n"
+        "Stjórnskipunar- og eftirlitsnefnd fundaði árið 2020 kl. hálf átta."
+    )
+    pii = {TOK.SSN, TOK.TELNO, TOK.EMAIL, TOK.URL, TOK.USERNAME}
+    kind_sets = [{kind} for kind in TOK.descr] + [
+        pii,
+        {TOK.WORD, TOK.S_BEGIN, TOK.S_END},
+        {TOK.AMOUNT, TOK.PERCENT, TOK.URL},
+    ]
+    for options in ({}, {"coalesce_percent": True}, {"with_annotation": False}):
+        for text in texts:
+            full = list(t.tokenize(text, **options))
+            for kinds in kind_sets:
+                filtered = list(t.tokenize(text, kinds=kinds, **options))
+                assert filtered == [tok for tok in full if tok.kind in kinds]
+    # The filter also applies to tokenize_many() and the paragraph cache
+    assert [
+        [tok.txt for tok in toks]
+        for toks in t.tokenize_many(["Netfang: a@b.is", "Ekkert hér"], kinds=pii)
+    ] == [["a@b.is"], []]
+    assert [
+        tok.txt
+        for tok in t.tokenize(
+            texts[1], kinds={TOK.URL}, paragraph_cache=t.LRUCache(maxsize=10)
+        )
+    ] == ["https://www.example.com/leit?q=1"]
+    # Phases that cannot affect the requested kinds are skipped
+    phases = set(name for name, _, _ in PIPELINE_PHASES)
+    assert _phases_for_kinds({TOK.URL, TOK.EMAIL}, phases) == set()
+    assert _phases_for_kinds(pii, phases) == {
+        "parse_particles",
+        "parse_sentences",
+        "parse_phrases_1",
+    }
+    assert _phases_for_kinds({TOK.AMOUNT}, phases) == phases
+    assert "parse_phrases_2" not in _phases_for_kinds({TOK.DATEABS}, phases)
+
+
+def test_scan_pii():
+    import io
+    import os
+    import random
+    from tokenizer import scan_pii, redact_pii, PII_KINDS
+
+    TOK = t.TOK
+    text = (
+        "Hringdu í 354 5551234 eða 555-1234.\n\n"
+        "Kt. 010130-2989, netfang jon.jonsson@example.com, vefur "
+        "https://www.example.com/leit?q=1 og @jonjonsson á Twitter.\n \n"
+        "Ekkert hér, nema árið 2020 og 3. mars."
+    )
+    found = [(TOK.descr[tok.kind], text[start:end]) for tok, (start, end) in scan_pii(text)]
+    assert found == [
+        ("TELNO", "354 5551234"),
+        ("TELNO", "555-1234"),
+        ("SSN", "010130-2989"),
+        ("EMAIL", "jon.jonsson@example.com"),
+        ("URL", "https://www.example.com/leit?q=1"),
+        ("USERNAME", "@jonjonsson"),
+    ]
+    assert [tok.txt for tok, _ in scan_pii(text, kinds={TOK.EMAIL, TOK.USERNAME})] == [
+        "jon.jonsson@example.com",
+        "@jonjonsson",
+    ]
+    assert redact_pii(text).startswith(
+        "Hringdu í [TELNO] eða [TELNO].\n\n"
+        "Kt. [SSN], netfang [EMAIL], vefur [URL] og [USERNAME] á Twitter."
+    )
+    assert redact_pii("Sími 555 1234", replacement="***") == "Sími ***"
+    assert (
+        redact_pii("Sími 555 1234", replacement=lambda tok: tok.val[0])
+        == "Sími 555-1234"
+    )
+    # HTML escapes are redacted along with the rest of the token
+    assert (
+        redact_pii(
+            "Sjá https://x.is?a=1&amp;b=2 eða jon&#64;mbl.is", replace_html_escapes=True
+        )
+        == "Sjá [URL] eða [EMAIL]"
+    )
+    # The spans are exact, including characters removed by normalization
+    text2 = "Sími 555\u00ad1234, sími 555 1234.\n\nKt. 010130\u200b-2989"
+    assert [text2[start:end] for _, (start, end) in scan_pii(text2)] == [
+        "555\u00ad1234", "555 1234", "010130\u200b-2989"
+    ]
+    assert redact_pii(text2) == "Sími [TELNO], sími [TELNO].\n\nKt. [SSN]"
+    text2 = "Sjá ht\u00adtps://x.is/a núna."
+    assert [tok.txt for tok in t.tokenize(text2) if tok.kind == TOK.URL] == [
+        "https://x.is/a"
+    ]
+    assert [text2[start:end] for _, (start, end) in scan_pii(text2)] == [
+        "ht\u00adtps://x.is/a"
+    ]
+    assert redact_pii(text2) == "Sjá [URL] núna."
+    try:
+        list(scan_pii(text, kinds={TOK.WORD}))
+        assert False, "ValueError expected"
+    except ValueError:
+        pass
+    # The tokens found are the same as those that tokenize() returns,
+    # although paragraphs that cannot contain them are skipped
+    src_dir = os.path.dirname(os.path.realpath(__file__))
+    with io.open(os.path.join(src_dir, "toktest_sentences.txt"), "r", encoding="utf-8") as f:
+        texts = [f.read()]
+    rnd = random.Random(49)
+    parts = [
+        "555", "1234", "010130", "2989", "354", "5551234", "7", "2020",
+        "-", "+", " ", "\n", "\n\n", ".", ",", "(", ")", "\u00ad", "\u200b",
+        " og ", "árið", "kt.", "kl.", "a@b.is", "@x", "http://x.is",
+    ]
+    for _ in range(1000):
+        texts.append(
+            "".join(rnd.choice(parts) for _ in range(rnd.randint(1, 14)))
+        )
+    for text in texts:
+        expected = [tok for tok in t.tokenize(text) if tok.kind in PII_KINDS]
+        found = list(scan_pii(text))
+        assert [tok for tok, _ in found] == expected
+        assert all(span is not None for _, span in found)
+
+
+def test_token_counts():
+    import os
+    import shutil
+    import tempfile
+    from collections import Counter
+    from tokenizer.counts import TokenCounts, count_corpus
+
+    TOK = t.TOK
+    src_dir = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(src_dir, "toktest_sentences.txt"), "rb") as f:
+        text = f.read().decode("utf-8")
+    tokens = list(t.tokenize(text))
+    counts = TokenCounts(bigrams=True)
+    assert counts.update(iter(tokens)) == len(tokens) == counts.tokens
+    # The same counts with Counters of strings
+    kinds = Counter(tok.kind for tok in tokens)
+    words = [tok.txt for tok in tokens if tok.kind == TOK.WORD]
+    bigrams = Counter()
+    for a, b in zip(tokens, tokens[1:]):
+        if a.kind == TOK.WORD and b.kind == TOK.WORD:
+            bigrams[(a.txt.lower(), b.txt.lower())] += 1
+    assert counts.kinds == dict(kinds)
+    assert counts.forms == dict(Counter(words))
+    assert dict(counts.table("normalized")) == dict(Counter(w.lower() for w in words))
+    assert dict(counts.table("bigrams")) == dict(bigrams)
+    # The tables are sorted by descending count, then by key
+    table = counts.table("forms")
+    assert table == sorted(table, key=lambda item: (-item[1], item[0]))
+    assert counts.table("kinds")[0] == ("WORD", len(words))
+    assert all(count >= 5 for _, count in counts.table("forms", min_count=5))
+    # Counts of parts of the text, merged, equal the counts of the whole
+    half = len(tokens) // 2
+    while tokens[half].kind != TOK.S_BEGIN:
+        half += 1
+    first, second = TokenCounts(bigrams=True), TokenCounts(bigrams=True)
+    first.update(tokens[:half])
+    second.update(tokens[half:])
+    second.merge(first)
+    for name in ("kinds", "forms", "normalized", "bigrams"):
+        assert second.table(name) == counts.table(name)
+    try:
+        second.merge(TokenCounts())
+        assert False, "ValueError expected"
+    except ValueError:
+        pass
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # Count files, compressed or not
+        for name in ("part.counts.json", "part.counts.json.gz"):
+            path = os.path.join(tmpdir, name)
+            counts.save(path)
+            loaded = TokenCounts.load(path)
+            for table in ("kinds", "forms", "normalized", "bigrams"):
+                assert loaded.table(table) == counts.table(table)
+        # Counting a corpus in worker processes, merging a count file
+        indir = os.path.join(tmpdir, "in")
+        os.makedirs(indir)
+        for i in range(3):
+            shutil.copy(
+                os.path.join(src_dir, "toktest_sentences.txt"),
+                os.path.join(indir, "part{0}.txt".format(i)),
+            )
+        total = count_corpus(
+            [indir, os.path.join(tmpdir, "part.counts.json.gz")],
+            workers=2,
+            bigrams=True,
+        )
+        assert total.tokens == 4 * counts.tokens
+        assert total.table("bigrams")[:10] == [
+            (key, 4 * count) for key, count in counts.table("bigrams")[:10]
+        ]
+        paths = total.write_tables(os.path.join(tmpdir, "out"), min_count=2)
+        assert [os.path.basename(path) for path in paths] == [
+            "kinds.tsv", "forms.tsv", "normalized.tsv", "bigrams.tsv"
+        ]
+        with open(paths[1], "rb") as f:
+            form, count = f.readline().decode("utf-8").rstrip("\n").split("\t")
+        assert (form, int(count)) == total.table("forms")[0]
+        # An output directory within the input directory is not counted
+        # when the run is repeated
+        outdir = os.path.join(indir, "out")
+        for _ in range(2):
+            total = count_corpus([indir], workers=1, exclude=outdir)
+            assert total.tokens == 3 * counts.tokens
+            total.write_tables(outdir)
+            total.save(os.path.join(outdir, "corpus.counts.json.gz"))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
 if __name__ == "__main__":
 
     test_single_tokens()